@@ -38,7 +38,12 @@ if submit_button:
     if user_input:
         st.session_state.user_input = user_input
         with st.spinner("Generating response..."):
-            vector_store = pull_index_data()
+            try:
+                vector_store = pull_index_data()
+            except Exception as e:
+                # Without embeddings or an index there is nothing to retrieve from
+                st.error(f"Error connecting to the knowledge base: {str(e)}")
+                st.stop()
             similar_docs = retrieve_relevant_docs(user_input, vector_store)
             st.session_state.response = generate_response(user_input, similar_docs)
     else:
@@ -1,10 +1,11 @@
 from dotenv import load_dotenv
-from langchain_openai import OpenAI, OpenAIEmbeddings
+from langchain_openai import OpenAI
 from langchain_core.prompts import PromptTemplate
 from langchain_pinecone import PineconeVectorStore
 import os
 import streamlit as st
 from pinecone import Pinecone
+from utils.upload_context_data_utils import EmbeddingError, create_embeddings
 
 load_dotenv()
 
@@ -23,8 +24,10 @@ def pull_index_data():
         if not pinecone_api_key or not pinecone_index_name:
             raise ValueError("Missing required environment variables PINECONE_API_KEY or PINECONE_INDEX_NAME")
         
-        # Initialize embeddings
-        embeddings = OpenAIEmbeddings()
+        # Initialize embeddings (cached on disk across queries and processes)
+        embeddings = create_embeddings()
+        if embeddings is None:
+            raise EmbeddingError("No embeddings were created")
         
         # Create vector store from existing index
         vector_store = PineconeVectorStore(
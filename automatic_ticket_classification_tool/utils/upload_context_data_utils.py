@@ -4,8 +4,11 @@ from langchain_openai import OpenAIEmbeddings
 import os
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pypdf import PdfReader
-from typing import Optional, List
+from typing import List
+from langchain_core.embeddings import Embeddings
 from dotenv import load_dotenv
+from utils.embedding_cache import CachedEmbeddings
+from utils.local_embeddings import local_embeddings_from_env
 
 load_dotenv()
 
@@ -21,12 +24,15 @@ class VectorStoreError(Exception):
     """Custom exception for vector store operations"""
     pass
 
-def create_embeddings() -> Optional[OpenAIEmbeddings]:
-    """Create embeddings using OpenAIEmbeddings"""
+def create_embeddings() -> Embeddings:
+    """Create embeddings using OpenAIEmbeddings behind the on-disk embedding cache, or local ones if EMBEDDING_BACKEND=hashing"""
     try:
+        local = local_embeddings_from_env()
+        if local is not None:
+            return local
         if not os.getenv("OPENAI_API_KEY"):
             raise ValueError("OPENAI_API_KEY environment variable not set")
-        embeddings = OpenAIEmbeddings()
+        embeddings = CachedEmbeddings(OpenAIEmbeddings())
         return embeddings
     except Exception as e:
         print(f"Failed to create embeddings: {str(e)}")
@@ -3,6 +3,12 @@ A Streamlit web application for a chatbot with conversation summarization.
 
 This application allows users to interact with an OpenAI-powered chatbot.
 It maintains a conversation history and can provide a summary of the chat.
+By default, recent turns are kept verbatim and older ones are summarized in
+the background once they pass a token budget; the original mode summarizes
+after every turn.
+Conversations are saved to SQLite and addressed by an id in the page URL, so
+a refresh reopens them. Only the last page of a long conversation is drawn,
+and sending a message reruns just the chat, not the whole page.
 The user's OpenAI API key is required to use the chatbot.
 """
 
@@ -10,27 +16,45 @@ import streamlit as st
 from langchain_openai import ChatOpenAI
 from langchain.chains import ConversationChain
 from langchain.chains.conversation.memory import ConversationSummaryMemory
-from langchain.schema import AIMessage, HumanMessage, SystemMessage
-from typing import List, Union, Optional
+from typing import List, Optional
 
-# Define a type for the messages
-Message = Union[HumanMessage, AIMessage, SystemMessage]
+from conversation_store import PAGE_SIZE, ConversationStore, StoredMessage
+from utils import DeferredSummaryMemory, restore_memory, stream_response
 
-def initialize_session_state() -> None:
+MEMORY_MODES = {
+    "Summarize when long (background)": DeferredSummaryMemory,
+    "Summarize every turn": ConversationSummaryMemory,
+}
+
+@st.cache_resource
+def get_store() -> ConversationStore:
+    """
+    Returns the conversation store shared by every session.
+    """
+    return ConversationStore()
+
+def initialize_session_state(store: ConversationStore) -> None:
     """
     Initializes the session state variables if they are not already set.
     'API_Key': Stores the user's OpenAI API key.
-    'messages': A list to store the conversation history.
+    'conversation_id': The stored conversation, also kept in the URL as ?c=.
+    'history_from_id': Oldest message id shown, or None for the last page.
     'conversation': A ConversationChain object for managing the chat.
+    'memory_mode': The MEMORY_MODES key used for new conversations.
     """
     if 'API_Key' not in st.session_state:
         st.session_state['API_Key'] = ''
-    if 'messages' not in st.session_state:
-        st.session_state['messages']: List[Message] = [
-            SystemMessage(content="You are a helpful assistant.")
-        ]
+    if 'conversation_id' not in st.session_state:
+        conversation_id = st.query_params.get("c")
+        if not conversation_id or not store.exists(conversation_id):
+            conversation_id = store.create_conversation()
+            st.query_params["c"] = conversation_id
+        st.session_state['conversation_id'] = conversation_id
+        st.session_state['history_from_id'] = None
     if 'conversation' not in st.session_state:
         st.session_state['conversation']: Optional[ConversationChain] = None
+    if 'memory_mode' not in st.session_state:
+        st.session_state['memory_mode'] = next(iter(MEMORY_MODES))
 
 def initialize_llm() -> Optional[ChatOpenAI]:
     """
@@ -63,24 +87,40 @@ def handle_prompt() -> Optional[str]:
     prompt = st.chat_input("Ask me anything!", key="input")
     return prompt
 
-def display_conversation_history() -> None:
+def load_earlier_messages(store: ConversationStore, oldest_id: int) -> None:
     """
-    Displays the conversation history in the Streamlit chat interface.
+    Shows one more page of older messages.
     """
-    for message in st.session_state['messages']:
-        if isinstance(message, HumanMessage):
-            with st.chat_message("user"):
-                st.write(message.content)
-        elif isinstance(message, AIMessage):
-            with st.chat_message("assistant"):
-                st.write(message.content)
+    earlier = store.page(st.session_state['conversation_id'], PAGE_SIZE, before_id=oldest_id)
+    if earlier:
+        st.session_state['history_from_id'] = earlier[0].id
+
+def display_conversation_history(store: ConversationStore) -> None:
+    """
+    Displays the last page of the conversation, plus any earlier pages loaded.
+    """
+    conversation_id = st.session_state['conversation_id']
+    from_id = st.session_state['history_from_id']
+    messages: List[StoredMessage] = (
+        store.messages(conversation_id, from_id) if from_id else store.page(conversation_id)
+    )
+    if messages and store.page(conversation_id, 1, before_id=messages[0].id):
+        st.button(
+            "Load earlier messages",
+            on_click=load_earlier_messages,
+            args=(store, messages[0].id),
+        )
+    for message in messages:
+        with st.chat_message(message.role):
+            st.write(message.content)
         
-def get_response(prompt: str) -> Optional[str]:
+def get_response(prompt: str, store: ConversationStore) -> Optional[str]:
     """
-    Gets a response from the LLM and updates the conversation history.
+    Streams a response from the LLM into the page and saves both messages.
 
     Args:
         prompt: The user's input prompt.
+        store: Where the conversation is saved.
 
     Returns:
         The LLM's response as a string, or None if an error occurs.
@@ -90,18 +130,25 @@ def get_response(prompt: str) -> Optional[str]:
             llm = initialize_llm()
             if llm is None:
                 return None
-            memory = ConversationSummaryMemory(llm=llm)
+            memory = MEMORY_MODES[st.session_state['memory_mode']](llm=llm)
+            # After a refresh, pick up the conversation where it was left
+            restore_memory(memory, [
+                message.to_message()
+                for message in store.messages(st.session_state['conversation_id'])
+            ])
             st.session_state['conversation'] = ConversationChain(
                 llm=llm,
                 verbose=True,
                 memory=memory
             )
         
-        result = st.session_state['conversation'].invoke({"input": prompt})
-        response_text = result.get('response', str(result))
+        # Memory is saved by stream_response once the reply is complete
+        response_text = st.write_stream(
+            stream_response(st.session_state['conversation'], prompt)
+        )
         
-        st.session_state['messages'].append(HumanMessage(content=prompt))
-        st.session_state['messages'].append(AIMessage(content=response_text))
+        store.add_message(st.session_state['conversation_id'], "user", prompt)
+        store.add_message(st.session_state['conversation_id'], "assistant", response_text)
 
         return response_text
     
@@ -114,17 +161,42 @@ def summarise_conversation() -> None:
     Displays a summary of the conversation in the sidebar.
     """
     if st.session_state['conversation'] is not None:
+        memory = st.session_state['conversation'].memory
         st.sidebar.write("**Conversation Summary:**")
-        st.sidebar.write(st.session_state['conversation'].memory.buffer)
+        if isinstance(memory, DeferredSummaryMemory):
+            st.sidebar.write(memory.summary())
+        else:
+            st.sidebar.write(memory.buffer)
     else:
         st.sidebar.write("No conversation to summarise.")
 
+@st.fragment
+def chat(store: ConversationStore) -> None:
+    """
+    Displays the conversation and answers new prompts.
+
+    As a fragment, sending a prompt reruns only this part of the page.
+    """
+    display_conversation_history(store)
+    
+    prompt = handle_prompt()
+    if prompt:
+        with st.chat_message("user"):
+            st.write(prompt)
+        
+        # Both messages are already on the page, so there is no need to rerun
+        with st.chat_message("assistant"):
+            response = get_response(prompt, store)
+            if not response:
+                st.error("Failed to get response. Please check your API key and try again.")
+
 def main() -> None:
     """
     The main function that runs the Streamlit application.
     """
     st.title("Chat with OpenAI")
-    initialize_session_state()
+    store = get_store()
+    initialize_session_state(store)
     
     with st.sidebar:
         st.header("Settings")
@@ -135,6 +207,14 @@ def main() -> None:
         else:
             st.warning("API key cannot be empty!")
 
+        st.radio(
+            "Memory",
+            list(MEMORY_MODES),
+            key="memory_mode",
+            # Only new conversations pick it up; the current one keeps its memory
+            disabled=st.session_state['conversation'] is not None,
+        )
+
         st.divider()
         summarise_button = st.button("Summarise the conversation", key="summarise")
         if summarise_button:
@@ -144,22 +224,7 @@ def main() -> None:
         st.info("Please provide your OpenAI API key in the sidebar to start chatting.")
         return
         
-    display_conversation_history()
-    
-    prompt = handle_prompt()
-    if prompt:
-        with st.chat_message("user"):
-            st.write(prompt)
-        
-        with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = get_response(prompt)
-                if response:
-                    st.write(response)
-                else:
-                    st.error("Failed to get response. Please check your API key and try again.")
-        
-        st.rerun()
+    chat(store)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
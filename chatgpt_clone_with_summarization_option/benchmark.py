@@ -0,0 +1,250 @@
+"""
+Latency benchmarks for the chat memories, streaming and paged history in
+utils.py and app.py.
+
+Run with `python benchmark.py`, or `python benchmark.py memory|stream|rerun`
+for one of them. A fake chat model sleeps for every call like a network round
+trip, and per token like generation, so no API key is needed.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain.chains import ConversationChain
+from langchain.chains.conversation.memory import ConversationSummaryMemory
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from conversation_store import ConversationStore
+from utils import DeferredSummaryMemory, restore_memory, stream_response
+
+REPLY = " ".join(["Here is a fairly detailed answer to your question."] * 8)
+SUMMARY = " ".join(["The human and the AI discussed several topics."] * 6)
+
+
+class _SlowChatModel(BaseChatModel):
+    """Replies after a fixed delay; summary prompts get a summary."""
+
+    latency: float = 0.2
+    token_delay: float = 0.0
+    calls: int = 0
+    summary_calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake-chat"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self._reply(messages)
+        time.sleep(self.latency + self.token_delay * len(text.split(" ")))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        text = self._reply(messages)
+        time.sleep(self.latency)
+        for word in text.split(" "):
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        self.calls += 1
+        is_summary = "Progressively summarize" in messages[-1].content
+        self.summary_calls += is_summary
+        return SUMMARY if is_summary else REPLY
+
+    def get_num_tokens(self, text: str) -> int:
+        # About four characters per token, without downloading a tokenizer
+        return len(text) // 4 + 1
+
+
+def _run(memory_cls, turns: int, latency: float, **memory_kwargs):
+    llm = _SlowChatModel(latency=latency)
+    memory = memory_cls(llm=llm, **memory_kwargs)
+    conversation = ConversationChain(llm=llm, memory=memory)
+    timings = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        conversation.invoke({"input": f"Question {turn}: tell me more about topic {turn}."})
+        timings.append(time.perf_counter() - start)
+    if isinstance(memory, DeferredSummaryMemory):
+        memory.wait()
+    return timings, llm
+
+
+def benchmark_memory_latency(turns=50, latency=0.2, max_token_limit=1000):
+    """Per-turn latency of summary-every-turn memory against deferred summaries."""
+    print(f"Chat memory over {turns} turns ({latency * 1000:.0f} ms per LLM call, "
+          f"deferred budget {max_token_limit} tokens):")
+    results = {
+        "ConversationSummaryMemory": _run(ConversationSummaryMemory, turns, latency),
+        "DeferredSummaryMemory": _run(
+            DeferredSummaryMemory, turns, latency, max_token_limit=max_token_limit
+        ),
+    }
+    for name, (timings, llm) in results.items():
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(f"  {name:<26} mean {statistics.mean(timings) * 1000:6.0f} ms/turn | "
+              f"p95 {p95 * 1000:6.0f} ms | {llm.calls} LLM calls, {llm.summary_calls} summaries")
+
+
+def _stored_conversation(history_turns: int) -> str:
+    """Saves a scripted conversation to the CONVERSATION_DB_PATH store and returns its id."""
+    store = ConversationStore()
+    conversation_id = store.create_conversation()
+    for turn in range(history_turns):
+        store.add_message(conversation_id, "user", f"Question {turn}")
+        store.add_message(conversation_id, "assistant", REPLY)
+    return conversation_id
+
+
+def _use_store(directory: str) -> None:
+    """Points the app at a fresh conversation store in the given directory.
+
+    AppTest runs the app in this process, so the store that app.py keeps in
+    st.cache_resource would otherwise outlive the previous benchmark's
+    temporary directory.
+    """
+    os.environ["CONVERSATION_DB_PATH"] = os.path.join(directory, "conversations.sqlite")
+    st.cache_resource.clear()
+
+
+def _checked_run(app: AppTest) -> AppTest:
+    # AppTest records script errors instead of raising, which would time an error page
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"app.py failed: {app.exception[0].message}")
+    return app
+
+
+def _seconds_per_run(app: AppTest, runs: int) -> float:
+    _checked_run(app)
+    start = time.perf_counter()
+    for _ in range(runs):
+        _checked_run(app)
+    return (time.perf_counter() - start) / runs
+
+
+def _rerun_seconds(history_turns: int, runs: int = 5) -> float:
+    """Time of one script run of app.py with a stored conversation of the given length."""
+    app = AppTest.from_file("app.py", default_timeout=60)
+    app.session_state["API_Key"] = "sk-benchmark"
+    app.query_params["c"] = _stored_conversation(history_turns)
+    return _seconds_per_run(app, runs)
+
+
+def benchmark_streaming(latency=0.5, token_delay=0.02, history_turns=(10, 100)):
+    """Time to first token and total time of invoke + rerun against streaming."""
+    print(f"Response path ({latency * 1000:.0f} ms to first token, "
+          f"{token_delay * 1000:.0f} ms per token, {len(REPLY.split())}-token replies):")
+    llm = _SlowChatModel(latency=latency, token_delay=token_delay)
+    conversation = ConversationChain(llm=llm, memory=DeferredSummaryMemory(llm=llm))
+    start = time.perf_counter()
+    conversation.invoke({"input": "Tell me about streaming."})
+    blocking = time.perf_counter() - start
+
+    first_token = None
+    start = time.perf_counter()
+    for _ in stream_response(conversation, "Tell me more."):
+        if first_token is None:
+            first_token = time.perf_counter() - start
+    streamed = time.perf_counter() - start
+    assert len(conversation.memory.chat_memory.messages) == 4
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _use_store(tmp)
+        reruns = [_rerun_seconds(turns) for turns in history_turns]
+    for turns, rerun in zip(history_turns, reruns):
+        print(f"  {turns:>4} turns of history: invoke + st.rerun shows the reply after "
+              f"{(blocking + rerun) * 1000:5.0f} ms (rerun {rerun * 1000:.0f} ms) | "
+              f"stream: first token {first_token * 1000:4.0f} ms, complete {streamed * 1000:5.0f} ms")
+
+
+def _full_history_app():
+    """The chat before conversations were stored: every message drawn on every run."""
+    import streamlit as st
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    st.title("Chat with OpenAI")
+    for message in st.session_state["messages"]:
+        if isinstance(message, HumanMessage):
+            with st.chat_message("user"):
+                st.write(message.content)
+        elif isinstance(message, AIMessage):
+            with st.chat_message("assistant"):
+                st.write(message.content)
+    st.chat_input("Ask me anything!", key="input")
+
+
+def benchmark_rerun(messages=1000, runs=5, latency=0.2):
+    """Script run time with a long conversation, and the cost of restoring it after a refresh."""
+    with tempfile.TemporaryDirectory() as tmp:
+        _use_store(tmp)
+        conversation_id = _stored_conversation(messages // 2)
+        stored = [message.to_message() for message in ConversationStore().messages(conversation_id)]
+
+        full = AppTest.from_function(_full_history_app, default_timeout=60)
+        full.session_state["messages"] = stored
+        full_seconds = _seconds_per_run(full, runs)
+
+        paged = AppTest.from_file("app.py", default_timeout=60)
+        paged.session_state["API_Key"] = "sk-benchmark"
+        paged.query_params["c"] = conversation_id
+        paged_seconds = _seconds_per_run(paged, runs)
+        paged_drawn = len(paged.chat_message)
+        next(button for button in paged.button if button.label == "Load earlier messages").click().run()
+        loaded_drawn = len(paged.chat_message)
+
+    print(f"Script run with {len(stored):,} stored messages ({runs} runs each):")
+    print(f"  full history  {full_seconds * 1000:7.0f} ms/run, {len(full.chat_message):,} messages drawn")
+    print(f"  last page     {paged_seconds * 1000:7.0f} ms/run, {paged_drawn:,} messages drawn "
+          f"({loaded_drawn:,} after one 'Load earlier messages')")
+    print("  In a running app, sending a prompt reruns only the chat fragment; "
+          "AppTest always runs the whole script, so that saving is not shown here.")
+
+    print(f"Restoring the memory of {len(stored):,} messages after a refresh "
+          f"({latency * 1000:.0f} ms per LLM call):")
+    for memory_cls in (DeferredSummaryMemory, ConversationSummaryMemory):
+        llm = _SlowChatModel(latency=latency)
+        memory = memory_cls(llm=llm)
+        start = time.perf_counter()
+        restore_memory(memory, stored)
+        ready = time.perf_counter() - start
+        if isinstance(memory, DeferredSummaryMemory):
+            memory.wait()
+        done = time.perf_counter() - start
+        print(f"  {memory_cls.__name__:<26} ready to answer after {ready * 1000:6.0f} ms | "
+              f"summary done after {done * 1000:6.0f} ms, {llm.summary_calls} summary calls")
+
+
+if __name__ == "__main__":
+    which = sys.argv[1] if len(sys.argv) > 1 else "all"
+    if which in ("all", "memory"):
+        benchmark_memory_latency()
+    if which in ("all", "stream"):
+        benchmark_streaming()
+    if which in ("all", "rerun"):
+        benchmark_rerun()
@@ -0,0 +1,260 @@
+"""
+Conversation memory that summarizes in the background.
+
+ConversationSummaryMemory asks the LLM to rewrite the summary after every
+turn, which doubles the calls on the response path. DeferredSummaryMemory
+keeps recent turns verbatim and only summarizes once they pass a token
+budget. It then folds the oldest turns into the running summary on a
+background thread, so the reply is returned without waiting for it.
+
+restore_memory rebuilds a new memory from a stored conversation: the latest
+turns are kept verbatim and older ones are summarized a chunk at a time, so
+no summary prompt outgrows the context window.
+
+stream_response streams a ConversationChain's reply token by token and
+saves the turn to its memory once the reply is complete.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from langchain.chains import ConversationChain
+from langchain.memory import ConversationSummaryBufferMemory, ConversationSummaryMemory
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.messages import BaseMessage
+from pydantic import PrivateAttr
+
+# Tokens of verbatim turns kept before older ones are summarized
+DEFAULT_MAX_TOKEN_LIMIT = 1000
+# A summary pass folds turns until the verbatim part is below this share of
+# the limit, so the next pass is several turns away
+KEEP_RATIO = 0.5
+# Messages summarized per LLM call when a stored conversation is restored
+RESTORE_CHUNK_MESSAGES = 50
+
+logger = logging.getLogger(__name__)
+
+_summary_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_summary_executor() -> ThreadPoolExecutor:
+    """Return the thread pool shared by every conversation's summaries."""
+    global _summary_executor
+    if _summary_executor is None:
+        _summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+    return _summary_executor
+
+
+class DeferredSummaryMemory(ConversationSummaryBufferMemory):
+    """
+    Summary buffer memory whose summarization runs off the response path.
+
+    Token counts are taken once per message and cached, instead of
+    recounting the whole buffer every turn.
+
+    Args:
+        llm: The model used for summaries and token counts.
+        max_token_limit: Tokens of verbatim turns that trigger a summary.
+        keep_ratio: Share of max_token_limit left verbatim after a summary.
+    """
+
+    max_token_limit: int = DEFAULT_MAX_TOKEN_LIMIT
+    keep_ratio: float = KEEP_RATIO
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _token_counts: List[int] = PrivateAttr(default_factory=list)
+    _pending: Optional[Future] = PrivateAttr(default=None)
+    # Restored turns older than the verbatim ones, not yet in the summary
+    _unsummarized: List[BaseMessage] = PrivateAttr(default_factory=list)
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the running summary followed by the verbatim turns."""
+        with self._lock:
+            return super().load_memory_variables(inputs)
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """
+        Save a turn, and start a background summary if over the token budget
+        or if restored turns are still waiting to be summarized.
+        """
+        with self._lock:
+            count = len(self.chat_memory.messages)
+            BaseChatMemory.save_context(self, inputs, outputs)
+            for message in self.chat_memory.messages[count:]:
+                self._token_counts.append(self.llm.get_num_tokens_from_messages([message]))
+            over_budget = sum(self._token_counts) > self.max_token_limit
+            if self._pending is None and self._unsummarized:
+                # An earlier attempt failed; retry it before folding newer turns
+                self._pending = _get_summary_executor().submit(self._summarize_restored)
+            elif self._pending is None and over_budget:
+                self._pending = _get_summary_executor().submit(self._fold_oldest_turns)
+
+    def restore(self, messages: List[BaseMessage]) -> None:
+        """
+        Load a stored conversation into this empty memory.
+
+        The latest messages that fit in keep_ratio of the budget are kept
+        verbatim straight away; the older ones are summarized in the
+        background, so the next reply does not wait for them.
+        """
+        with self._lock:
+            target = int(self.max_token_limit * self.keep_ratio)
+            counts: List[int] = []
+            start = len(messages)
+            while start > 0:
+                count = self.llm.get_num_tokens_from_messages([messages[start - 1]])
+                # The latest message is always kept
+                if counts and sum(counts) + count > target:
+                    break
+                start -= 1
+                counts.insert(0, count)
+            self.chat_memory.add_messages(messages[start:])
+            self._token_counts.extend(counts)
+            if start:
+                self._unsummarized = list(messages[:start])
+                self._pending = _get_summary_executor().submit(self._summarize_restored)
+
+    def _summarize_restored(self) -> None:
+        # Each chunk is committed as soon as it is summarized, so a failure
+        # keeps the progress so far and the rest is retried on the next turn
+        while True:
+            with self._lock:
+                chunk = self._unsummarized[:RESTORE_CHUNK_MESSAGES]
+                summary = self.moving_summary_buffer
+                if not chunk:
+                    self._pending = None
+                    return
+            try:
+                new_summary = self.predict_new_summary(chunk, summary)
+            except Exception:
+                logger.exception(
+                    "Summary of the restored conversation failed; "
+                    "%d older messages will be retried on the next turn",
+                    len(self._unsummarized),
+                )
+                with self._lock:
+                    self._pending = None
+                return
+            with self._lock:
+                self.moving_summary_buffer = new_summary
+                del self._unsummarized[: len(chunk)]
+
+    def _fold_oldest_turns(self) -> None:
+        with self._lock:
+            target = int(self.max_token_limit * self.keep_ratio)
+            total = sum(self._token_counts)
+            folded = 0
+            while folded < len(self._token_counts) - 1 and total > target:
+                total -= self._token_counts[folded]
+                folded += 1
+            messages = list(self.chat_memory.messages[:folded])
+            summary = self.moving_summary_buffer
+        try:
+            # The LLM call runs without the lock; new turns are only appended meanwhile
+            new_summary = self.predict_new_summary(messages, summary)
+        except Exception:
+            logger.exception("Background summary failed; the turns stay verbatim and are retried")
+            with self._lock:
+                self._pending = None
+            return
+        with self._lock:
+            del self.chat_memory.messages[:folded]
+            del self._token_counts[:folded]
+            self.moving_summary_buffer = new_summary
+            self._pending = None
+
+    def prune(self) -> None:
+        """Summarize now, blocking; save_context normally does this in the background."""
+        self.wait()
+        if self._unsummarized:
+            self._summarize_restored()
+        if sum(self._token_counts) > self.max_token_limit:
+            self._fold_oldest_turns()
+
+    def wait(self) -> None:
+        """Block until a background summary in progress has finished."""
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def summary(self) -> str:
+        """
+        Return a summary of the whole conversation so far.
+
+        Turns that are still verbatim are folded into a copy of the running
+        summary, which costs one LLM call; the memory itself is unchanged.
+        """
+        self.wait()
+        with self._lock:
+            messages = self._unsummarized + list(self.chat_memory.messages)
+            summary = self.moving_summary_buffer
+        return self.predict_new_summary(messages, summary) if messages else summary
+
+    def clear(self) -> None:
+        """Clear the summary and the verbatim turns."""
+        self.wait()
+        with self._lock:
+            super().clear()
+            self._token_counts.clear()
+            self._unsummarized.clear()
+
+
+def _summarize_in_chunks(
+    memory: Union[ConversationSummaryMemory, ConversationSummaryBufferMemory],
+    messages: List[BaseMessage],
+    summary: str,
+) -> str:
+    for start in range(0, len(messages), RESTORE_CHUNK_MESSAGES):
+        summary = memory.predict_new_summary(
+            messages[start : start + RESTORE_CHUNK_MESSAGES], summary
+        )
+    return summary
+
+
+def restore_memory(
+    memory: Union[ConversationSummaryMemory, DeferredSummaryMemory],
+    messages: List[BaseMessage],
+) -> None:
+    """
+    Loads a stored conversation into a new, empty memory.
+
+    A DeferredSummaryMemory keeps the latest turns verbatim and summarizes
+    the rest in the background. A ConversationSummaryMemory summarizes the
+    whole conversation now, one LLM call per RESTORE_CHUNK_MESSAGES messages.
+
+    Args:
+        memory: The memory of a new ConversationChain.
+        messages: The conversation, oldest first.
+    """
+    if not messages:
+        return
+    if isinstance(memory, DeferredSummaryMemory):
+        memory.restore(messages)
+    else:
+        memory.buffer = _summarize_in_chunks(memory, messages, memory.buffer)
+
+
+def stream_response(conversation: ConversationChain, prompt: str) -> Iterator[str]:
+    """
+    Streams the reply to a prompt, then saves the turn to the chain's memory.
+
+    ConversationChain.invoke only returns once the whole reply is generated;
+    this formats the same prompt and streams it from the chain's model.
+
+    Args:
+        conversation: The chain whose model, prompt and memory are used.
+        prompt: The user's input prompt.
+
+    Yields:
+        The reply's text chunks as they arrive.
+    """
+    inputs = {conversation.input_key: prompt}
+    inputs.update(conversation.memory.load_memory_variables(inputs))
+    chunks = []
+    for chunk in conversation.llm.stream(conversation.prompt.format_prompt(**inputs)):
+        chunks.append(chunk.content)
+        yield chunk.content
+    conversation.memory.save_context(
+        {conversation.input_key: prompt}, {conversation.output_key: "".join(chunks)}
+    )
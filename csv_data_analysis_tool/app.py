@@ -41,11 +41,21 @@ def main() -> None:
 
     uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
     query = st.text_input("Enter your query")
+    preview = st.checkbox(
+        "Quick preview",
+        help="Answer from a random sample of rows instead of the whole file",
+    )
+    backend = st.radio(
+        "Engine",
+        ["pandas", "sql"],
+        format_func=lambda name: {"pandas": "pandas (in memory)", "sql": "DuckDB SQL (larger than memory)"}[name],
+        horizontal=True,
+    )
     button = st.button("Generate Response")
 
     if button and validate_inputs(uploaded_file, query):
         with st.spinner("Generating response..."):
-                response = query_agent(uploaded_file, query)
+                response = query_agent(uploaded_file, query, preview, backend=backend)
         st.write(response)
 
 
@@ -0,0 +1,468 @@
+"""
+Benchmarks for the CSV data analysis helpers in utils.py.
+
+Run with `python benchmark.py [size_mb]`. The agent runs on a scripted fake
+LLM over a scaled-up copy of employees.csv, so no API key is needed and the
+timings isolate the local work done per question.
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import pandas as pd
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.language_models.llms import LLM
+from langchain_experimental.agents import create_pandas_dataframe_agent
+
+import utils
+from query_planner import answer_directly
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "employees.csv")
+# One tool call, then a final answer: the shape of a typical aggregate question
+SCRIPTED_RESPONSES = [
+    "Thought: I should compute the mean salary.\nAction: python_repl_ast\nAction Input: df['SALARY'].mean()",
+    "Thought: I now know the final answer.\nFinal Answer: The average salary is about 6500.",
+]
+
+
+class _UploadedCsv(io.BytesIO):
+    """A CSV on disk, shaped like Streamlit's UploadedFile."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+        self.file_id = path
+        self.size = len(self.getvalue())
+
+
+def scaled_employees_csv(path: str, size_mb: Optional[int] = None, scale: Optional[int] = None) -> None:
+    """Write employees.csv's rows `scale` times, or until the file reaches size_mb."""
+    with open(SAMPLE_CSV, "rb") as f:
+        header, *rows = f.read().splitlines(keepends=True)
+    block = b"".join(rows) * 1000
+    with open(path, "wb") as f:
+        f.write(header)
+        if scale is not None:
+            for _ in range(scale // 1000):
+                f.write(block)
+            f.write(b"".join(rows) * (scale % 1000))
+            return
+        while f.tell() < size_mb * 1024 * 1024:
+            f.write(block)
+
+
+def _fake_llm() -> FakeListLLM:
+    return FakeListLLM(responses=SCRIPTED_RESPONSES)
+
+
+def _uncached_query(uploaded_file, query):
+    """What query_agent did before caching: parse and build on every call."""
+    uploaded_file.seek(0)
+    df = pd.read_csv(uploaded_file)
+    agent = create_pandas_dataframe_agent(_fake_llm(), df, verbose=False, allow_dangerous_code=True)
+    return agent.run(query)
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def benchmark_query_latency(size_mb=1024, queries=3):
+    """Per-question latency with and without the dataframe and profile cache."""
+    query = "What is the average salary?"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "employees.csv")
+        scaled_employees_csv(csv_path, size_mb)
+        uploaded = _UploadedCsv(csv_path)
+
+        uncached = [_timed(lambda: _uncached_query(uploaded, query)) for _ in range(queries)]
+
+        utils.DATAFRAME_CACHE_DIR = os.path.join(tmp_dir, "dataframes")
+        utils._llm = _fake_llm()
+        utils._agent_cache.clear()
+        utils._hash_by_file_id.clear()
+        first = _timed(lambda: utils.query_agent(uploaded, query, use_planner=False))
+        warm = [_timed(lambda: utils.query_agent(uploaded, query, use_planner=False)) for _ in range(queries)]
+
+        # A fresh process: nothing in memory, but the Parquet copy is on disk
+        utils._agent_cache.clear()
+        utils._hash_by_file_id.clear()
+        restart = _timed(lambda: utils.query_agent(uploaded, query, use_planner=False))
+
+    print(f"Per-query latency on a {size_mb} MB CSV (fake LLM, {queries} queries):")
+    print(f"  before (parse + build every query)  {min(uncached):7.3f}s")
+    print(f"  first query, cold cache             {first:7.3f}s")
+    print(f"  repeat query, warm cache            {min(warm):7.3f}s")
+    print(f"  first query after restart (Parquet) {restart:7.3f}s")
+
+
+def benchmark_memory_reduction(scale=1_000_000, measured_scale=20_000):
+    """
+    Dataframe memory of employees.csv scaled up, default vs compact dtypes.
+
+    Default dtypes need several times the container's memory at the full
+    scale, so they are measured at measured_scale and extrapolated linearly
+    (memory per row is constant for a replicated file).
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "employees.csv")
+        scaled_employees_csv(csv_path, scale=measured_scale)
+        with open(csv_path, "rb") as f:
+            default_bytes = pd.read_csv(f).memory_usage(deep=True).sum()
+            start = time.perf_counter()
+            compact = utils.read_csv_compact(f)
+            compact_seconds = time.perf_counter() - start
+            preview = utils.read_csv_compact(f, preview_rows=utils.PREVIEW_ROWS)
+        compact_bytes = compact.memory_usage(deep=True).sum()
+        rows = len(compact)
+        full_rows = rows * scale // measured_scale
+
+        if scale != measured_scale:
+            scaled_employees_csv(csv_path, scale=scale)
+            with open(csv_path, "rb") as f:
+                start = time.perf_counter()
+                full = utils.read_csv_compact(f)
+                full_seconds = time.perf_counter() - start
+            full_compact_bytes = full.memory_usage(deep=True).sum()
+            del full
+
+    print(f"Memory of employees.csv scaled {measured_scale:,}x ({rows:,} rows):")
+    print(f"  default dtypes  {default_bytes / 2**20:9.1f} MB ({default_bytes / rows:.0f} B/row)")
+    print(f"  compact dtypes  {compact_bytes / 2**20:9.1f} MB ({compact_bytes / rows:.0f} B/row), "
+          f"{default_bytes / compact_bytes:.1f}x smaller, loaded in {compact_seconds:.1f}s")
+    print(f"  preview         {len(preview):,} sampled rows, {preview.memory_usage(deep=True).sum() / 2**20:.1f} MB")
+    if scale != measured_scale:
+        print(f"Scaled {scale:,}x ({full_rows:,} rows):")
+        print(f"  default dtypes  {default_bytes / rows * full_rows / 2**30:9.2f} GB (extrapolated)")
+        print(f"  compact dtypes  {full_compact_bytes / 2**30:9.2f} GB (measured, loaded in {full_seconds:.0f}s)")
+
+
+# Fixed question set, with the pandas code a competent agent would run for each
+AGENT_QUESTIONS = {
+    "What is the average salary?": "df['SALARY'].mean()",
+    "How many employees are in each department?": "df['DEPARTMENT_ID'].value_counts().to_dict()",
+    "Which job has the highest salary?": "df.loc[df['SALARY'].idxmax(), 'JOB_ID']",
+    "How many employees were hired after 2005?": "(df['HIRE_DATE'] > '2005-12-31').sum()",
+    "How many distinct job ids are there?": "df['JOB_ID'].nunique()",
+}
+# What the agent calls first when the prompt only shows df.head()
+EXPLORATION_STEPS = ["df.info()", "df.describe()", "df.nunique()"]
+
+
+class _ScriptedAgentLLM(LLM):
+    """
+    Fake ReAct model: explores the dataframe unless the prompt has a
+    profile, runs the question's code, then answers with its output.
+    """
+
+    latency: float = 0.5
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-agent"
+
+    def _steps(self, prompt, question):
+        has_profile = "range or top values" in prompt
+        code = ([] if has_profile else EXPLORATION_STEPS) + [AGENT_QUESTIONS[question]]
+        return [("python_repl_ast", step) for step in code]
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        self.calls += 1
+        scratchpad = prompt.rsplit("Question: ", 1)[1]
+        question = scratchpad.split("\n", 1)[0]
+        for tool, step in self._steps(prompt, question):
+            if f"Action Input: {step}" not in scratchpad:
+                return f"Thought: I should run {step}\nAction: {tool}\nAction Input: {step}"
+        observation = scratchpad.rsplit("Observation: ", 1)[1].split("\nThought", 1)[0]
+        return f"Thought: I now know the final answer.\nFinal Answer: {observation.strip()}"
+
+
+def benchmark_agent_steps(latency=0.5, scale=20_000):
+    """Average LLM steps and latency per question, with and without the profile."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "employees.csv")
+        scaled_employees_csv(csv_path, scale=scale)
+        with open(csv_path, "rb") as f:
+            df = utils.read_csv_compact(f)
+
+        results = {}
+        start = time.perf_counter()
+        profile = utils.profile_dataframe(df)
+        profile_seconds = time.perf_counter() - start
+        prefixes = {"head only (before)": None, "with profile": utils._profile_prefix(profile)}
+        for label, prefix in prefixes.items():
+            llm = _ScriptedAgentLLM(latency=latency)
+            kwargs = {"prefix": prefix} if prefix else {}
+            agent = create_pandas_dataframe_agent(llm, df, allow_dangerous_code=True, **kwargs)
+            start = time.perf_counter()
+            for question in AGENT_QUESTIONS:
+                agent.invoke({"input": question})
+            elapsed = time.perf_counter() - start
+            results[label] = (llm.calls / len(AGENT_QUESTIONS), elapsed / len(AGENT_QUESTIONS))
+
+    print(f"Agent steps on {len(AGENT_QUESTIONS)} questions over {len(df):,} rows "
+          f"(scripted LLM, {latency * 1000:.0f} ms per call):")
+    for label, (steps, seconds) in results.items():
+        print(f"  {label:20} {steps:.1f} LLM calls/query, {seconds:.2f}s/query")
+    print(f"  profile computed once in {profile_seconds:.2f}s")
+
+
+# A mix of questions inside and outside the query planner's grammar
+PLANNER_QUESTIONS = [
+    "What is the average salary?",
+    "Average salary by department",
+    "How many rows are there?",
+    "How many employees are in each department?",
+    "Max salary where department is 90",
+    "Which job has the highest salary?",
+    "Top 5 employees by salary",
+    "How many distinct job ids are there?",
+    "Total salary per job where salary > 5000",
+    "Median salary for department_id = 50",
+    "How many employees were hired after 2005?",
+    "Who has the lowest salary?",
+    "Which manager has the most direct reports?",
+    "Summarize the hiring trends over time",
+    "Is there a correlation between salary and hire date?",
+    "Which employees have an email starting with S?",
+]
+
+
+# Questions the planner once answered wrongly, with the answer expected on
+# employees.csv; None means the question must go to the agent
+PLANNER_REGRESSIONS = [
+    ("What is the total number of employees?", "50"),
+    ("Total number of employees", "50"),
+    ("Average salary for employees hired after 2005", None),
+    ("Average salary by department for employees hired after 2005", None),
+    ("Average salary where salary > 100000", None),
+]
+
+
+def check_planner_regressions():
+    """The planner answers each regression question as expected, or leaves it to the agent."""
+    df = pd.read_csv(SAMPLE_CSV)
+    passed = 0
+    for question, expected in PLANNER_REGRESSIONS:
+        answer = answer_directly(df, question)
+        ok = answer == expected if expected is None else answer is not None and answer.strip() == expected
+        passed += ok
+        if not ok:
+            print(f"  [FAIL] {question!r}: got {answer!r}, expected {expected!r}")
+    print(f"Query planner regressions: {passed}/{len(PLANNER_REGRESSIONS)} pass")
+    return passed == len(PLANNER_REGRESSIONS)
+
+
+def benchmark_query_planner(latency=0.5, scale=20_000):
+    """Share of questions answered without the LLM, and their latency."""
+    check_planner_regressions()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "employees.csv")
+        scaled_employees_csv(csv_path, scale=scale)
+        uploaded = _UploadedCsv(csv_path)
+        utils.DATAFRAME_CACHE_DIR = os.path.join(tmp_dir, "dataframes")
+        utils._agent_cache.clear()
+        utils._hash_by_file_id.clear()
+        utils._llm = _ScriptedAgentLLM(latency=latency)
+        df, _ = utils.get_agent(uploaded)
+
+        planner_seconds = []
+        for question in PLANNER_QUESTIONS:
+            start = time.perf_counter()
+            answer = answer_directly(df, question)
+            if answer is not None:
+                planner_seconds.append(time.perf_counter() - start)
+
+        with_agent = {}
+        for use_planner in (False, True):
+            utils._llm.calls = 0
+            start = time.perf_counter()
+            for question in AGENT_QUESTIONS:
+                utils.query_agent(uploaded, question, use_planner=use_planner)
+            with_agent[use_planner] = (
+                (time.perf_counter() - start) / len(AGENT_QUESTIONS),
+                utils._llm.calls / len(AGENT_QUESTIONS),
+            )
+
+    served = len(planner_seconds)
+    print(f"Query planner over {len(df):,} rows:")
+    print(f"  served without the LLM  {served}/{len(PLANNER_QUESTIONS)} questions "
+          f"({served / len(PLANNER_QUESTIONS):.0%}), "
+          f"median {sorted(planner_seconds)[served // 2] * 1000:.1f} ms, max {max(planner_seconds) * 1000:.1f} ms")
+    for use_planner, (seconds, calls) in with_agent.items():
+        label = "with planner" if use_planner else "agent only (before)"
+        print(f"  {label:22} {seconds:.2f}s/query, {calls:.1f} LLM calls/query "
+              f"on the {len(AGENT_QUESTIONS)} agent questions ({latency * 1000:.0f} ms per call)")
+
+
+# The same questions as AGENT_QUESTIONS, as the SQL agent would write them
+SQL_QUESTIONS = {
+    "What is the average salary?": "SELECT AVG(SALARY) FROM csv_employees",
+    "How many employees are in each department?":
+        "SELECT DEPARTMENT_ID, COUNT(*) FROM csv_employees GROUP BY DEPARTMENT_ID ORDER BY 2 DESC",
+    "Which job has the highest salary?": "SELECT JOB_ID FROM csv_employees ORDER BY SALARY DESC LIMIT 1",
+    "How many employees were hired after 2005?":
+        "SELECT COUNT(*) FROM csv_employees WHERE HIRE_DATE > DATE '2005-12-31'",
+    "How many distinct job ids are there?": "SELECT COUNT(DISTINCT JOB_ID) FROM csv_employees",
+}
+
+
+class _ScriptedSqlLLM(_ScriptedAgentLLM):
+    """Fake ReAct model for the SQL agent: reads the schema, runs one query."""
+
+    def _steps(self, prompt, question):
+        return [("sql_db_schema", "csv_employees"), ("sql_db_query", SQL_QUESTIONS[question])]
+
+
+def _peak_rss_mb():
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark_sql_backend(scale=200_000, latency=0.0):
+    """
+    Query latency of the DuckDB SQL backend against the pandas backend.
+
+    The scripted LLMs answer instantly, so the timings are the backends'
+    own cost: loading the file on the first question, then running queries.
+    """
+    backends = {"pandas": _ScriptedAgentLLM, "sql": _ScriptedSqlLLM}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "employees.csv")
+        scaled_employees_csv(csv_path, scale=scale)
+        uploaded = _UploadedCsv(csv_path)
+        utils.DATAFRAME_CACHE_DIR = os.path.join(tmp_dir, "dataframes")
+
+        # SQL first, so its peak memory isn't masked by the pandas dataframe
+        for backend in ("sql", "pandas"):
+            utils._agent_cache.clear()
+            utils._hash_by_file_id.clear()
+            utils._llm = backends[backend](latency=latency)
+            questions = list(AGENT_QUESTIONS)
+            start = time.perf_counter()
+            utils.query_agent(uploaded, questions[0], use_planner=False, backend=backend)
+            cold = time.perf_counter() - start
+            warm = []
+            for question in questions:
+                start = time.perf_counter()
+                utils.query_agent(uploaded, question, use_planner=False, backend=backend)
+                warm.append(time.perf_counter() - start)
+            results[backend] = (cold, sum(warm) / len(warm), max(warm), _peak_rss_mb())
+        utils._agent_cache.clear()
+
+    print(f"SQL vs pandas backend on employees.csv scaled {scale:,}x ({scale * 50:,} rows, "
+          f"{os.cpu_count()} CPU):")
+    for backend, (cold, mean, worst, rss) in results.items():
+        print(f"  {backend:6}  first question {cold:6.2f}s, then {mean:.3f}s/query "
+              f"(max {worst:.3f}s), peak RSS {rss:,.0f} MB")
+
+
+def _python_tool(agent):
+    return next(tool for tool in agent.tools if tool.name == "python_repl_ast")
+
+
+def benchmark_worker_pool(workers=4, slow_queries=4, slow_seconds=2.0):
+    """
+    Concurrency check for the agent code worker pool.
+
+    Several questions about the same file each get an agent from
+    utils.get_agent, as in the app. Their slow queries and one runaway
+    query run at once; the check is that the slow ones all finish in about
+    one query's time, the runaway one is stopped by its CPU limit, the
+    server thread stays responsive, and variables carry over between a
+    question's calls but not into the next question.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from code_workers import WorkerPool
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        uploaded = _UploadedCsv(SAMPLE_CSV)
+        utils.DATAFRAME_CACHE_DIR = os.path.join(tmp_dir, "dataframes")
+        utils._agent_cache.clear()
+        utils._hash_by_file_id.clear()
+        utils._llm = _fake_llm()
+
+        start = time.perf_counter()
+        pool = utils._worker_pool = WorkerPool(workers + 1, cpu_seconds=2, memory_mb=1024, timeout=30)
+
+        def ask(code):
+            """One question on its own agent, as query_agent runs it."""
+            # Every session uploads its own copy of the file
+            _, agent = utils.get_agent(_UploadedCsv(SAMPLE_CSV))
+            tool = _python_tool(agent)
+            try:
+                return tool.run(code)
+            finally:
+                tool.close()
+
+        # Parse once, then warm every worker: spawn and load the dataframe
+        utils.get_dataframe(uploaded)
+        with ThreadPoolExecutor(workers + 1) as executor:
+            list(executor.map(lambda _: ask("import time; time.sleep(0.5); len(df)"), range(workers + 1)))
+        warmup = time.perf_counter() - start
+
+        slow_code = f"import time; time.sleep({slow_seconds}); df['SALARY'].sum()"
+        with ThreadPoolExecutor(slow_queries + 1) as executor:
+            start = time.perf_counter()
+            runaway = executor.submit(ask, "while True: pass")
+            time.sleep(0.1)
+            slow = [executor.submit(ask, slow_code) for _ in range(slow_queries)]
+            # Meanwhile, the server thread answers a planner question
+            _, df = utils.get_dataframe(uploaded)
+            planner_start = time.perf_counter()
+            answer_directly(df, "What is the average salary?")
+            planner_ms = (time.perf_counter() - planner_start) * 1000
+            slow_results = [future.result() for future in slow]
+            slow_wall = time.perf_counter() - start
+            runaway_result = runaway.result()
+            runaway_wall = time.perf_counter() - start
+
+        # A multi-step answer: the second call reads what the first defined
+        _, agent = utils.get_agent(uploaded)
+        tool = _python_tool(agent)
+        tool.run("total = df['SALARY'].sum()")
+        carried = tool.run("total")
+        tool.run("df = df[df['SALARY'] > 20000]; df.drop(columns='SALARY', inplace=True)")
+        tool.close()
+        # The next question starts from the whole file again
+        next_question = ask("len(df), 'SALARY' in df")
+        utils._worker_pool = None
+        pool.close()
+
+    expected = str(df["SALARY"].sum())
+    checks = {
+        "slow queries return correct results": all(result == expected for result in slow_results),
+        "slow queries ran concurrently": slow_wall < slow_seconds * slow_queries / 2,
+        "runaway query stopped by CPU limit": runaway_result.startswith("CpuLimitExceeded"),
+        "server thread stayed responsive": planner_ms < 100,
+        "variables carry over within a question": carried == expected,
+        "variables don't leak into the next question": next_question == f"({len(df)}, True)",
+    }
+    print(f"Worker pool with {workers + 1} workers (started and warmed in {warmup:.1f}s, {os.cpu_count()} CPU):")
+    print(f"  {slow_queries} x {slow_seconds:g}s slow queries on one file finished in {slow_wall:.2f}s "
+          f"(serial: {slow_seconds * slow_queries:.0f}s); runaway stopped after {runaway_wall:.2f}s; "
+          f"planner answered in {planner_ms:.1f} ms meanwhile")
+    for check, passed in checks.items():
+        print(f"  [{'PASS' if passed else 'FAIL'}] {check}")
+    return all(checks.values())
+
+
+if __name__ == "__main__":
+    benchmark_query_latency(int(sys.argv[1]) if len(sys.argv) > 1 else 1024)
+    benchmark_memory_reduction()
+    benchmark_agent_steps()
+    benchmark_query_planner()
+    benchmark_sql_backend()
+    benchmark_worker_pool()
@@ -0,0 +1,273 @@
+"""
+Subprocess workers that run the pandas agent's generated code.
+
+The agent's python_repl_ast tool normally executes model-written code inside
+the Streamlit server. WorkerPool instead keeps a few pre-warmed worker
+processes, each holding the dataframes it has loaded from their Parquet
+copies. Every question's agent gets its own session (one
+IsolatedPythonTool), which starts on the least busy worker and stays there
+until the question is answered, so the variables its code defines carry
+over between its calls like in the in-process tool, but never into another
+question. Each call runs under a CPU-time limit, and each worker under an
+address-space limit; a call that exceeds the wall-clock timeout gets its
+worker killed and replaced. One runaway query therefore only holds up its
+own worker, and other questions, on the same file or not, run in parallel
+on the other cores.
+
+The limits rely on the resource module and /proc, so workers are only
+supported on Linux (WORKERS_SUPPORTED); elsewhere the app runs agent code
+in-process as before.
+"""
+
+import multiprocessing
+import signal
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from langchain_core.tools import BaseTool
+from pydantic import Field
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+# RLIMIT_AS and /proc/self/statm behave as needed on Linux only; macOS
+# rejects the address-space limit and Windows has neither
+WORKERS_SUPPORTED = resource is not None and sys.platform.startswith("linux")
+# Dataframes each worker keeps loaded, least recently used first out
+WORKER_CACHED_FRAMES = 2
+# Agent sessions whose variables each worker keeps, least recently used first out
+WORKER_CACHED_SESSIONS = 16
+# Workers are replaced after this many calls, to shed leaked memory
+WORKER_MAX_CALLS = 200
+
+# pandas 3 always copies on write, so a shallow copy is already private
+_COPY_ON_WRITE = int(pd.__version__.split(".")[0]) >= 3
+
+
+def private_copy(df: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Returns a copy of df that agent code can modify, inplace or not,
+    without changing df itself.
+    """
+    return df.copy(deep=not _COPY_ON_WRITE)
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+def _on_cpu_limit(signum, frame):
+    raise CpuLimitExceeded("query used too much CPU time and was stopped")
+
+
+def _worker_main(conn, cpu_seconds: float, memory_mb: int) -> None:
+    """
+    Serves ("run", session_id, parquet_path, code, ended_sessions) requests
+    until the pipe closes.
+    """
+    from langchain_experimental.tools.python.tool import PythonAstREPLTool
+
+    # Imports are done, so what is mapped now is the baseline, not the budget
+    with open("/proc/self/statm") as f:
+        baseline = int(f.read().split()[0]) * resource.getpagesize()
+    limit = baseline + memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    frames: "OrderedDict[str, Any]" = OrderedDict()
+    # One REPL per agent session, so variables survive between its calls
+    sessions: "OrderedDict[str, PythonAstREPLTool]" = OrderedDict()
+    conn.send("ready")
+    while True:
+        try:
+            _, session_id, parquet_path, code, ended_sessions = conn.recv()
+        except EOFError:
+            return
+        for ended in ended_sessions:
+            sessions.pop(ended, None)
+        try:
+            if session_id not in sessions:
+                if parquet_path not in frames:
+                    frames[parquet_path] = pd.read_parquet(parquet_path)
+                    while len(frames) > WORKER_CACHED_FRAMES:
+                        frames.popitem(last=False)
+                frames.move_to_end(parquet_path)
+                # A private copy, so one session's inplace edits don't reach the others
+                sessions[session_id] = PythonAstREPLTool(
+                    locals={"df": private_copy(frames[parquet_path])}
+                )
+                while len(sessions) > WORKER_CACHED_SESSIONS:
+                    sessions.popitem(last=False)
+            sessions.move_to_end(session_id)
+
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = usage.ru_utime + usage.ru_stime
+            hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+            resource.setrlimit(resource.RLIMIT_CPU, (int(used + cpu_seconds) + 1, hard))
+            try:
+                result = str(sessions[session_id].run(code))
+            finally:
+                resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+        except Exception as e:
+            # Errors in the code itself are reported by the tool; these are
+            # loading failures and limits hit outside the tool's own handler
+            result = f"{type(e).__name__}: {e}"
+        conn.send(result)
+
+
+class _Worker:
+    def __init__(self, context, cpu_seconds: float, memory_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, cpu_seconds, memory_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.calls = 0
+
+    def wait_ready(self) -> None:
+        self.conn.recv()
+
+    def stop(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    Pool of pre-warmed processes that run agent code against dataframes.
+
+    Args:
+        size: The number of worker processes.
+        cpu_seconds: CPU time allowed per call.
+        memory_mb: Memory each worker may use beyond its imports.
+        timeout: Wall-clock seconds allowed per call.
+    """
+
+    def __init__(self, size: int, cpu_seconds: float, memory_mb: int, timeout: float):
+        if not WORKERS_SUPPORTED:
+            raise RuntimeError(f"Agent code workers are not supported on {sys.platform}")
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        # spawn, not fork: the server process has threads and open sockets
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        # One lock per worker slot; a slot runs one call at a time
+        self._slot_locks = [threading.Lock() for _ in range(size)]
+        self._workers: List[_Worker] = [self._start_worker() for _ in range(size)]
+        self._session_slots: Dict[str, int] = {}
+        # Open sessions per slot, and ended ones whose variables the worker can drop
+        self._slot_sessions = [0] * size
+        self._ended_sessions: List[List[str]] = [[] for _ in range(size)]
+        self._next_slot = 0
+
+    def _start_worker(self) -> _Worker:
+        return _Worker(self._context, self.cpu_seconds, self.memory_mb)
+
+    def _replace(self, slot: int) -> None:
+        # The sessions pinned to this slot lose their variables, as after a restart
+        self._workers[slot].stop()
+        self._workers[slot] = self._start_worker()
+
+    def _slot(self, session_id: str) -> int:
+        with self._lock:
+            slot = self._session_slots.get(session_id)
+            if slot is None:
+                # The slot with the fewest open sessions, taking turns among ties
+                size = len(self._workers)
+                order = [(self._next_slot + i) % size for i in range(size)]
+                slot = min(order, key=lambda i: self._slot_sessions[i])
+                self._next_slot = slot + 1
+                self._session_slots[session_id] = slot
+                self._slot_sessions[slot] += 1
+            return slot
+
+    def end_session(self, session_id: str) -> None:
+        """
+        Frees a session's worker slot; its variables are dropped on the next call there.
+
+        Args:
+            session_id: The session, once its question has been answered.
+        """
+        with self._lock:
+            slot = self._session_slots.pop(session_id, None)
+            if slot is not None:
+                self._slot_sessions[slot] -= 1
+                self._ended_sessions[slot].append(session_id)
+
+    def run(self, session_id: str, parquet_path: str, code: str) -> str:
+        """
+        Runs code against the dataframe in parquet_path on the session's worker.
+
+        Args:
+            session_id: The agent session; its calls share one worker and
+                the variables they define until end_session.
+            parquet_path: The Parquet copy of the dataframe, bound to `df`.
+            code: The Python code the agent wants to run.
+
+        Returns:
+            The code's output, or an error message if it failed or hit a limit.
+        """
+        slot = self._slot(session_id)
+        with self._slot_locks[slot]:
+            worker = self._workers[slot]
+            try:
+                if worker.calls == 0:
+                    worker.wait_ready()
+                worker.calls += 1
+                with self._lock:
+                    ended, self._ended_sessions[slot] = self._ended_sessions[slot], []
+                worker.conn.send(("run", session_id, parquet_path, code, ended))
+                if not worker.conn.poll(self.timeout):
+                    self._replace(slot)
+                    return f"TimeoutError: query took longer than {self.timeout:g}s and was stopped"
+                result = worker.conn.recv()
+            except (EOFError, OSError):
+                # The worker died, e.g. killed by the kernel for running out of memory
+                self._replace(slot)
+                return "MemoryError: the query's worker process died and was restarted"
+
+            if worker.calls >= WORKER_MAX_CALLS:
+                self._replace(slot)
+            return result
+
+    def close(self) -> None:
+        """Stops every worker process."""
+        for slot, lock in enumerate(self._slot_locks):
+            with lock:
+                self._workers[slot].stop()
+
+
+class IsolatedPythonTool(BaseTool):
+    """
+    Drop-in for the agent's python_repl_ast tool that runs code on a WorkerPool.
+
+    Each question's agent gets its own tool and session id; call close()
+    once the question is answered.
+    """
+
+    name: str = "python_repl_ast"
+    description: str = (
+        "A Python shell. Use this to execute python commands. "
+        "Input should be a valid python command. "
+        "When using this tool, sometimes output is abbreviated - "
+        "make sure it does not look abbreviated before using it in your answer."
+    )
+    pool: Any
+    parquet_path: str
+    session_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+
+    def _run(self, query: str, run_manager: Optional[Any] = None) -> str:
+        return self.pool.run(self.session_id, self.parquet_path, query)
+
+    def close(self) -> None:
+        """Ends the session, freeing its worker slot and variables."""
+        self.pool.end_session(self.session_id)
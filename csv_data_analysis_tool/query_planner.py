@@ -0,0 +1,360 @@
+"""
+Deterministic fast path for simple questions about a dataframe.
+
+The planner recognizes a small grammar of questions and answers them with
+vectorized pandas, without calling the LLM:
+
+  how many rows|<column> [in each <column>] [where <column> <op> <value>]
+  [total] number|count of rows|<column> [by <column>] [where <column> <op> <value>]
+  how many distinct <column>
+  <aggregate> <column> [by <column>] [where <column> <op> <value>]
+  top|bottom <k> [<rows>] by <column> [where <column> <op> <value>]
+  which|who <...> highest|lowest <column>
+
+where <aggregate> is one of average, mean, sum, total, min, max, median or
+count, and <op> is one of is, =, !=, is not, >, <, >=, <=, above, below,
+after or before. Column phrases match a column name up to case, spacing,
+underscores, plurals and an _ID/_NAME/_CODE/_PCT suffix, so "average salary
+by department" maps to SALARY and DEPARTMENT_ID. Anything else, a phrase
+that fits more than one column, or a NaN or empty result returns None and
+the question goes to the agent.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+AGGREGATES = {
+    "average": "mean",
+    "avg": "mean",
+    "mean": "mean",
+    "sum": "sum",
+    "total": "sum",
+    "min": "min",
+    "minimum": "min",
+    "lowest": "min",
+    "smallest": "min",
+    "max": "max",
+    "maximum": "max",
+    "highest": "max",
+    "largest": "max",
+    "median": "median",
+    "count": "count",
+}
+OPERATORS = {
+    "is not": "!=",
+    "!=": "!=",
+    ">=": ">=",
+    "<=": "<=",
+    "=": "==",
+    "==": "==",
+    "is": "==",
+    "equals": "==",
+    ">": ">",
+    "above": ">",
+    "over": ">",
+    "greater than": ">",
+    "more than": ">",
+    "after": ">",
+    "<": "<",
+    "below": "<",
+    "under": "<",
+    "less than": "<",
+    "before": "<",
+}
+# Suffixes that name a column without changing what it is about
+COLUMN_SUFFIXES = (" id", " name", " code", " pct")
+
+_OPERATOR_PATTERN = "|".join(
+    re.escape(op) for op in sorted(OPERATORS, key=len, reverse=True)
+)
+_WHERE = re.compile(
+    rf"\s+(?:where|with|whose|for|when)\s+(?P<column>.+?)\s+"
+    rf"(?P<op>{_OPERATOR_PATTERN})\s+(?P<value>.+)$"
+)
+ROW_WORDS = {"row", "record", "entry", "line", "item"}
+
+_COUNT = re.compile(
+    r"^how many (?P<what>[\w ]+?)(?: are there| were there| are| were| in total)?"
+    r"(?: (?:in each|for each|in every|per|by) (?P<group>.+))?$"
+)
+_NUMBER_OF = re.compile(
+    r"^(?:what is |what's |show |give me |find |compute )?(?:the )?(?:total )?"
+    r"(?:number|count) of (?P<what>[\w ]+?)"
+    r"(?:\s+(?:by|per|for each|grouped by|in each) (?P<group>.+))?$"
+)
+_DISTINCT = re.compile(r"^how many (?:distinct|unique|different) (?P<column>.+?)(?: are there| values)?$")
+_AGGREGATE = re.compile(
+    rf"^(?:what is |what's |show |give me |find |compute )?(?:the )?"
+    rf"(?P<agg>{'|'.join(AGGREGATES)})(?: of)? (?:the )?(?P<column>.+?)"
+    rf"(?:\s+(?:by|per|for each|grouped by|in each) (?P<group>.+))?$"
+)
+_TOP_K = re.compile(
+    r"^(?:show |list |give me |what are |who are |which are )?(?:the )?"
+    r"(?P<direction>top|bottom|first|last) (?P<k>\d+)(?: \w+)? by (?P<column>.+)$"
+)
+_ARGMAX = re.compile(
+    r"^(?:which|who|what)(?: (?P<target>.+?))? (?:has|have|had|earns|earn|gets|get) "
+    r"the (?P<extreme>highest|lowest|largest|smallest|most|least|max|min|maximum|minimum) (?P<column>.+)$"
+)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[\s_\-]+", " ", text.strip().lower())
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _key(text: str) -> str:
+    return " ".join(_singular(word) for word in _normalize(text).split())
+
+
+def match_column(phrase: str, columns: List[str]) -> Optional[str]:
+    """
+    Maps a phrase from a question to a dataframe column.
+
+    Args:
+        phrase: Words naming a column, e.g. "salaries" or "department".
+        columns: The dataframe's column names.
+
+    Returns:
+        The matching column name, or None if no column or more than one matches.
+    """
+    phrase = re.sub(r"^(?:the|all|each|every) ", "", _key(phrase))
+    keys = {column: _key(str(column)) for column in columns}
+    matches = [column for column, key in keys.items() if key == phrase]
+    if not matches:
+        matches = [
+            column
+            for column, key in keys.items()
+            if any(key.endswith(suffix) and key[: -len(suffix)] == phrase for suffix in COLUMN_SUFFIXES)
+        ]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _parse_value(series: pd.Series, value: str) -> Any:
+    value = value.strip().strip("'\"").rstrip("?.")
+    if pd.api.types.is_numeric_dtype(series):
+        return float(value.replace(",", ""))
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Timestamp(value)
+    return value
+
+
+def _mask(df: pd.DataFrame, condition: Dict[str, Any]) -> pd.Series:
+    series = df[condition["column"]]
+    value = condition["value"]
+    op = condition["op"]
+    if isinstance(value, str) and op in ("==", "!="):
+        # Match text case-insensitively; for categoricals only the categories are compared
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            wanted = [c for c in series.cat.categories if str(c).strip().lower() == value.lower()]
+            mask = series.isin(wanted)
+        else:
+            mask = series.astype(str).str.strip().str.lower() == value.lower()
+        return mask if op == "==" else ~mask
+    if isinstance(value, str):
+        raise ValueError(f"Cannot compare text column {condition['column']} with {op}")
+    return {
+        ">": series > value,
+        "<": series < value,
+        ">=": series >= value,
+        "<=": series <= value,
+        "==": series == value,
+        "!=": series != value,
+    }[op]
+
+
+def plan_query(question: str, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """
+    Parses a question into a plan over the dataframe's columns.
+
+    Args:
+        question: The user's question.
+        df: The dataframe the question is about.
+
+    Returns:
+        The plan as a dict with a "kind" key, or None if the question is
+        outside the grammar or names a column that doesn't exist.
+    """
+    columns = list(df.columns)
+    # Only case and spacing are normalized here: values like IT_PROG keep their underscores
+    text = re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.! ")
+
+    condition = None
+    where = _WHERE.search(text)
+    if where:
+        column = match_column(where.group("column"), columns)
+        if column is None:
+            return None
+        try:
+            value = _parse_value(df[column], where.group("value"))
+        except ValueError:
+            return None
+        condition = {"column": column, "op": OPERATORS[where.group("op")], "value": value}
+        text = text[: where.start()]
+
+    match = _DISTINCT.match(text)
+    if match:
+        column = match_column(match.group("column"), columns)
+        return column and {"kind": "distinct", "column": column, "where": condition}
+
+    match = _TOP_K.match(text)
+    if match:
+        column = match_column(match.group("column"), columns)
+        if column is None or not pd.api.types.is_numeric_dtype(df[column]):
+            return None
+        return {
+            "kind": "top_k",
+            "column": column,
+            "k": int(match.group("k")),
+            "largest": match.group("direction") in ("top", "first"),
+            "where": condition,
+        }
+
+    match = _ARGMAX.match(text)
+    if match:
+        column = match_column(match.group("column"), columns)
+        target = match.group("target")
+        target_column = match_column(target, columns) if target else None
+        if column is None or not pd.api.types.is_numeric_dtype(df[column]):
+            return None
+        return {
+            "kind": "argmax",
+            "column": column,
+            "target": target_column,
+            "largest": match.group("extreme") in ("highest", "largest", "most", "max", "maximum"),
+            "where": condition,
+        }
+
+    match = _NUMBER_OF.match(text)
+    if match:
+        return _count_plan(match.group("what"), match.group("group"), condition, df)
+
+    match = _AGGREGATE.match(text)
+    if match:
+        agg = AGGREGATES[match.group("agg")]
+        column = match_column(match.group("column"), columns)
+        group = match.group("group")
+        group_column = match_column(group, columns) if group else None
+        if group and group_column is None:
+            return None
+        if column is None:
+            return None
+        if agg not in ("count", "min", "max") and not pd.api.types.is_numeric_dtype(df[column]):
+            return None
+        return {
+            "kind": "aggregate",
+            "agg": agg,
+            "column": column,
+            "group": group_column,
+            "where": condition,
+        }
+
+    match = _COUNT.match(text)
+    if match:
+        return _count_plan(match.group("what"), match.group("group"), condition, df)
+    return None
+
+
+def _count_plan(
+    what: str, group: Optional[str], condition: Optional[Dict[str, Any]], df: pd.DataFrame
+) -> Optional[Dict[str, Any]]:
+    columns = list(df.columns)
+    group_column = match_column(group, columns) if group else None
+    if group and group_column is None:
+        return None
+    what = _singular(what)
+    column = None if what in ROW_WORDS else match_column(what, columns)
+    if column is None and what not in ROW_WORDS and " " in what:
+        # "how many employees were hired after 2005" is not a plain row count
+        return None
+    if column is not None and group_column is None and not df[column].is_unique:
+        # "how many departments" asks for distinct values, not rows
+        return {"kind": "distinct", "column": column, "where": condition}
+    # "number of employees" named by a unique EMPLOYEE_ID counts rows
+    return {"kind": "aggregate", "agg": "count", "column": None, "group": group_column, "where": condition}
+
+
+def _format(result: Any) -> str:
+    if isinstance(result, pd.DataFrame):
+        return result.to_string(index=False)
+    if isinstance(result, pd.Series):
+        return result.to_string()
+    if isinstance(result, float):
+        return f"{result:,.2f}"
+    return str(result)
+
+
+def run_plan(df: pd.DataFrame, plan: Dict[str, Any]) -> Optional[str]:
+    """
+    Answers a plan from plan_query with vectorized pandas.
+
+    Args:
+        df: The dataframe the plan is over.
+        plan: The plan to run.
+
+    Returns:
+        The answer as text, or None if it is NaN or empty.
+    """
+    if plan["where"] is not None:
+        df = df[_mask(df, plan["where"])]
+    kind = plan["kind"]
+
+    if kind == "distinct":
+        return _format(df[plan["column"]].nunique())
+
+    if kind == "top_k":
+        result = (df.nlargest if plan["largest"] else df.nsmallest)(plan["k"], plan["column"])
+    elif kind == "argmax":
+        series = df[plan["column"]]
+        if series.isna().all():
+            return None
+        row = df.loc[series.idxmax() if plan["largest"] else series.idxmin()]
+        result = row[plan["target"]] if plan["target"] is not None else row
+    else:
+        column, group, agg = plan["column"], plan["group"], plan["agg"]
+        if group is None:
+            if column is None:
+                return _format(len(df))
+            result = getattr(df[column], agg)()
+        else:
+            grouped = df.groupby(group, observed=True)
+            result = grouped.size() if column is None else getattr(grouped[column], agg)()
+            if pd.api.types.is_float_dtype(result):
+                result = result.round(2)
+
+    if isinstance(result, (pd.Series, pd.DataFrame)):
+        if result.empty or result.isna().all(axis=None):
+            return None
+    elif pd.isna(result):
+        return None
+    return _format(result)
+
+
+def answer_directly(df: pd.DataFrame, question: str) -> Optional[str]:
+    """
+    Answers a question without the LLM if it fits the planner's grammar.
+
+    Args:
+        df: The dataframe the question is about.
+        question: The user's question.
+
+    Returns:
+        The answer, or None if the question needs the agent.
+    """
+    plan = plan_query(question, df)
+    if plan is None:
+        return None
+    try:
+        return run_plan(df, plan)
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Query planner fell back to the agent: {e}")
+        return None
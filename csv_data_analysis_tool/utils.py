@@ -3,30 +3,703 @@ This module provides the core functionality for the CSV data analysis tool.
 
 It uses the langchain experimental library to create a pandas dataframe agent
 that can answer questions about a given CSV file.
+
+Parsed dataframes and their profiles are cached by the SHA-256 of the file
+contents, so repeated questions about the same upload skip parsing. Each
+question gets a new agent whose Python tool starts from a private copy of
+the dataframe, so variables one question defines never leak into another's.
+Parsed files are also written to Parquet (when pyarrow is installed) so a
+fresh process reloads them without re-parsing the CSV.
+
+Large CSVs are read in chunks with compact dtypes inferred from a sample of
+rows: categoricals for low-cardinality strings and parsed dates. Numbers
+stay 64-bit, so the agent's arithmetic can't overflow. Both backends read
+the same CSV_NULL_STRINGS as missing.
+
+Each dataframe is profiled once (types, nulls, cardinalities, ranges and top
+values) and the profile goes into the agent's prompt, so the agent doesn't
+spend LLM round-trips on df.head(), df.info() and df.describe().
+
+Simple aggregate, filter, group-by and top-k questions skip the agent
+entirely and are answered by query_planner with vectorized pandas.
+
+The "sql" backend instead converts the file to Parquet with DuckDB and gives
+a SQL agent a view over it. DuckDB scans the file lazily, multi-threaded and
+out-of-core, so the file never has to fit in memory and no LLM-written
+Python runs in-process.
+
+On the pandas backend, the agent's Python tool calls run on a pool of
+pre-warmed worker processes (see code_workers) with CPU, memory and time
+limits, instead of inside the Streamlit server.
 """
 
-from typing import IO
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import IO, Any, Dict, List, Optional, Set, Tuple
 
 import pandas as pd
 from dotenv import load_dotenv
+from langchain_community.agent_toolkits import SQLDatabaseToolkit, create_sql_agent
+from langchain_community.utilities import SQLDatabase
 from langchain_experimental.agents import create_pandas_dataframe_agent
 from langchain_openai import OpenAI
+from sqlalchemy import create_engine, text
+
+from code_workers import WORKERS_SUPPORTED, IsolatedPythonTool, WorkerPool, private_copy
+from query_planner import answer_directly
+
+try:
+    import pyarrow  # noqa: F401  (only needed for the Parquet reload cache)
+except ImportError:
+    pyarrow = None
 
 load_dotenv()
 
+DATAFRAME_CACHE_DIR = os.getenv("DATAFRAME_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "langchain-masterclass", "dataframes"
+)
+DATAFRAME_CACHE_MAX_BYTES = int(os.getenv("DATAFRAME_CACHE_MAX_MB") or 2048) * 1024 * 1024
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+DTYPE_SAMPLE_ROWS = 10_000
+CSV_CHUNK_ROWS = 1_000_000
+# String columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+PREVIEW_ROWS = 100_000
+# Bumped when parsing changes, so Parquet copies from older code aren't reused
+PARSE_VERSION = 2
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%d-%b-%y",
+    "%d-%b-%Y",
+]
+
+# DuckDB spills to disk past this limit, e.g. "2GB"; unset means DuckDB's default
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT")
+SQL_SAMPLE_ROWS = 3
+SQL_TABLE_PREFIX = "csv_"
+# Field values read as missing, comma-separated; e.g. ",-, - " for exports
+# that mark missing values with dashes, like employees.csv
+CSV_NULL_STRINGS = (
+    os.getenv("CSV_NULL_STRINGS") or ",NA,N/A,NULL,NaN,n/a,nan,null"
+).split(",")
+
+# Worker processes for agent code; 0 runs it in the server process instead
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS") or min(4, os.cpu_count() or 1))
+AGENT_CPU_SECONDS = float(os.getenv("AGENT_CPU_SECONDS") or 30)
+AGENT_MEMORY_MB = int(os.getenv("AGENT_MEMORY_MB") or 2048)
+AGENT_TIMEOUT_SECONDS = float(os.getenv("AGENT_TIMEOUT_SECONDS") or 60)
+
+# Columns with at most this many distinct values get top values in the profile
+PROFILE_MAX_CATEGORIES = 50
+PROFILE_TOP_VALUES = 3
+PROFILE_PREFIX = """
+You are working with a pandas dataframe in Python. The name of the dataframe is `df`.
+This profile was computed over the whole dataframe, so you don't need to call
+df.info(), df.describe() or df.head() to learn its columns:
+{profile}
+You should use the tools below to answer the question posed of you:"""
+PREVIEW_NOTE = """
+`df` is a random sample of about {rows:,} rows of a larger file, so state that
+counts, sums and other totals are estimates from a sample."""
+
+
+class _AgentCache:
+    """
+    Thread-safe LRU of (dataframe, extra) pairs, bounded by dataframe memory.
+    For a pandas entry, extra is the dataframe's profile, None until a
+    question needs the agent; for a SQL entry, it is the SQL agent.
+
+    Args:
+        max_bytes: Total deep memory usage of cached dataframes to keep.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[pd.DataFrame, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key: str, df: Optional[pd.DataFrame], extra: Optional[Any]) -> None:
+        # SQL agents keep their data on disk, so they cost no cache budget
+        size = int(df.memory_usage(deep=True).sum()) if df is not None else 0
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[2]
+            self._entries[key] = (df, extra, size)
+            self._total_bytes += size
+            # Always keep the newest entry, even if it alone is over budget
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+_agent_cache = _AgentCache(DATAFRAME_CACHE_MAX_BYTES)
+_hash_by_file_id: Dict[Tuple[str, int], str] = {}
+_llm: Optional[OpenAI] = None
+_worker_pool: Optional[WorkerPool] = None
+_worker_pool_lock = threading.Lock()
+
+
+def _get_llm() -> OpenAI:
+    """
+    Returns the shared OpenAI client, creating it on first use.
+    """
+    global _llm
+    if _llm is None:
+        _llm = OpenAI(temperature=0)
+    return _llm
+
+
+def _get_worker_pool() -> Optional[WorkerPool]:
+    """
+    Returns the shared worker pool, starting it on first use.
+
+    Workers load dataframes from their Parquet copies, so without pyarrow,
+    with AGENT_WORKERS=0, or on a platform without worker limits (anything
+    but Linux), agent code runs in-process and None is returned.
+    """
+    global _worker_pool
+    if AGENT_WORKERS <= 0 or pyarrow is None or not WORKERS_SUPPORTED:
+        return None
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = WorkerPool(
+                AGENT_WORKERS, AGENT_CPU_SECONDS, AGENT_MEMORY_MB, AGENT_TIMEOUT_SECONDS
+            )
+    return _worker_pool
+
+
+def file_hash(uploaded_file: IO[bytes]) -> str:
+    """
+    Computes the SHA-256 of a file's contents.
+
+    Streamlit gives every upload a stable file_id, so the hash of an upload
+    is computed once and remembered for later questions about it.
+
+    Args:
+        uploaded_file: The uploaded CSV file.
+
+    Returns:
+        The hex digest of the file contents.
+    """
+    file_id = getattr(uploaded_file, "file_id", None)
+    memo_key = (file_id, getattr(uploaded_file, "size", -1))
+    if file_id is not None and memo_key in _hash_by_file_id:
+        return _hash_by_file_id[memo_key]
+
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+
+    key = digest.hexdigest()
+    if file_id is not None:
+        _hash_by_file_id[memo_key] = key
+    return key
+
+
+def _infer_date_format(values: pd.Series) -> Optional[str]:
+    """
+    Returns the date format every sampled value parses with, if any.
+    """
+    values = values.dropna()
+    if values.empty:
+        return None
+    for date_format in DATE_FORMATS:
+        parsed = pd.to_datetime(values, format=date_format, errors="coerce")
+        if parsed.notna().all():
+            return date_format
+    return None
+
+
+def infer_csv_dtypes(
+    uploaded_file: IO[bytes], sample_rows: int = DTYPE_SAMPLE_ROWS
+) -> Tuple[List[str], Dict[str, str], List[str]]:
+    """
+    Infers compact dtypes for a CSV from its first rows.
+
+    Args:
+        uploaded_file: The uploaded CSV file.
+        sample_rows: The number of rows to sample.
+
+    Returns:
+        The columns to load as categoricals, the date format of each date
+        column, and the columns that are neither numbers nor dates.
+    """
+    uploaded_file.seek(0)
+    sample = pd.read_csv(
+        uploaded_file, nrows=sample_rows, keep_default_na=False, na_values=CSV_NULL_STRINGS
+    )
+    uploaded_file.seek(0)
+
+    categories, date_formats, text_columns = [], {}, []
+    for column in sample.columns:
+        values = sample[column]
+        if pd.api.types.is_numeric_dtype(values):
+            continue
+        date_format = _infer_date_format(values)
+        if date_format is not None:
+            date_formats[column] = date_format
+            continue
+        text_columns.append(column)
+        if values.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(values):
+            categories.append(column)
+    return categories, date_formats, text_columns
+
+
+def _parse_dates(
+    chunk: pd.DataFrame, date_formats: Dict[str, str], failed: Set[str]
+) -> pd.DataFrame:
+    """
+    Parses the date columns of one chunk, except those in failed.
+
+    A column with a value that doesn't match its format is added to failed
+    and left unparsed, rather than turning that value into NaT.
+    """
+    for column, date_format in date_formats.items():
+        if column in failed:
+            continue
+        parsed = pd.to_datetime(chunk[column], format=date_format, errors="coerce")
+        if (parsed.isna() & chunk[column].notna()).any():
+            failed.add(column)
+        else:
+            chunk[column] = parsed
+    return chunk
+
+
+def _concat_chunks(chunks: List[pd.DataFrame], categories: List[str]) -> pd.DataFrame:
+    """
+    Concatenates chunks, keeping categoricals whose categories differ per chunk.
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+    for column in categories:
+        # pd.concat falls back to object dtype unless the categories match
+        merged = pd.api.types.union_categoricals([chunk[column] for chunk in chunks])
+        for chunk in chunks:
+            chunk[column] = chunk[column].cat.set_categories(merged.categories)
+    return pd.concat(chunks, ignore_index=True)
+
 
-def query_agent(uploaded_file: IO[bytes], query: str) -> str:
+def read_csv_compact(
+    uploaded_file: IO[bytes],
+    preview_rows: Optional[int] = None,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+) -> pd.DataFrame:
+    """
+    Reads a CSV in chunks with compact dtypes inferred from a sample.
+
+    Args:
+        uploaded_file: The uploaded CSV file.
+        preview_rows: If set, keep a random sample of about this many rows.
+        chunk_rows: The number of rows parsed at a time.
+
+    Returns:
+        The parsed dataframe.
+    """
+    categories, date_formats, _ = infer_csv_dtypes(uploaded_file)
+
+    fraction = 1.0
+    if preview_rows is not None:
+        uploaded_file.seek(0)
+        line_count = sum(
+            chunk.count(b"\n")
+            for chunk in iter(lambda: uploaded_file.read(HASH_CHUNK_SIZE), b"")
+        )
+        fraction = min(1.0, preview_rows / max(line_count - 1, 1))
+        uploaded_file.seek(0)
+
+    chunks = []
+    # Date strings repeat, so reading them as categoricals parses each value once
+    reader = pd.read_csv(
+        uploaded_file,
+        dtype={column: "category" for column in categories + list(date_formats)},
+        keep_default_na=False,
+        na_values=CSV_NULL_STRINGS,
+        chunksize=chunk_rows,
+    )
+    raw_dates: Dict[str, List[pd.Series]] = {column: [] for column in date_formats}
+    failed: Set[str] = set()
+    for i, chunk in enumerate(reader):
+        if fraction < 1.0:
+            chunk = chunk.sample(frac=fraction, random_state=i)
+        for column in date_formats:
+            raw_dates[column].append(chunk[column])
+        chunks.append(_parse_dates(chunk, date_formats, failed))
+    uploaded_file.seek(0)
+    # The sample's format didn't fit every row, so the column stays text throughout
+    for column in failed:
+        for chunk, raw in zip(chunks, raw_dates[column]):
+            chunk[column] = raw.astype(object)
+    return _concat_chunks(chunks, categories)
+
+
+def load_dataframe(
+    uploaded_file: IO[bytes], key: str, preview_rows: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Loads a CSV, reusing its Parquet copy from an earlier parse if present.
+
+    Args:
+        uploaded_file: The uploaded CSV file.
+        key: The cache key of the file.
+        preview_rows: If set, load a random sample of about this many rows.
+
+    Returns:
+        The parsed dataframe.
+    """
+    parquet_path = os.path.join(DATAFRAME_CACHE_DIR, f"{key}.parquet")
+    if pyarrow is not None and os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+
+    df = read_csv_compact(uploaded_file, preview_rows)
+    if pyarrow is not None:
+        tmp_path = None
+        try:
+            os.makedirs(DATAFRAME_CACHE_DIR, exist_ok=True)
+            # A unique name: concurrent sessions are threads of one process
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=DATAFRAME_CACHE_DIR)
+            os.close(fd)
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, parquet_path)
+        except (OSError, ValueError, TypeError) as e:
+            # Mixed-type object columns can't always be written; parse again next time
+            print(f"Could not cache {key[:12]} as Parquet: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return df
+
+
+def profile_dataframe(df: pd.DataFrame) -> str:
+    """
+    Summarizes a dataframe's columns for the agent prompt.
+
+    Args:
+        df: The dataframe to profile.
+
+    Returns:
+        One line per column with its dtype, null count, distinct count, and
+        its range (numbers and dates) or most common values (other columns).
+    """
+    nulls = df.isna().sum()
+    cardinality = df.nunique()
+    ranged = df.select_dtypes(include=["number", "datetime"])
+    minimums, maximums = ranged.min(), ranged.max()
+
+    lines = [
+        f"{len(df):,} rows x {len(df.columns)} columns",
+        "column | dtype | nulls | distinct | range or top values",
+    ]
+    for column in df.columns:
+        if column in ranged.columns:
+            detail = f"{minimums[column]} to {maximums[column]}"
+        elif cardinality[column] <= PROFILE_MAX_CATEGORIES:
+            counts = df[column].value_counts().head(PROFILE_TOP_VALUES)
+            detail = ", ".join(f"{value!r} ({count:,})" for value, count in counts.items())
+        else:
+            first = df[column].dropna()
+            detail = f"e.g. {first.iloc[0]!r}" if len(first) else ""
+        lines.append(
+            f"{column} | {df[column].dtype} | {nulls[column]:,} | {cardinality[column]:,} | {detail}"
+        )
+    return "\n".join(lines)
+
+
+def load_profile(df: pd.DataFrame, key: str) -> str:
+    """
+    Returns the profile of a dataframe, reusing the one saved with its Parquet copy.
+
+    Args:
+        df: The dataframe to profile.
+        key: The cache key of the file.
+
+    Returns:
+        The dataframe profile.
+    """
+    profile_path = os.path.join(DATAFRAME_CACHE_DIR, f"{key}.profile.txt")
+    if os.path.exists(profile_path):
+        with open(profile_path, encoding="utf-8") as f:
+            return f.read()
+
+    profile = profile_dataframe(df)
+    try:
+        os.makedirs(DATAFRAME_CACHE_DIR, exist_ok=True)
+        with open(profile_path, "w", encoding="utf-8") as f:
+            f.write(profile)
+    except OSError as e:
+        print(f"Could not cache the profile of {key[:12]}: {e}")
+    return profile
+
+
+def _profile_prefix(profile: str, preview: bool = False) -> str:
+    # The prefix becomes a prompt template, so literal braces must be escaped
+    escaped = profile.replace("{", "{{").replace("}", "}}")
+    if preview:
+        escaped += PREVIEW_NOTE.format(rows=PREVIEW_ROWS)
+    return PROFILE_PREFIX.format(profile=escaped)
+
+
+def get_dataframe(uploaded_file: IO[bytes], preview: bool = False) -> Tuple[str, pd.DataFrame]:
+    """
+    Returns the cache key and dataframe for a file, loading it on a cache miss.
+
+    The profile is only computed by get_agent, once a question needs it.
+
+    Args:
+        uploaded_file: The uploaded CSV file.
+        preview: Whether to load a random sample of PREVIEW_ROWS rows.
+
+    Returns:
+        The file's cache key and its dataframe.
+    """
+    key = f"{file_hash(uploaded_file)}-{_parse_tag()}"
+    if preview:
+        key = f"{key}-preview{PREVIEW_ROWS}"
+    cached = _agent_cache.get(key)
+    if cached is not None:
+        return key, cached[0]
+
+    df = load_dataframe(uploaded_file, key, PREVIEW_ROWS if preview else None)
+    _agent_cache.put(key, df, None)
+    return key, df
+
+
+def get_agent(uploaded_file: IO[bytes], preview: bool = False) -> Tuple[pd.DataFrame, Any]:
+    """
+    Returns the dataframe of a file and a new agent for one question.
+
+    The dataframe and its profile are cached; the agent is not, since its
+    Python tool keeps the variables the question's code defines.
+
+    Args:
+        uploaded_file: The uploaded CSV file.
+        preview: Whether to answer from a random sample of PREVIEW_ROWS rows.
+
+    Returns:
+        The file's dataframe and its pandas dataframe agent.
+    """
+    key, df = get_dataframe(uploaded_file, preview)
+    cached = _agent_cache.get(key)
+    profile = cached[1] if cached is not None else None
+    if profile is None:
+        profile = load_profile(df, key)
+        _agent_cache.put(key, df, profile)
+
+    pool = _get_worker_pool()
+    parquet_path = os.path.join(DATAFRAME_CACHE_DIR, f"{key}.parquet")
+    isolated = pool is not None and os.path.exists(parquet_path)
+    if pool is not None and not isolated:
+        print(f"No Parquet copy of {key[:12]}, running its agent code in-process")
+    agent = create_pandas_dataframe_agent(
+        _get_llm(),
+        # In-process code gets a copy, so df.drop(..., inplace=True) and the
+        # like can't change the cached frame; workers load their own
+        df if isolated else private_copy(df),
+        prefix=_profile_prefix(profile, preview),
+        verbose=True,
+        allow_dangerous_code=True,
+    )
+    if isolated:
+        # Same tool name and description, so the prompt doesn't change; a new
+        # tool is a new session, so this question's variables stay its own
+        agent.tools = [
+            IsolatedPythonTool(pool=pool, parquet_path=parquet_path)
+            if tool.name == "python_repl_ast"
+            else tool
+            for tool in agent.tools
+        ]
+    return df, agent
+
+
+def _parse_tag() -> str:
+    """Names the parsing settings in cache keys, so other settings parse afresh."""
+    return hashlib.sha256(repr((PARSE_VERSION, CSV_NULL_STRINGS)).encode()).hexdigest()[:8]
+
+
+def _table_name(uploaded_file: IO[bytes]) -> str:
+    """
+    Returns a SQL table name derived from the uploaded file's name.
+
+    The prefix keeps names like order.csv or select.csv from being SQL
+    keywords, so neither the view nor the LLM's queries need quoting.
+    """
+    stem = os.path.splitext(os.path.basename(getattr(uploaded_file, "name", "") or ""))[0]
+    name = re.sub(r"[^a-z0-9]+", "_", stem.lower()).strip("_")
+    return f"{SQL_TABLE_PREFIX}{name or 'data'}"
+
+
+def _sql_string(value: str) -> str:
+    """Returns value as a SQL string literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _duckdb_config() -> Dict[str, str]:
+    config = {"temp_directory": os.path.join(DATAFRAME_CACHE_DIR, "duckdb_tmp")}
+    if DUCKDB_MEMORY_LIMIT:
+        config["memory_limit"] = DUCKDB_MEMORY_LIMIT
+    return config
+
+
+def convert_to_parquet(uploaded_file: IO[bytes], key: str) -> str:
+    """
+    Converts a CSV to Parquet with DuckDB, without loading it into pandas.
+
+    Args:
+        uploaded_file: The uploaded CSV file.
+        key: The content hash of the file.
+
+    Returns:
+        The path of the Parquet file.
+    """
+    parquet_path = os.path.join(DATAFRAME_CACHE_DIR, f"{key}.{_parse_tag()}.sql.parquet")
+    if os.path.exists(parquet_path):
+        return parquet_path
+
+    import duckdb  # only needed for the SQL backend
+
+    os.makedirs(DATAFRAME_CACHE_DIR, exist_ok=True)
+    _, date_formats, text_columns = infer_csv_dtypes(uploaded_file)
+    # Unique names: concurrent sessions are threads of one process
+    fd, csv_path = tempfile.mkstemp(suffix=".csv", dir=DATAFRAME_CACHE_DIR)
+    os.close(fd)
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=DATAFRAME_CACHE_DIR)
+    os.close(fd)
+    try:
+        # DuckDB reads from a path, so spool the upload to disk once
+        uploaded_file.seek(0)
+        with open(csv_path, "wb") as f:
+            for chunk in iter(lambda: uploaded_file.read(HASH_CHUNK_SIZE), b""):
+                f.write(chunk)
+        uploaded_file.seek(0)
+
+        options = f", nullstr = [{', '.join(map(_sql_string, CSV_NULL_STRINGS))}]"
+        if text_columns:
+            # Columns pandas reads as text stay text: DuckDB's sniffer would
+            # read placeholders like " - " in a number column as 0
+            types = ", ".join(f"{_sql_string(c)}: 'VARCHAR'" for c in text_columns)
+            options += f", types = {{{types}}}"
+        if len(set(date_formats.values())) == 1:
+            # DuckDB takes one date format per file; mixed formats stay text
+            options += f", dateformat = {_sql_string(next(iter(date_formats.values())))}"
+        with duckdb.connect(config=_duckdb_config()) as conn:
+            conn.execute(
+                f"COPY (SELECT * FROM read_csv_auto({_sql_string(csv_path)}{options})) "
+                f"TO {_sql_string(tmp_path)} (FORMAT PARQUET)"
+            )
+        os.replace(tmp_path, parquet_path)
+    finally:
+        for path in (csv_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return parquet_path
+
+
+def get_sql_agent(uploaded_file: IO[bytes]) -> Any:
+    """
+    Returns a DuckDB-backed SQL agent for a file, building it on a cache miss.
+
+    Args:
+        uploaded_file: The uploaded CSV file.
+
+    Returns:
+        The SQL agent over a table named after the file.
+    """
+    key = file_hash(uploaded_file)
+    cached = _agent_cache.get(f"{key}-sql")
+    if cached is not None:
+        return cached[1]
+
+    parquet_path = convert_to_parquet(uploaded_file, key)
+    table = _table_name(uploaded_file)
+    # The database only holds a view, so the data is read from Parquet per query
+    engine = create_engine(
+        f"duckdb:///{os.path.join(DATAFRAME_CACHE_DIR, f'{key}.duckdb')}",
+        connect_args={"config": _duckdb_config()},
+    )
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                f"CREATE OR REPLACE VIEW {table} AS SELECT * FROM "
+                f"read_parquet({_sql_string(parquet_path)})"
+            )
+        )
+    db = SQLDatabase(engine, view_support=True, sample_rows_in_table_info=SQL_SAMPLE_ROWS)
+    llm = _get_llm()
+    agent = create_sql_agent(
+        llm,
+        toolkit=SQLDatabaseToolkit(db=db, llm=llm),
+        agent_type="zero-shot-react-description",
+        verbose=True,
+    )
+    _agent_cache.put(f"{key}-sql", None, agent)
+    return agent
+
+
+def query_agent(
+    uploaded_file: IO[bytes],
+    query: str,
+    preview: bool = False,
+    use_planner: bool = True,
+    backend: str = "pandas",
+) -> str:
     """
     Queries the agent with the given query.
 
+    Simple aggregate, filter, group-by and top-k questions are answered
+    directly with pandas; everything else goes to the agent.
+
     Args:
         uploaded_file: The uploaded CSV file.
         query: The user's query.
+        preview: Whether to answer from a random sample of rows.
+        use_planner: Whether to try the no-LLM query planner first; it is
+            skipped in preview mode, whose counts and sums are of a sample.
+        backend: "pandas" for the dataframe agent, or "sql" for the
+            DuckDB SQL agent, which ignores preview and use_planner.
 
     Returns:
         The agent's response.
     """
-    df = pd.read_csv(uploaded_file)
-    llm = OpenAI(temperature=0)
-    agent = create_pandas_dataframe_agent(llm, df, verbose=True, allow_dangerous_code=True)
-    return agent.run(query)
\ No newline at end of file
+    if backend == "sql":
+        return get_sql_agent(uploaded_file).run(query)
+    if backend != "pandas":
+        raise ValueError(f"Unknown backend: {backend}")
+
+    # A preview holds a sample, so the planner's exact-looking counts and
+    # sums would be wrong; the agent's prompt says it works on a sample
+    if use_planner and not preview:
+        # The planner needs only the dataframe, not the LLM client or the agent
+        _, df = get_dataframe(uploaded_file, preview)
+        answer = answer_directly(df, query)
+        if answer is not None:
+            return answer
+    _, agent = get_agent(uploaded_file, preview)
+    try:
+        return agent.run(query)
+    finally:
+        for tool in agent.tools:
+            if isinstance(tool, IsolatedPythonTool):
+                tool.close()
@@ -39,6 +39,99 @@ def strip_think_tags(text):
     return re.sub(pattern, "", text, flags=re.DOTALL).strip()
 
 
+def _partial_tag_length(text, tag):
+    """
+    Returns the length of the longest end of text that could start the tag.
+    """
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ThinkTagFilter:
+    """
+    Drops <think>...</think> spans from text that arrives in chunks.
+
+    Tags may be split across chunks, so the end of a chunk that could be the
+    start of a tag is held back until the next chunk shows what it is. All
+    other text is returned as soon as it arrives. The output matches
+    strip_think_tags, except that a <think> span that is never closed is
+    dropped instead of kept.
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self.in_think = False
+        self.pending = ""
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of text.
+        Args:
+            chunk (str): The next piece of the response
+        Returns:
+            str: Text outside think tags that is safe to show now
+        """
+        text = self.pending + chunk
+        output = []
+        while text:
+            tag = self.CLOSE_TAG if self.in_think else self.OPEN_TAG
+            index = text.find(tag)
+            if index >= 0:
+                if not self.in_think:
+                    output.append(text[:index])
+                text = text[index + len(tag):]
+                self.in_think = not self.in_think
+                continue
+            keep = _partial_tag_length(text, tag)
+            if not self.in_think:
+                output.append(text[: len(text) - keep])
+            text = text[len(text) - keep:] if keep else ""
+            break
+        self.pending = text
+        return "".join(output)
+
+    def flush(self):
+        """
+        Ends the stream.
+        Returns:
+            str: Held back text that turned out not to be a tag
+        """
+        text = "" if self.in_think else self.pending
+        self.in_think = False
+        self.pending = ""
+        return text
+
+
+def stream_email(email_chain, inputs):
+    """
+    Streams the email from the chain with think tag content removed.
+    Args:
+        email_chain: The prompt and LLM chain
+        inputs (dict): The prompt template variables
+    Yields:
+        str: Pieces of the email as they are generated
+    """
+    think_filter = ThinkTagFilter()
+    started = False
+    for chunk in email_chain.stream(inputs):
+        text = think_filter.feed(chunk.content)
+        if not started:
+            # Like strip_think_tags, leave out whitespace before the email
+            text = text.lstrip()
+            started = bool(text)
+        if text:
+            yield text
+    text = think_filter.flush()
+    if text and not started:
+        text = text.lstrip()
+    if text:
+        yield text
+
+
 # Create the LLM chain
 def create_email_chain(llm, prompt_template):
     email_chain = prompt_template | llm
@@ -82,19 +175,21 @@ def main():
     # Generate button
     if st.button("Generate Email"):
         if email_topic and tone and recipient and sender:
-            with st.spinner("Generating email..."):
-                response = email_chain.invoke(
-                    {
-                        "email_topic": email_topic,
-                        "tone": tone,
-                        "recipient": recipient,
-                        "sender": sender,
-                    }
-                ).content
-                cleaned_response = strip_think_tags(response)
+            # The email is shown as it is generated, instead of after the
+            # whole response
             with st.container(border=True):
                 st.subheader("Generated Email")
-                st.write(cleaned_response)
+                st.write_stream(
+                    stream_email(
+                        email_chain,
+                        {
+                            "email_topic": email_topic,
+                            "tone": tone,
+                            "recipient": recipient,
+                            "sender": sender,
+                        },
+                    )
+                )
         else:
             st.warning("Please fill in all fields.")
 
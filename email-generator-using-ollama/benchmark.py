@@ -0,0 +1,137 @@
+"""
+Streaming benchmark and check of the think tag filter in app.py.
+
+Run with `python benchmark.py`. A local fake Ollama server streams a reply
+with think spans, cut into chunks that split the tags, so neither Ollama
+nor a model is needed. The streamed email is checked against
+strip_think_tags on the whole reply.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_ollama import ChatOllama
+
+from app import (
+    ThinkTagFilter,
+    create_email_chain,
+    create_prompt_template,
+    stream_email,
+    strip_think_tags,
+)
+
+EMAIL = (
+    "Subject: Project update\n\nHi Sam,\n\n"
+    + "The migration is on track and the <b>new</b> reports ship next week. " * 12
+    + "\n\nBest regards,\nAlex"
+)
+REPLY = (
+    "<think>\nThe user wants a short update. Keep it <i>friendly</i>.\n</think>\n\n"
+    + EMAIL[:200]
+    + "<think>check the tone</think>"
+    + EMAIL[200:]
+)
+INPUTS = {"email_topic": "project update", "tone": "Friendly", "recipient": "Sam", "sender": "Alex"}
+
+
+def _chunks(text, sizes):
+    chunks, start = [], 0
+    while start < len(text):
+        size = sizes[len(chunks) % len(sizes)]
+        chunks.append(text[start : start + size])
+        start += size
+    return chunks
+
+
+def _fake_ollama(chunks, first_token_delay, chunk_delay):
+    """Starts a server that answers /api/chat by streaming the chunks as NDJSON."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            time.sleep(first_token_delay)
+            for chunk in chunks:
+                self._line({"model": body["model"], "created_at": "2024-01-01T00:00:00Z",
+                            "message": {"role": "assistant", "content": chunk}, "done": False})
+                time.sleep(chunk_delay)
+            self._line({"model": body["model"], "created_at": "2024-01-01T00:00:00Z",
+                        "message": {"role": "assistant", "content": ""}, "done": True,
+                        "done_reason": "stop", "eval_count": len(chunks), "prompt_eval_count": 1})
+
+        def _line(self, data):
+            self.wfile.write(json.dumps(data).encode() + b"\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check_filter(trials=2000, seed=0):
+    """The filter matches strip_think_tags however the reply is chunked."""
+    rng = random.Random(seed)
+    texts = [
+        REPLY,
+        "<think></think>Hello",
+        "a <thin b <think>x</thin></think> c </think> d",
+        "Ends with a partial tag <thi",
+        "Ends inside <think> a thought that never closes",
+    ]
+    for _ in range(trials):
+        text = rng.choice(texts)
+        think_filter = ThinkTagFilter()
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(1, 12))))
+        pieces = [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+        output = "".join(think_filter.feed(piece) for piece in pieces) + think_filter.flush()
+        expected = strip_think_tags(text)
+        if "</think>" not in text.split("<think>")[-1] and "<think>" in text:
+            # A think span that never closes is dropped rather than kept
+            expected = strip_think_tags(text[: text.rindex("<think>")])
+        assert output.strip() == expected, (pieces, output, expected)
+    print(f"Filter matches strip_think_tags on {trials:,} random chunkings")
+
+
+def benchmark_streaming(first_token_delay=0.5, chunk_delay=0.01, sizes=(3, 1, 5, 2, 7)):
+    """Time to the first visible text of invoke + strip_think_tags against streaming."""
+    chunks = _chunks(REPLY, sizes)
+    split_tags = sum(1 for chunk in chunks if "<" in chunk and ">" not in chunk)
+    server = _fake_ollama(chunks, first_token_delay, chunk_delay)
+    llm = ChatOllama(
+        model="qwen3:8b", base_url=f"http://127.0.0.1:{server.server_address[1]}", think=False
+    )
+    email_chain = create_email_chain(llm, create_prompt_template())
+    try:
+        start = time.perf_counter()
+        blocking = strip_think_tags(email_chain.invoke(INPUTS).content)
+        blocking_seconds = time.perf_counter() - start
+
+        pieces, first = [], None
+        start = time.perf_counter()
+        for piece in stream_email(email_chain, INPUTS):
+            if first is None:
+                first = time.perf_counter() - start
+            pieces.append(piece)
+        streamed_seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    assert "".join(pieces).strip() == blocking == EMAIL.strip()
+    print(f"Fake Ollama server: {len(chunks)} chunks, {split_tags} of them end inside a tag, "
+          f"{first_token_delay * 1000:.0f} ms to first chunk, {chunk_delay * 1000:.0f} ms per chunk")
+    print(f"  invoke + strip_think_tags: email shown after {blocking_seconds * 1000:6.0f} ms")
+    print(f"  stream_email:              first text after {first * 1000:6.0f} ms, "
+          f"complete after {streamed_seconds * 1000:6.0f} ms, same email")
+
+
+if __name__ == "__main__":
+    check_filter()
+    benchmark_streaming()
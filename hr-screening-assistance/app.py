@@ -2,7 +2,15 @@ from typing import List, Any
 from os import wait
 from time import sleep
 import streamlit as st
-from utils import create_docs, push_to_pinecone, retrieve_relevant_docs, get_summary
+from utils import (
+    create_docs,
+    create_section_docs,
+    push_to_pinecone,
+    retrieve_relevant_docs,
+    score_docs_locally,
+    iter_summaries,
+    collect_expired_sessions_in_background,
+)
 import uuid
 
 
@@ -31,29 +39,59 @@ def main() -> None:
             type=["pdf"],
             accept_multiple_files=True,
         )
+        match_sections = st.checkbox(
+            "Match on resume sections",
+            help="Score each resume by its best-matching sections and summarize only those",
+        )
+        score_locally = st.checkbox(
+            "Score in memory (skip Pinecone)",
+            help="Rank just the uploaded resumes locally instead of indexing them in Pinecone first",
+        )
         submit_button = st.form_submit_button("Help me with the Screening")
 
     if submit_button:
         if job_description and uploaded_resumes:
             try:
                 # Process the form data
-                with st.spinner("Pushing to Pinecone..."):
-                    # Create docs
-                    uuid = _create_uuid()
-                    docs = create_docs(uploaded_resumes, uuid)
-                    # Push to Pinecone
-                    vector_store = push_to_pinecone(docs)
+                if score_locally:
+                    with st.spinner("Scoring resumes..."):
+                        uuid = _create_uuid()
+                        docs = create_docs(uploaded_resumes, uuid)
+                        if match_sections:
+                            docs = create_section_docs(docs)
+                        similar_docs = score_docs_locally(
+                            job_description, docs, num_resumes, chunked=match_sections
+                        )
+                else:
+                    with st.spinner("Pushing to Pinecone..."):
+                        # Create docs
+                        uuid = _create_uuid()
+                        docs = create_docs(uploaded_resumes, uuid)
+                        if match_sections:
+                            docs = create_section_docs(docs)
+                        # Push to Pinecone, into a namespace of its own
+                        vector_store = push_to_pinecone(docs)
+                        # Drop sessions older than the TTL
+                        collect_expired_sessions_in_background()
 
-                similar_docs = retrieve_relevant_docs(
-                    job_description, num_resumes, vector_store
-                )
+                    similar_docs = retrieve_relevant_docs(
+                        job_description, num_resumes, vector_store, chunked=match_sections
+                    )
 
+                # Lay out every expander first, then fill each summary in
+                # as soon as its chain finishes.
+                placeholders = []
                 for item in range(len(similar_docs)):
                     with st.expander(
                         f"{similar_docs[item][0].metadata['source']} (Match Score: {similar_docs[item][1]})"
                     ):
-                        summary = get_summary(similar_docs[item][0])
-                        st.write(summary)
+                        placeholders.append(st.empty())
+                        placeholders[item].write("Summarizing...")
+
+                for item, summary in iter_summaries(
+                    [doc for doc, _ in similar_docs]
+                ):
+                    placeholders[item].write(summary)
 
                 sleep(0.1)  # Give Streamlit a moment to render all expanders
                 st.success(
@@ -0,0 +1,301 @@
+"""
+Headless bulk screening: match a folder of resumes against many job
+descriptions at once.
+
+Every resume and every job description is embedded exactly once, then the
+full resume x job similarity matrix is computed in vectorized blocks and the
+top-N resumes per job are written to CSV or Parquet. Embeddings are saved
+batch by batch in a work directory, so an interrupted run picks up where it
+stopped.
+
+Usage:
+  python batch_screening.py --resumes resumes/ --jobs jobs/ --output matches.csv
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import io
+import os
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from utils import _create_embeddings, create_docs
+
+EMBED_BATCH_SIZE = 500
+SIMILARITY_BLOCK_SIZE = 4096
+
+
+class LocalPdf(io.BytesIO):
+    """A PDF on disk, shaped like Streamlit's UploadedFile for create_docs."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+        self.file_id = path
+        self.type = "application/pdf"
+        self.size = len(self.getvalue())
+
+
+def load_resumes(resume_dir: str) -> List[Document]:
+    """
+    Parse every PDF in a directory into resume documents
+
+    Args:
+      resume_dir: Directory of resume PDFs
+
+    Returns:
+      List of Document objects, sorted by file name
+    """
+    paths = sorted(glob.glob(os.path.join(resume_dir, "*.pdf")))
+    if not paths:
+        raise ValueError(f"No PDF files found in {resume_dir}")
+    return create_docs([LocalPdf(path) for path in paths], "batch")
+
+
+def load_job_descriptions(jobs_path: str) -> List[Tuple[str, str]]:
+    """
+    Load job descriptions from a directory of .txt files or from a CSV
+    with "id" and "description" columns
+
+    Args:
+      jobs_path: Directory or CSV file
+
+    Returns:
+      List of (job id, description) tuples
+    """
+    if os.path.isdir(jobs_path):
+        jobs = []
+        for path in sorted(glob.glob(os.path.join(jobs_path, "*.txt"))):
+            with open(path, encoding="utf-8") as f:
+                jobs.append((os.path.splitext(os.path.basename(path))[0], f.read()))
+    else:
+        with open(jobs_path, newline="", encoding="utf-8") as f:
+            jobs = [(row["id"], row["description"]) for row in csv.DictReader(f)]
+    if not jobs:
+        raise ValueError(f"No job descriptions found in {jobs_path}")
+    return jobs
+
+
+def _embedding_model(embeddings: Embeddings) -> str:
+    """
+    Name the model behind an embeddings object, looking through CachedEmbeddings
+    """
+    return str(getattr(embeddings, "model", None) or type(embeddings).__name__)
+
+
+def _embedding_dim(embeddings: Embeddings) -> int:
+    """
+    Vector dimension of an embeddings object, embedding a probe text if it is not configured
+    """
+    dim = getattr(embeddings, "dim", None) or getattr(embeddings, "dimensions", None)
+    return int(dim or len(embeddings.embed_query("dimension probe")))
+
+
+def embed_in_batches(
+    texts: List[str],
+    embeddings: Embeddings,
+    work_dir: str,
+    name: str,
+    batch_size: int = EMBED_BATCH_SIZE,
+) -> np.ndarray:
+    """
+    Embed texts batch by batch, saving each batch so reruns skip it
+
+    Args:
+      texts: Texts to embed
+      embeddings: Embeddings object
+      work_dir: Directory holding saved batches
+      name: Prefix of the saved batch files
+      batch_size: Texts per embedding request
+
+    Returns:
+      Matrix of L2-normalized float32 embeddings, one row per text
+    """
+    # Saved batches are only valid for exactly these texts in this order,
+    # embedded by the same model at the same dimension
+    fingerprint = hashlib.sha256(
+        "\0".join([_embedding_model(embeddings), str(_embedding_dim(embeddings)), *texts]).encode("utf-8")
+    ).hexdigest()[:16]
+    batches = []
+    for start in range(0, len(texts), batch_size):
+        path = os.path.join(work_dir, f"{name}-{fingerprint}-{start:08d}.npy")
+        if os.path.exists(path):
+            batches.append(np.load(path))
+            continue
+        batch = np.asarray(
+            embeddings.embed_documents(texts[start : start + batch_size]),
+            dtype=np.float32,
+        )
+        np.save(f"{path}.tmp.npy", batch)
+        os.replace(f"{path}.tmp.npy", path)
+        batches.append(batch)
+        print(f"Embedded {name} {min(start + batch_size, len(texts))}/{len(texts)}")
+
+    vectors = np.vstack(batches)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_n_matches(
+    resume_vectors: np.ndarray,
+    job_vectors: np.ndarray,
+    top_n: int,
+    block_size: int = SIMILARITY_BLOCK_SIZE,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the top-N resumes per job from normalized embeddings
+
+    The similarity matrix is computed block_size resumes at a time and
+    merged into a running top-N, so memory stays bounded for any number of
+    resumes.
+
+    Args:
+      resume_vectors: Normalized resume embeddings, one row per resume
+      job_vectors: Normalized job embeddings, one row per job
+      top_n: Resumes to keep per job
+      block_size: Resumes scored per matrix product
+
+    Returns:
+      Tuple of (resume indices, scores), both shaped (jobs, top_n) and
+      sorted best first
+    """
+    top_n = min(top_n, len(resume_vectors))
+    jobs = np.arange(len(job_vectors))[:, None]
+    best_scores = np.full((len(job_vectors), 0), -np.inf, dtype=np.float32)
+    best_indices = np.zeros((len(job_vectors), 0), dtype=np.int64)
+
+    for start in range(0, len(resume_vectors), block_size):
+        block = job_vectors @ resume_vectors[start : start + block_size].T
+        block_indices = np.broadcast_to(
+            np.arange(start, start + block.shape[1]), block.shape
+        )
+        scores = np.hstack([best_scores, block])
+        indices = np.hstack([best_indices, block_indices])
+        if scores.shape[1] > top_n:
+            keep = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+            scores, indices = scores[jobs, keep], indices[jobs, keep]
+        best_scores, best_indices = scores, indices
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return best_indices[jobs, order], best_scores[jobs, order]
+
+
+def write_matches(
+    output: str,
+    job_ids: List[str],
+    resume_names: List[str],
+    indices: np.ndarray,
+    scores: np.ndarray,
+) -> None:
+    """
+    Write the top-N matches per job to CSV, or Parquet for .parquet paths
+
+    Args:
+      output: Output file path
+      job_ids: Job ids, one per row of indices
+      resume_names: Resume names, indexed by indices
+      indices: Resume indices, shaped (jobs, top_n)
+      scores: Match scores, shaped (jobs, top_n)
+    """
+    rows = [
+        (job_id, rank + 1, resume_names[index], float(score))
+        for job_id, job_indices, job_scores in zip(job_ids, indices, scores)
+        for rank, (index, score) in enumerate(zip(job_indices, job_scores))
+    ]
+    columns = ["job_id", "rank", "resume", "score"]
+    tmp_output = f"{output}.tmp"
+    if output.endswith(".parquet"):
+        import pandas as pd  # only needed for Parquet output
+
+        pd.DataFrame(rows, columns=columns).to_parquet(tmp_output, index=False)
+    else:
+        with open(tmp_output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(rows)
+    os.replace(tmp_output, output)
+
+
+def screen(
+    resumes: List[Document],
+    jobs: List[Tuple[str, str]],
+    output: str,
+    top_n: int = 10,
+    work_dir: Optional[str] = None,
+    embeddings: Optional[Embeddings] = None,
+) -> dict:
+    """
+    Match resumes against job descriptions and write the top-N per job
+
+    Args:
+      resumes: Resume documents
+      jobs: List of (job id, description) tuples
+      output: Output CSV or Parquet path
+      top_n: Resumes to keep per job
+      work_dir: Directory for resumable progress, defaults to
+        "<output>.progress"
+      embeddings: Embeddings object, defaults to _create_embeddings()
+
+    Returns:
+      Timing stats of the run
+    """
+    work_dir = work_dir or f"{output}.progress"
+    os.makedirs(work_dir, exist_ok=True)
+    embeddings = embeddings or _create_embeddings()
+
+    start = time.perf_counter()
+    resume_vectors = embed_in_batches(
+        [doc.page_content for doc in resumes], embeddings, work_dir, "resumes"
+    )
+    job_vectors = embed_in_batches(
+        [description for _, description in jobs], embeddings, work_dir, "jobs"
+    )
+    embedded = time.perf_counter()
+
+    indices, scores = top_n_matches(resume_vectors, job_vectors, top_n)
+    matched = time.perf_counter()
+
+    write_matches(
+        output,
+        [job_id for job_id, _ in jobs],
+        [doc.metadata["source"] for doc in resumes],
+        indices,
+        scores,
+    )
+    return {
+        "embed_seconds": embedded - start,
+        "match_seconds": matched - embedded,
+        "total_seconds": time.perf_counter() - start,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--resumes", required=True, help="Directory of resume PDFs")
+    parser.add_argument(
+        "--jobs", required=True, help="Directory of .txt job descriptions, or a CSV with id,description"
+    )
+    parser.add_argument("--output", required=True, help="Output .csv or .parquet file")
+    parser.add_argument("--top-n", type=int, default=10, help="Resumes to keep per job")
+    parser.add_argument("--work-dir", help="Progress directory, defaults to <output>.progress")
+    args = parser.parse_args(argv)
+
+    resumes = load_resumes(args.resumes)
+    jobs = load_job_descriptions(args.jobs)
+    stats = screen(resumes, jobs, args.output, args.top_n, args.work_dir)
+    print(
+        f"Matched {len(resumes)} resumes x {len(jobs)} jobs in {stats['total_seconds']:.1f}s, "
+        f"wrote {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
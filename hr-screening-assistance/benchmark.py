@@ -0,0 +1,311 @@
+"""
+Benchmarks for the HR screening pipeline in utils.py.
+
+Run with `python benchmark.py`. The benchmarks use the bundled resumes in
+docs/ and local stand-ins, so no API keys or network access are needed.
+"""
+
+import asyncio
+import glob
+import io
+import os
+import tempfile
+import time
+import timeit
+
+import numpy as np
+from langchain.chains.summarize import load_summarize_chain
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.vectorstores import InMemoryVectorStore
+
+import batch_screening
+import utils
+from local_embeddings import HashingEmbeddings
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docs")
+
+
+class _UploadedPdf(io.BytesIO):
+    """Minimal stand-in for Streamlit's UploadedFile."""
+
+    def __init__(self, data, name, file_id):
+        super().__init__(data)
+        self.name = name
+        self.file_id = file_id
+        self.type = "application/pdf"
+        self.size = len(data)
+
+
+def _replicated_resumes(count):
+    """Replicate the bundled resumes into `count` files with distinct bytes."""
+    originals = [open(path, "rb").read() for path in sorted(glob.glob(os.path.join(DOCS_DIR, "*.pdf")))]
+    files = []
+    for i in range(count):
+        # A trailing PDF comment changes the content hash but not the text
+        data = originals[i % len(originals)] + f"\n% copy {i}\n".encode()
+        files.append(_UploadedPdf(data, f"resume-{i}.pdf", str(i)))
+    return files
+
+
+def benchmark_resume_parsing(count=1000):
+    """Compare serial parsing with the pooled, cached create_docs path."""
+    resumes = _replicated_resumes(count)
+
+    start = time.perf_counter()
+    for resume in resumes:
+        resume.seek(0)
+        utils._read_pdf_data(resume)
+    serial = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        utils.TEXT_CACHE_DIR = cache_dir
+        start = time.perf_counter()
+        utils.create_docs(resumes, "benchmark")
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        utils.create_docs(resumes, "benchmark")
+        warm = time.perf_counter() - start
+
+    print(f"Parsing {count} resumes on {os.cpu_count()} CPU(s):")
+    print(f"  serial            {count / serial:8.1f} resumes/sec")
+    print(f"  process pool      {count / cold:8.1f} resumes/sec")
+    print(f"  re-upload (cache) {count / warm:8.1f} resumes/sec")
+
+
+class _SlowFakeLLM(LLM):
+    """Fake completion model that sleeps like an API call."""
+
+    latency: float = 0.2
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def get_num_tokens(self, text: str) -> int:
+        return len(text) // 4  # rough OpenAI ratio, avoids a tokenizer download
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return f"Summary of {len(prompt)} prompt characters."
+
+    async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return f"Summary of {len(prompt)} prompt characters."
+
+
+def benchmark_summarization(count=20, latency=0.2, max_concurrency=5):
+    """Compare per-resume serial summarization with iter_summaries."""
+    docs = utils.create_docs(_replicated_resumes(count), "benchmark")
+    llm = _SlowFakeLLM(latency=latency)
+
+    start = time.perf_counter()
+    for doc in docs:
+        # What app.py used to do: a new chain per resume, one at a time
+        load_summarize_chain(llm, chain_type="map_reduce").invoke([doc])
+    serial = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        utils.SUMMARY_CACHE_DIR = cache_dir
+        start = time.perf_counter()
+        first = None
+        for _ in utils.iter_summaries(docs, max_concurrency, llm):
+            first = first or time.perf_counter() - start
+        batched = time.perf_counter() - start
+
+        start = time.perf_counter()
+        utils.get_summaries(docs, max_concurrency, llm)
+        cached = time.perf_counter() - start
+
+    print(f"Summarizing {count} resumes ({latency * 1000:.0f} ms per LLM call):")
+    print(f"  serial                  {serial:6.2f}s")
+    print(f"  batched (concurrency {max_concurrency}) {batched:6.2f}s, first summary after {first:.2f}s")
+    print(f"  cached                  {cached:6.2f}s")
+
+
+class _LocalIndex:
+    """In-memory stand-in for a Pinecone index with brute-force queries."""
+
+    def __init__(self):
+        self.namespaces = {}
+
+    def upsert(self, vectors, namespace=""):
+        current = self.namespaces.get(namespace)
+        self.namespaces[namespace] = vectors if current is None else np.vstack([current, vectors])
+
+    def query(self, vector, top_k, namespace=""):
+        scores = self.namespaces[namespace] @ vector
+        return np.argpartition(-scores, min(top_k, len(scores) - 1))[:top_k]
+
+    def describe_index_stats(self):
+        return {
+            "namespaces": {name: {"vector_count": len(v)} for name, v in self.namespaces.items()},
+            "total_vector_count": sum(len(v) for v in self.namespaces.values()),
+        }
+
+    def delete(self, delete_all=False, namespace=""):
+        self.namespaces.pop(namespace, None)
+
+
+def benchmark_session_gc(weeks=6, sessions_per_day=30, resumes_per_session=15, ttl_days=7, dim=1536):
+    """Simulate weeks of screening with one shared namespace vs session namespaces + GC."""
+    rng = np.random.default_rng(0)
+    shared, scoped = _LocalIndex(), _LocalIndex()
+    day = 24 * 3600
+    start_time = 1_700_000_000
+
+    print(f"{sessions_per_day} sessions/day x {resumes_per_session} resumes, TTL {ttl_days} days:")
+    print("  week | shared vectors | query ms | scoped vectors | query ms")
+    for d in range(weeks * 7):
+        now = start_time + d * day
+        for s in range(sessions_per_day):
+            vectors = rng.standard_normal((resumes_per_session, dim)).astype(np.float32)
+            shared.upsert(vectors)
+            scoped.upsert(vectors, namespace=utils.session_namespace(f"{d}x{s}", now + s))
+        utils.collect_expired_sessions(ttl_days * day, index=scoped, now=now)
+
+        if (d + 1) % 7 == 0:
+            query = rng.standard_normal(dim).astype(np.float32)
+            current = utils.session_namespace(f"{d}x{sessions_per_day - 1}", now + sessions_per_day - 1)
+            shared_ms = min(timeit.repeat(lambda: shared.query(query, 3), number=20, repeat=3)) / 20 * 1000
+            scoped_ms = min(timeit.repeat(lambda: scoped.query(query, 3, current), number=20, repeat=3)) / 20 * 1000
+            print(f"  {(d + 1) // 7:4d} | {shared.describe_index_stats()['total_vector_count']:14d} | {shared_ms:8.2f} "
+                  f"| {scoped.describe_index_stats()['total_vector_count']:14d} | {scoped_ms:8.3f}")
+
+
+class _SlowFakeEmbeddings(Embeddings):
+    """Fake embedding model: one network round-trip per 1,000 texts, like OpenAI."""
+
+    def __init__(self, latency=0.3, dim=1536):
+        self.latency = latency
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency * (1 + (len(texts) - 1) // 1000))
+        rng = np.random.default_rng(len(texts))
+        return rng.standard_normal((len(texts), self.dim)).astype(np.float32).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class _RemoteStoreStandIn(InMemoryVectorStore):
+    """
+    Local stand-in for PineconeVectorStore that charges a round-trip per
+    32-vector upsert batch (4 in flight, as langchain_pinecone sends them)
+    and per query.
+    """
+
+    def __init__(self, embedding, rtt=0.08):
+        super().__init__(embedding)
+        self.rtt = rtt
+
+    def add_documents(self, documents, ids=None, **kwargs):
+        result = super().add_documents(documents, ids, **kwargs)
+        batches = 1 + (len(documents) - 1) // 32
+        time.sleep(self.rtt * (1 + (batches - 1) // 4))
+        return result
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        result = super().similarity_search_with_score(query, k, **kwargs)
+        time.sleep(self.rtt)
+        return result
+
+
+def benchmark_local_scoring(sizes=(10, 100, 1000), num_resumes=5):
+    """End-to-end ranking latency: vector DB round-trip vs in-memory scoring."""
+    print("Ranking resumes (300 ms per embedding request, 80 ms vector DB round-trip):")
+    print("  resumes | vector DB path | in-memory path")
+    for size in sizes:
+        docs = [Document(page_content=f"Resume {i}", metadata={"source": f"resume-{i}.pdf"}) for i in range(size)]
+
+        start = time.perf_counter()
+        store = _RemoteStoreStandIn(_SlowFakeEmbeddings())
+        store.add_documents(docs)
+        utils.retrieve_relevant_docs("Senior Python developer", num_resumes, store)
+        remote = time.perf_counter() - start
+
+        start = time.perf_counter()
+        utils.score_docs_locally("Senior Python developer", docs, num_resumes, _SlowFakeEmbeddings())
+        local = time.perf_counter() - start
+
+        print(f"  {size:7d} | {remote:13.2f}s | {local:13.2f}s")
+
+
+def _synthetic_screening_set(rng, relevant=5, distractors=45):
+    """
+    Long resumes with one strongly matching section (relevant), and short
+    resumes that only share a few job keywords (distractors).
+    """
+    skills = "python django pandas airflow kafka spark etl data pipelines postgres aws"
+    filler = ("led cross functional teams delivered projects on time mentored colleagues "
+              "presented quarterly results improved customer satisfaction managed budgets "
+              "coordinated vendors organised workshops volunteered community events").split()
+    docs = []
+    for i in range(relevant + distractors):
+        if i < relevant:
+            parts = [" ".join(rng.choice(filler, 120)) for _ in range(8)]
+            parts.insert(int(rng.integers(0, 8)), "Experience: " + " ".join(rng.choice(skills.split(), 60)))
+        else:
+            words = list(rng.choice(filler, 60)) + list(rng.choice(skills.split()[:3], 8))
+            parts = [" ".join(rng.permutation(words))]
+        docs.append(Document(page_content="\n\n".join(parts), metadata={"id": str(i), "source": f"resume-{i}.pdf"}))
+    return docs, f"Data engineer: {skills}", set(str(i) for i in range(relevant))
+
+
+def benchmark_section_matching(num_resumes=5):
+    """Ranking quality and summarization tokens: whole resumes vs sections."""
+    rng = np.random.default_rng(0)
+    docs, job_description, relevant = _synthetic_screening_set(rng, relevant=num_resumes)
+    embeddings = HashingEmbeddings()
+    sections = utils.create_section_docs(docs)
+
+    runs = {
+        "whole resume": utils.score_docs_locally(job_description, docs, num_resumes, embeddings),
+        "sections, max": utils.score_docs_locally(job_description, sections, num_resumes, embeddings, chunked=True),
+        "sections, top-2 mean": utils.score_docs_locally(
+            job_description, sections, num_resumes, embeddings, chunked=True, aggregation="top_k_mean"
+        ),
+    }
+    print(f"Matching {len(docs)} synthetic resumes ({len(sections)} sections), {num_resumes} relevant:")
+    print("  mode                 | precision@k | summarization tokens (full text of same resumes)")
+    full_text = {doc.metadata["id"]: doc.page_content for doc in docs}
+    for mode, ranked in runs.items():
+        precision = sum(doc.metadata["id"] in relevant for doc, _ in ranked) / num_resumes
+        # ~4 characters per token
+        tokens = sum(len(doc.page_content) for doc, _ in ranked) // 4
+        full_tokens = sum(len(full_text[doc.metadata["id"]]) for doc, _ in ranked) // 4
+        print(f"  {mode:20} | {precision:11.2f} | {tokens:6d} ({full_tokens})")
+
+
+def benchmark_batch_screening(resume_count=10_000, job_count=50, top_n=20):
+    """Throughput of the bulk screening CLI core on local fake embeddings."""
+    rng = np.random.default_rng(0)
+    vocabulary = [f"skill{i}" for i in range(2000)]
+    resumes = [
+        Document(page_content=" ".join(rng.choice(vocabulary, 300)), metadata={"source": f"resume-{i}.pdf"})
+        for i in range(resume_count)
+    ]
+    jobs = [(f"job-{j}", " ".join(rng.choice(vocabulary, 80))) for j in range(job_count)]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        output = os.path.join(work_dir, "matches.csv")
+        stats = batch_screening.screen(resumes, jobs, output, top_n, embeddings=HashingEmbeddings())
+        resumed = batch_screening.screen(resumes, jobs, output, top_n, embeddings=HashingEmbeddings())
+
+    pairs = resume_count * job_count
+    print(f"Bulk screening {resume_count} resumes x {job_count} jobs (hashing embeddings):")
+    print(f"  embedding        {stats['embed_seconds']:6.2f}s ({resume_count / stats['embed_seconds']:.0f} resumes/sec)")
+    print(f"  similarity+top-N {stats['match_seconds']:6.2f}s ({pairs / stats['match_seconds'] / 1e6:.1f}M pairs/sec)")
+    print(f"  total            {stats['total_seconds']:6.2f}s, rerun from saved progress {resumed['total_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    benchmark_resume_parsing()
+    benchmark_summarization()
+    benchmark_session_gc()
+    benchmark_local_scoring()
+    benchmark_section_matching()
+    benchmark_batch_screening()
@@ -0,0 +1,96 @@
+"""
+Offline embeddings computed locally by feature hashing.
+
+Set EMBEDDING_BACKEND=hashing to use them instead of OpenAI, e.g. for
+air-gapped machines or repeatable benchmarks. Each text is lowercased and
+split into words; every word and every character trigram of the word
+(padded with "<" and ">") is hashed into one of `dim` buckets with a
+pseudo-random sign. Counts are damped with a square root and the vector is
+L2-normalized, so similar spellings and shared words give a high cosine
+similarity. The hash is a fixed-key SipHash, so vectors are identical
+across processes and machines. The default dimension matches OpenAI's 1536,
+so existing Pinecone indexes keep their shape.
+"""
+
+import os
+import re
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_DIM = 1536
+EMBEDDING_BACKENDS = ("openai", "hashing")
+# Trigrams are weighted below whole words, which carry more meaning
+TRIGRAM_WEIGHT = 0.5
+
+_WORD = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words and character-trigram embeddings.
+
+    Args:
+      dim: Vector dimension, defaults to EMBEDDING_DIM or DEFAULT_DIM
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim or int(os.getenv("EMBEDDING_DIM") or DEFAULT_DIM)
+        self.model = f"hashing-{self.dim}"
+
+    def _features(self, texts: List[str]):
+        features, rows, weights = [], [], []
+        for row, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                padded = f"<{word}>"
+                trigrams = [padded[i : i + 3] for i in range(len(padded) - 2)]
+                features.append(f"w:{word}")
+                features.extend(trigrams)
+                rows.extend([row] * (len(trigrams) + 1))
+                weights.append(1.0)
+                weights.extend([TRIGRAM_WEIGHT] * len(trigrams))
+        return features, rows, weights
+
+    def _vectors(self, texts: List[str]) -> np.ndarray:
+        features, rows, weights = self._features(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if features:
+            hashes = pd.util.hash_array(np.asarray(features, dtype=object))
+            buckets = (hashes % np.uint64(self.dim)).astype(np.int64)
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+            cells = np.asarray(rows, dtype=np.int64) * self.dim + buckets
+            counts = np.bincount(
+                cells, weights=signs * np.asarray(weights), minlength=vectors.size
+            )
+            vectors = (np.sign(counts) * np.sqrt(np.abs(counts))).astype(np.float32)
+            vectors = vectors.reshape(len(texts), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        # Texts without words get a fixed unit vector; vector stores reject all-zero ones
+        vectors[norms[:, 0] == 0, 0] = 1.0
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents in one vectorized pass."""
+        return self._vectors(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query."""
+        return self._vectors([text])[0].tolist()
+
+
+def local_embeddings_from_env() -> Optional[HashingEmbeddings]:
+    """
+    Return local embeddings if EMBEDDING_BACKEND selects them
+
+    Returns:
+      HashingEmbeddings object, or None when the backend is OpenAI
+    """
+    backend = (os.getenv("EMBEDDING_BACKEND") or "openai").lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown EMBEDDING_BACKEND {backend!r}, expected one of {EMBEDDING_BACKENDS}"
+        )
+    return HashingEmbeddings() if backend == "hashing" else None
@@ -1,16 +1,57 @@
-from typing import List, Any, Tuple
+from typing import List, Any, Iterator, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
 from pinecone import Pinecone, ServerlessSpec, Index
 from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain_openai import OpenAI
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseLanguageModel
 from langchain.chains.summarize import load_summarize_chain
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pypdf import PdfReader
+from embedding_cache import CachedEmbeddings
+from local_embeddings import local_embeddings_from_env
 from dotenv import load_dotenv
+import asyncio
+import hashlib
+import io
+import numpy as np
 import os
+import queue
+import tempfile
+import threading
+import time
 
 load_dotenv()
 
+TEXT_CACHE_DIR = os.getenv("RESUME_TEXT_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "langchain-masterclass", "resume_text"
+)
+SUMMARY_CACHE_DIR = os.getenv("RESUME_SUMMARY_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "langchain-masterclass", "resume_summaries"
+)
+# Below this many uncached resumes, process start-up costs more than it saves
+PARALLEL_PARSE_MIN_FILES = 4
+# Resumes summarized at once, each is a multi-call map_reduce chain
+SUMMARY_MAX_CONCURRENCY = 5
+# Chunked mode: resumes are split into sections that are embedded and
+# matched on their own, then scores are aggregated per resume
+SECTION_CHUNK_SIZE = 800
+SECTION_CHUNK_OVERLAP = 80
+SECTION_FETCH_MULTIPLIER = 10  # sections fetched from Pinecone per resume asked for
+# Each screening session gets its own namespace, named
+# "<prefix><unix time>-<uuid>", so old sessions can be dropped wholesale
+SESSION_NAMESPACE_PREFIX = "session-"
+SESSION_TTL_SECONDS = int(float(os.getenv("SESSION_TTL_HOURS") or 24) * 3600)
+SESSION_GC_INTERVAL_SECONDS = 3600
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_summarize_llm: Optional[BaseLanguageModel] = None
+_summarize_chain: Any = None
+_last_session_gc = 0.0
+_session_gc_lock = threading.Lock()
+
 
 def _read_pdf_data(file: Any) -> str:
     """
@@ -23,22 +64,138 @@ def _read_pdf_data(file: Any) -> str:
       Text data from PDF file
     """
     pdf_reader = PdfReader(file)
-    pages = pdf_reader.pages
-    text = ""
-    for page in pages:
-        text += page.extract_text()
-    return text
+    return "".join(page.extract_text() for page in pdf_reader.pages)
+
+
+def _read_pdf_bytes(data: bytes) -> str:
+    """
+    Read PDF data from raw bytes and return text, used by the parse pool
+
+    Args:
+      data: PDF file content
+
+    Returns:
+      Text data from PDF file
+    """
+    return _read_pdf_data(io.BytesIO(data))
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Get the process pool used to parse resumes, creating it on first use
+
+    Returns:
+      ProcessPoolExecutor shared across Streamlit reruns
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _parse_pool
 
 
-def _create_embeddings() -> OpenAIEmbeddings:
+def _load_cached_text(cache_dir: str, key: str) -> Optional[str]:
     """
-    Create OpenAI embeddings
+    Load text previously stored in an on-disk cache
+
+    Args:
+      cache_dir: Cache directory
+      key: Cache key, a hex digest
 
     Returns:
-      OpenAIEmbeddings object
+      Cached text, or None if the key is not cached
+    """
+    try:
+        with open(os.path.join(cache_dir, f"{key}.txt"), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _store_cached_text(cache_dir: str, key: str, text: str) -> None:
     """
+    Store text in an on-disk cache
+
+    Args:
+      cache_dir: Cache directory
+      key: Cache key, a hex digest
+      text: Text to cache
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.txt")
+    # Sessions are threads of one process, so each write needs its own temp file
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
     try:
-        embeddings = OpenAIEmbeddings()
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)  # atomic, so concurrent sessions never see half a file
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def parse_pdfs(pdf_files: List[Any]) -> List[Tuple[str, str]]:
+    """
+    Extract text from PDF files, in parallel and cached by content hash
+
+    Resumes seen before (by SHA-256 of their bytes) are read from the text
+    cache. The rest are parsed across a process pool once there are at least
+    PARALLEL_PARSE_MIN_FILES of them.
+
+    Args:
+      pdf_files: List of PDF file objects
+
+    Returns:
+      List of (content hash, text) tuples in the order of pdf_files
+    """
+    contents = []
+    for pdf_file in pdf_files:
+        pdf_file.seek(0)
+        contents.append(pdf_file.read())
+    hashes = [hashlib.sha256(data).hexdigest() for data in contents]
+
+    texts = {}
+    to_parse = {}
+    for content_hash, data in zip(hashes, contents):
+        if content_hash in texts or content_hash in to_parse:
+            continue
+        cached = _load_cached_text(TEXT_CACHE_DIR, content_hash)
+        if cached is None:
+            to_parse[content_hash] = data
+        else:
+            texts[content_hash] = cached
+
+    if to_parse:
+        if len(to_parse) >= PARALLEL_PARSE_MIN_FILES:
+            workers = os.cpu_count() or 1
+            chunksize = max(1, len(to_parse) // (workers * 4))
+            parsed = _get_parse_pool().map(
+                _read_pdf_bytes, to_parse.values(), chunksize=chunksize
+            )
+        else:
+            parsed = map(_read_pdf_bytes, to_parse.values())
+        for content_hash, text in zip(to_parse, parsed):
+            texts[content_hash] = text
+            _store_cached_text(TEXT_CACHE_DIR, content_hash, text)
+
+    return [(content_hash, texts[content_hash]) for content_hash in hashes]
+
+
+def _create_embeddings() -> Embeddings:
+    """
+    Create OpenAI embeddings backed by the on-disk embedding cache
+
+    With EMBEDDING_BACKEND=hashing, local embeddings are returned instead;
+    they are cheaper to compute than to look up, so they are not cached.
+
+    Returns:
+      CachedEmbeddings object wrapping OpenAIEmbeddings, or HashingEmbeddings
+    """
+    try:
+        local = local_embeddings_from_env()
+        if local is not None:
+            return local
+        embeddings = CachedEmbeddings(OpenAIEmbeddings())
         return embeddings
     except Exception as e:
         print(f"Error creating embeddings: {e}")
@@ -93,9 +250,7 @@ def create_docs(pdf_files: List[Any], uuid: str) -> List[Document]:
       List of Document objects
     """
     docs = []
-    for pdf_file in pdf_files:
-        pdf_text = _read_pdf_data(pdf_file)
-
+    for pdf_file, (content_hash, pdf_text) in zip(pdf_files, parse_pdfs(pdf_files)):
         docs.append(
             Document(
                 page_content=pdf_text,
@@ -105,6 +260,7 @@ def create_docs(pdf_files: List[Any], uuid: str) -> List[Document]:
                     "source": pdf_file.name,
                     "type=": pdf_file.type,
                     "size": pdf_file.size,
+                    "content_hash": content_hash,
                 },
             )
         )
@@ -112,23 +268,210 @@ def create_docs(pdf_files: List[Any], uuid: str) -> List[Document]:
     return docs
 
 
+def session_namespace(uuid: str, created_at: Optional[float] = None) -> str:
+    """
+    Get the Pinecone namespace of a screening session
+
+    Args:
+      uuid: Unique identifier of the session
+      created_at: Session start as a Unix timestamp, defaults to now
+
+    Returns:
+      Namespace name carrying the session start time
+    """
+    created_at = time.time() if created_at is None else created_at
+    return f"{SESSION_NAMESPACE_PREFIX}{int(created_at)}-{uuid}"
+
+
+def _session_created_at(namespace: str) -> Optional[int]:
+    """
+    Parse the session start time out of a session namespace
+
+    Args:
+      namespace: Namespace name
+
+    Returns:
+      Unix timestamp, or None if this is not a session namespace
+    """
+    if not namespace.startswith(SESSION_NAMESPACE_PREFIX):
+        return None
+    created_at = namespace[len(SESSION_NAMESPACE_PREFIX):].split("-", 1)[0]
+    return int(created_at) if created_at.isdigit() else None
+
+
+def collect_expired_sessions(
+    ttl_seconds: Optional[int] = None,
+    index: Optional[Index] = None,
+    now: Optional[float] = None,
+) -> List[str]:
+    """
+    Delete the vectors of screening sessions older than the TTL
+
+    Args:
+      ttl_seconds: Maximum session age, defaults to SESSION_TTL_SECONDS
+      index: Pinecone index, defaults to PINECONE_INDEX_NAME
+      now: Current Unix timestamp, defaults to now
+
+    Returns:
+      List of deleted namespaces
+    """
+    ttl_seconds = SESSION_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    now = time.time() if now is None else now
+    if index is None:
+        index = _create_or_get_index(os.getenv("PINECONE_INDEX_NAME"))
+
+    deleted = []
+    try:
+        for namespace in index.describe_index_stats()["namespaces"]:
+            created_at = _session_created_at(namespace)
+            if created_at is not None and now - created_at > ttl_seconds:
+                index.delete(delete_all=True, namespace=namespace)
+                deleted.append(namespace)
+    except Exception as e:
+        print(f"Error collecting expired sessions: {e}")
+        raise e
+
+    if deleted:
+        print(f"Deleted {len(deleted)} expired screening sessions")
+    return deleted
+
+
+def collect_expired_sessions_in_background() -> None:
+    """
+    Run collect_expired_sessions in a daemon thread, at most once per
+    SESSION_GC_INTERVAL_SECONDS in this process
+    """
+    global _last_session_gc
+    with _session_gc_lock:
+        if time.time() - _last_session_gc < SESSION_GC_INTERVAL_SECONDS:
+            return
+        _last_session_gc = time.time()
+
+    def run() -> None:
+        try:
+            collect_expired_sessions()
+        except Exception:
+            pass  # already logged, the next interval will retry
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def create_section_docs(
+    docs: List[Document],
+    chunk_size: int = SECTION_CHUNK_SIZE,
+    chunk_overlap: int = SECTION_CHUNK_OVERLAP,
+) -> List[Document]:
+    """
+    Split resume documents into sections for chunked indexing
+
+    Args:
+      docs: List of Document objects, one per resume
+      chunk_size: Maximum section length in characters
+      chunk_overlap: Overlap between consecutive sections
+
+    Returns:
+      List of section Document objects carrying their resume's metadata
+      plus a "section" number
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""],
+    )
+    sections = text_splitter.split_documents(docs)
+    counters = {}
+    for section in sections:
+        resume = section.metadata.get("id", section.metadata.get("source"))
+        section.metadata["section"] = counters.get(resume, 0)
+        counters[resume] = section.metadata["section"] + 1
+    return sections
+
+
+def aggregate_section_scores(
+    scored_sections: List[Tuple[Document, float]],
+    num_resumes: int,
+    aggregation: str = "max",
+    top_k: int = 2,
+) -> List[Tuple[Document, float]]:
+    """
+    Aggregate section match scores into one score per resume
+
+    Args:
+      scored_sections: List of (section Document, score) tuples
+      num_resumes: Number of resumes to return
+      aggregation: "max" for the best section, "top_k_mean" for the mean of
+        the top_k best sections
+      top_k: Sections per resume used by "top_k_mean", and the number of
+        best-matching sections kept in the returned documents
+
+    Returns:
+      List of (Document, score) tuples, best match first. Each Document
+      holds only the resume's best-matching sections, in reading order
+    """
+    if aggregation not in ("max", "top_k_mean"):
+        raise ValueError(f"Unknown aggregation: {aggregation}")
+
+    by_resume = {}
+    for section, score in scored_sections:
+        resume = section.metadata.get("id", section.metadata.get("source"))
+        by_resume.setdefault(resume, []).append((section, score))
+
+    ranked = []
+    for sections in by_resume.values():
+        sections.sort(key=lambda item: item[1], reverse=True)
+        best = sections[:top_k]
+        if aggregation == "max":
+            score = best[0][1]
+        else:
+            score = float(np.mean([item[1] for item in best]))
+
+        best.sort(key=lambda item: item[0].metadata.get("section", 0))
+        metadata = {
+            key: value
+            for key, value in best[0][0].metadata.items()
+            if key != "section"
+        }
+        metadata["sections"] = [item[0].metadata.get("section", 0) for item in best]
+        ranked.append(
+            (
+                Document(
+                    page_content="\n\n".join(item[0].page_content for item in best),
+                    metadata=metadata,
+                ),
+                score,
+            )
+        )
+
+    ranked.sort(key=lambda item: item[1], reverse=True)
+    return ranked[:num_resumes]
+
+
 # Create embeddings and store to Vector Store
-def push_to_pinecone(docs: List[Document]) -> PineconeVectorStore:
+def push_to_pinecone(
+    docs: List[Document], namespace: Optional[str] = None
+) -> PineconeVectorStore:
     """
     Push documents to Pinecone vector store
 
     Args:
       docs: List of Document objects
+      namespace: Pinecone namespace, defaults to a new session namespace
+        for the uuid in the documents' metadata
 
     Returns:
-      PineconeVectorStore object
+      PineconeVectorStore object scoped to the namespace
     """
     try:
         embeddings = _create_embeddings()
 
         index = _create_or_get_index(os.getenv("PINECONE_INDEX_NAME"))
 
-        vector_store = PineconeVectorStore(index=index, embedding=embeddings)
+        if namespace is None:
+            namespace = session_namespace(docs[0].metadata["uuid"])
+        vector_store = PineconeVectorStore(
+            index=index, embedding=embeddings, namespace=namespace
+        )
         vector_store.add_documents(docs)
 
         return vector_store
@@ -138,23 +481,239 @@ def push_to_pinecone(docs: List[Document]) -> PineconeVectorStore:
 
 
 def retrieve_relevant_docs(
-    job_description: str, num_resumes: int, vector_store: PineconeVectorStore
+    job_description: str,
+    num_resumes: int,
+    vector_store: PineconeVectorStore,
+    chunked: bool = False,
+    aggregation: str = "max",
 ) -> List[Tuple[Document, float]]:
     """
     Retrieve relevant documents from Pinecone vector store
 
+    Only the vector store's namespace is searched, so a store returned by
+    push_to_pinecone sees the current session's resumes only.
+
     Args:
       job_description: Job description text
       num_resumes: Number of resumes to retrieve
       vector_store: PineconeVectorStore object
+      chunked: Whether the store holds resume sections from
+        create_section_docs, to be aggregated per resume
+      aggregation: Section score aggregation, see aggregate_section_scores
 
     Returns:
       List of Document objects
     """
-    similar_docs = vector_store.similarity_search_with_score(
-        job_description, k=num_resumes
+    if not chunked:
+        similar_docs = vector_store.similarity_search_with_score(
+            job_description, k=num_resumes
+        )
+        return similar_docs
+
+    scored_sections = vector_store.similarity_search_with_score(
+        job_description, k=num_resumes * SECTION_FETCH_MULTIPLIER
     )
-    return similar_docs
+    return aggregate_section_scores(scored_sections, num_resumes, aggregation)
+
+
+def score_docs_locally(
+    job_description: str,
+    docs: List[Document],
+    num_resumes: int,
+    embeddings: Optional[Embeddings] = None,
+    chunked: bool = False,
+    aggregation: str = "max",
+) -> List[Tuple[Document, float]]:
+    """
+    Rank documents against the job description without a vector database
+
+    The job description and every resume are embedded in one batch call
+    and scored with a single cosine matrix product, which skips the
+    Pinecone write-then-read round-trip for a one-off screening session.
+
+    Args:
+      job_description: Job description text
+      docs: List of Document objects
+      num_resumes: Number of resumes to retrieve
+      embeddings: Embeddings object, defaults to _create_embeddings()
+      chunked: Whether docs are resume sections from create_section_docs,
+        to be aggregated per resume
+      aggregation: Section score aggregation, see aggregate_section_scores
+
+    Returns:
+      List of (Document, cosine similarity) tuples, best match first
+    """
+    if not docs:
+        return []
+    try:
+        embeddings = embeddings or _create_embeddings()
+        vectors = np.asarray(
+            embeddings.embed_documents(
+                [job_description] + [doc.page_content for doc in docs]
+            ),
+            dtype=np.float32,
+        )
+    except Exception as e:
+        print(f"Error embedding documents: {e}")
+        raise e
+
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1.0
+    vectors /= norms[:, None]
+    scores = vectors[1:] @ vectors[0]
+
+    if chunked:
+        return aggregate_section_scores(
+            list(zip(docs, scores.tolist())), num_resumes, aggregation
+        )
+    top = np.argsort(-scores, kind="stable")[:num_resumes]
+    return [(docs[i], float(scores[i])) for i in top]
+
+
+def _get_summarize_chain(llm: Optional[BaseLanguageModel] = None) -> Tuple[Any, str]:
+    """
+    Get the map_reduce summarize chain, building the default one only once
+
+    Args:
+      llm: LLM to summarize with, defaults to a shared OpenAI(temperature=0)
+
+    Returns:
+      Tuple of the chain and the model name used in summary cache keys
+    """
+    global _summarize_llm, _summarize_chain
+    if llm is None:
+        if _summarize_chain is None:
+            _summarize_llm = OpenAI(temperature=0)
+            _summarize_chain = load_summarize_chain(_summarize_llm, chain_type="map_reduce")
+        llm, chain = _summarize_llm, _summarize_chain
+    else:
+        chain = load_summarize_chain(llm, chain_type="map_reduce")
+    model = getattr(llm, "model_name", None) or type(llm).__name__
+    return chain, model
+
+
+def _summary_cache_key(doc: Document, model: str) -> str:
+    """
+    Get the summary cache key for a resume
+
+    Args:
+      doc: Document object
+      model: Name of the summarizing model
+
+    Returns:
+      SHA-256 of the model name and the document text
+    """
+    return hashlib.sha256(f"{model}\0{doc.page_content}".encode("utf-8")).hexdigest()
+
+
+async def _asummarize_all(
+    docs: List[Document], chain: Any, model: str, max_concurrency: int
+):
+    """
+    Summarize documents concurrently, yielding results as they complete
+
+    Args:
+      docs: List of Document objects
+      chain: Summarize chain shared by all documents
+      model: Name of the summarizing model
+      max_concurrency: Maximum number of chains running at once
+
+    Yields:
+      Tuples of (index in docs, summary text)
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def summarize(index: int, doc: Document) -> Tuple[int, str]:
+        async with semaphore:
+            summary = await chain.ainvoke([doc])
+        _store_cached_text(SUMMARY_CACHE_DIR, _summary_cache_key(doc, model), summary["output_text"])
+        return index, summary["output_text"]
+
+    for next_done in asyncio.as_completed(
+        [summarize(index, doc) for index, doc in enumerate(docs)]
+    ):
+        yield await next_done
+
+
+def iter_summaries(
+    docs: List[Document],
+    max_concurrency: int = SUMMARY_MAX_CONCURRENCY,
+    llm: Optional[BaseLanguageModel] = None,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Summarize documents concurrently with one shared LLM and chain
+
+    Cached summaries (keyed by document text and model) are yielded first,
+    the rest as soon as each chain finishes, so callers can render them
+    progressively.
+
+    Args:
+      docs: List of Document objects
+      max_concurrency: Maximum number of chains running at once
+      llm: LLM to summarize with, defaults to a shared OpenAI(temperature=0)
+
+    Yields:
+      Tuples of (index in docs, summary text) in completion order
+    """
+    chain, model = _get_summarize_chain(llm)
+
+    pending = []
+    for index, doc in enumerate(docs):
+        cached = _load_cached_text(SUMMARY_CACHE_DIR, _summary_cache_key(doc, model))
+        if cached is None:
+            pending.append(index)
+        else:
+            yield index, cached
+    if not pending:
+        return
+
+    # Run the event loop in a worker thread so this stays a plain generator
+    # that Streamlit's script thread can iterate over.
+    results: "queue.Queue[Any]" = queue.Queue()
+    done = object()
+
+    async def consume() -> None:
+        async for position, summary in _asummarize_all(
+            [docs[index] for index in pending], chain, model, max_concurrency
+        ):
+            results.put((pending[position], summary))
+
+    def run() -> None:
+        try:
+            asyncio.run(consume())
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(done)
+
+    threading.Thread(target=run, daemon=True).start()
+    while (item := results.get()) is not done:
+        if isinstance(item, Exception):
+            print(f"Error getting summary: {item}")
+            raise item
+        yield item
+
+
+def get_summaries(
+    docs: List[Document],
+    max_concurrency: int = SUMMARY_MAX_CONCURRENCY,
+    llm: Optional[BaseLanguageModel] = None,
+) -> List[str]:
+    """
+    Get summaries of several documents, summarized concurrently
+
+    Args:
+      docs: List of Document objects
+      max_concurrency: Maximum number of chains running at once
+      llm: LLM to summarize with, defaults to a shared OpenAI(temperature=0)
+
+    Returns:
+      List of summary texts in the order of docs
+    """
+    summaries = [""] * len(docs)
+    for index, summary in iter_summaries(docs, max_concurrency, llm):
+        summaries[index] = summary
+    return summaries
 
 
 def get_summary(similar_doc: Document) -> str:
@@ -168,10 +727,7 @@ def get_summary(similar_doc: Document) -> str:
       Summary text
     """
     try:
-        llm = OpenAI(temperature=0)
-        chain = load_summarize_chain(llm, chain_type="map_reduce")
-        summary = chain.invoke([similar_doc])
-        return summary["output_text"]
+        return get_summaries([similar_doc])[0]
     except Exception as e:
         print(f"Error getting summary: {e}")
         raise e
@@ -3,11 +3,15 @@ import streamlit as st
 from dotenv import load_dotenv
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import CSVLoader
 from langchain.schema import Document
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import os
 
+import pandas as pd
+
+from local_embeddings import local_embeddings_from_env
+from utils import load_vector_db, search_batch
+
 # Load the environment variables
 load_dotenv()
 
@@ -15,26 +19,19 @@ load_dotenv()
 DEFAULT_CSV_PATH = "myData.csv"
 DEFAULT_K_RESULTS = 3
 
-# Load the data
-@st.cache_data
-def load_data() -> Optional[List[Document]]:
-    try: 
-        with st.spinner("Loading documents from {file_path}..."):
-            loader = CSVLoader(file_path=DEFAULT_CSV_PATH)
-            documents = loader.load()
-        return documents
-
-    except FileNotFoundError:
-        st.error(f"Error: The file {DEFAULT_CSV_PATH} was not found.")
-        return None
-
 # Create Vectore Database
+# The index is saved to disk, so a new process only embeds rows added to the CSV
 @st.cache_resource
-def create_vector_db(documents: List[Document]):
+def create_vector_db():
     try:       
-        embeddings = OpenAIEmbeddings()
-        db = FAISS.from_documents(documents, embeddings)
+        # EMBEDDING_BACKEND=hashing embeds locally, without network access
+        embeddings = local_embeddings_from_env() or OpenAIEmbeddings()
+        with st.spinner("Loading the word index..."):
+            db = load_vector_db(DEFAULT_CSV_PATH, embeddings)
         return db
+    except FileNotFoundError:
+        st.error(f"Error: The file {DEFAULT_CSV_PATH} was not found.")
+        return None
     except Exception as e:
         st.error(f"Error creating vector database: {e}")
         return None
@@ -49,6 +46,24 @@ def get_similar_matches(user_input: str, db: FAISS) -> List[Document]:
         st.error(f"Error searching for similar matches: {e}")
         return []
 
+# Expand a whole list of words at once
+# All words are embedded in batched requests and searched as one matrix
+def get_similar_matches_batch(words: List[str], db: FAISS) -> Optional[pd.DataFrame]:
+    try:
+        with st.spinner(f"Searching for similar matches of {len(words):,} words..."):
+            return search_batch(db, words, k=DEFAULT_K_RESULTS)
+    except Exception as e:
+        st.error(f"Error searching for similar matches: {e}")
+        return None
+
+# Read the words to expand from the first column of an uploaded CSV, with the upload's id
+def get_uploaded_words() -> Tuple[Optional[str], List[str]]:
+    uploaded_file = st.file_uploader("Upload a CSV with one word per row", type="csv")
+    if uploaded_file is None:
+        return None, []
+    words = pd.read_csv(uploaded_file).iloc[:, 0].dropna().astype(str).str.strip()
+    return uploaded_file.file_id, words[words != ""].tolist()
+
 # Create the user input handler
 def get_user_input() -> str:
     input_text: str = st.text_input("Enter a word", key="input")
@@ -60,9 +75,22 @@ def main():
     st.set_page_config(page_title="Similar Words Finder")
     st.header("Similar Words Finder")
     
-    documents = load_data()
-    db = create_vector_db(documents)
-    
+    db = create_vector_db()
+
+    mode = st.radio("Search", ["One word", "Upload a CSV of words"], horizontal=True)
+    if mode == "Upload a CSV of words":
+        file_id, words = get_uploaded_words()
+        if words and st.button("Find Similar Things"):
+            # Kept across the rerun that the download button triggers, for this upload only
+            st.session_state.batch_matches = (file_id, get_similar_matches_batch(words, db))
+        matches_file_id, matches = st.session_state.get("batch_matches", (None, None))
+        if words and matches is not None and matches_file_id == file_id:
+            st.dataframe(matches, hide_index=True)
+            st.download_button(
+                "Download matches", matches.to_csv(index=False), "similar_words.csv", "text/csv"
+            )
+        return
+
     user_input = get_user_input()
     submit = st.button("Find Similar Things")
 
@@ -0,0 +1,296 @@
+"""
+Benchmarks for the persistent word index in utils.py.
+
+Run with `python benchmark.py` for everything, or `python benchmark.py cold`
+`python benchmark.py index [sizes...]`, `python benchmark.py storage [size]` or
+`python benchmark.py batch` or `python benchmark.py local` for one of them. Words are synthetic and embeddings come from a
+fast deterministic stand-in, so no API key is needed; with OpenAI the rebuild
+times below would also include one embedding request per 2048 rows.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+import faiss
+
+from local_embeddings import HashingEmbeddings
+from utils import (
+    build_index,
+    exact_index,
+    index_config,
+    load_vector_db,
+    read_rows,
+    search_batch,
+    set_search_params,
+    with_rescoring,
+)
+
+EMBEDDING_DIM = 256  # smaller than OpenAI's 1536 so 1M vectors fit in this box's memory
+
+
+class _FastFakeEmbeddings(Embeddings):
+    """Deterministic vectors derived from a hash of each text."""
+
+    model = "fast-fake"
+
+    def _vectors(self, texts):
+        hashes = pd.util.hash_pandas_object(pd.Series(texts), index=False).to_numpy()
+        phases = ((hashes >> np.uint64(11)).astype(np.float64) / 2**53 * 1000)[:, None]
+        return np.sin(phases * np.arange(1, EMBEDDING_DIM + 1)).astype(np.float32)
+
+    def embed_documents(self, texts):
+        return self._vectors(texts)
+
+    def embed_query(self, text):
+        return self._vectors([text])[0].tolist()
+
+
+class _RemoteFakeEmbeddings(_FastFakeEmbeddings):
+    """Adds a fixed delay per request, like the round trip to an embedding API."""
+
+    def __init__(self, request_latency):
+        self.request_latency = request_latency
+        self.requests = 0
+
+    def _vectors(self, texts):
+        self.requests += 1
+        time.sleep(self.request_latency)
+        return super()._vectors(texts)
+
+
+def _write_words(path, start, count, mode="w"):
+    words = pd.Series([f"word{i}" for i in range(start, start + count)], name="Words")
+    words.to_csv(path, index=False, header=mode == "w", mode=mode)
+
+
+def benchmark_cold_start(sizes=(10_000, 100_000, 1_000_000), added_share=0.01):
+    """Startup time of the word index: rebuilt every time vs loaded from disk."""
+    embeddings = _FastFakeEmbeddings()
+    print(f"Word index cold start (dim {EMBEDDING_DIM}, fake local embeddings):")
+    for size in sizes:
+        work_dir = tempfile.mkdtemp()
+        try:
+            csv_path = os.path.join(work_dir, "words.csv")
+            index_dir = os.path.join(work_dir, "index")
+            _write_words(csv_path, 0, size)
+
+            # What app.py did in every new process
+            start = time.perf_counter()
+            texts, _ = read_rows(csv_path)
+            docs = [Document(page_content=text) for text in texts]
+            FAISS.from_documents(docs, embeddings)
+            rebuild = time.perf_counter() - start
+            del docs
+
+            start = time.perf_counter()
+            load_vector_db(csv_path, embeddings, index_dir)
+            first_build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            db = load_vector_db(csv_path, embeddings, index_dir)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            matches = db.similarity_search("Words: word42", k=3)
+            query = time.perf_counter() - start
+            assert matches[0].page_content == "Words: word42"
+
+            added = max(1, int(size * added_share))
+            _write_words(csv_path, size, added, mode="a")
+            start = time.perf_counter()
+            db = load_vector_db(csv_path, embeddings, index_dir)
+            incremental = time.perf_counter() - start
+            assert db.index.ntotal == size + added
+        finally:
+            shutil.rmtree(work_dir)
+
+        print(f"  {size:>9,} words: rebuild {rebuild:6.2f}s | first build + save {first_build:6.2f}s | "
+              f"cold start from disk {cold * 1000:7.1f} ms | +{added:,} rows {incremental:6.2f}s | "
+              f"first query {query * 1000:.1f} ms")
+
+
+ANN_DIM = 64  # small enough that 5M vectors and their ground truth fit in memory
+ANN_QUERIES = 1000
+ANN_K = 10
+# (index type, search settings to sweep)
+ANN_CONFIGS = [
+    ("flat", [{}]),
+    ("ivf_flat", [{"nprobe": n} for n in (4, 16, 64)]),
+    ("hnsw", [{"ef_search": ef} for ef in (16, 64, 256)]),
+    ("ivf_pq", [{"nprobe": n} for n in (4, 16, 64)]),
+]
+
+
+def _clustered_vectors(count, dim, seed, clusters=1000):
+    """Gaussian blobs, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(0).normal(size=(clusters, dim)).astype(np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, 1_000_000):
+        stop = min(count, start + 1_000_000)
+        labels = rng.integers(0, clusters, stop - start)
+        vectors[start:stop] = centers[labels] + 1.0 * rng.normal(size=(stop - start, dim))
+    return vectors
+
+
+def _index_mb(index):
+    with tempfile.NamedTemporaryFile() as f:
+        faiss.write_index(index, f.name)
+        return os.path.getsize(f.name) / 2**20
+
+
+def benchmark_index_types(sizes=(100_000, 1_000_000)):
+    """Recall@10 against exact search, queries/s and size of each index type."""
+    queries = _clustered_vectors(ANN_QUERIES, ANN_DIM, seed=1)
+    print(f"Index types (dim {ANN_DIM}, {ANN_QUERIES} queries, recall@{ANN_K} vs exact, "
+          f"{faiss.omp_get_max_threads()} thread(s)):")
+    for size in sizes:
+        vectors = _clustered_vectors(size, ANN_DIM, seed=2)
+        truth = None
+        for index_type, settings in ANN_CONFIGS:
+            start = time.perf_counter()
+            index = build_index(vectors, index_config(index_type))
+            build = time.perf_counter() - start
+            size_mb = _index_mb(index)
+            for params in settings:
+                set_search_params(index, **params)
+                start = time.perf_counter()
+                _, found = index.search(queries, ANN_K)
+                qps = ANN_QUERIES / (time.perf_counter() - start)
+                if truth is None:
+                    truth = found
+                recall = np.mean([len(np.intersect1d(a, b)) for a, b in zip(found, truth)]) / ANN_K
+                label = ", ".join(f"{k}={v}" for k, v in params.items()) or "exact"
+                print(f"  {size:>9,} {index_type:<8} {label:<13} recall {recall:5.3f} | "
+                      f"{qps:9,.0f} q/s | {size_mb:7.1f} MB | build {build:6.1f}s")
+            del index
+        del vectors
+
+
+STORAGE_DIM = 1536  # OpenAI text-embedding dimension
+STORAGE_QUERIES = 200
+# (storage, PCA dimensions, re-scoring factor)
+STORAGE_CONFIGS = [
+    ("float32", 0, 0),
+    ("float16", 0, 0),
+    ("float16", 0, 4),
+    ("int8", 0, 0),
+    ("int8", 0, 4),
+    ("int8", 384, 0),
+    ("int8", 384, 4),
+    ("int8", 128, 4),
+    ("int8", 128, 16),
+]
+
+
+def benchmark_storage(size=100_000):
+    """Bytes per vector, latency and recall@10 of each vector storage format."""
+    vectors = _clustered_vectors(size, STORAGE_DIM, seed=2)
+    queries = _clustered_vectors(STORAGE_QUERIES, STORAGE_DIM, seed=1)
+    exact = exact_index(vectors)
+    _, truth = exact.search(queries, ANN_K)
+    print(f"Vector storage ({size:,} x {STORAGE_DIM} dims, flat search, {STORAGE_QUERIES} queries, "
+          f"recall@{ANN_K} vs float32):")
+    for storage, pca_dim, factor in STORAGE_CONFIGS:
+        index = build_index(vectors, index_config("flat", storage=storage, pca_dim=pca_dim))
+        resident = _index_mb(index) * 2**20 / size
+        searched = with_rescoring(index, exact, factor)
+        start = time.perf_counter()
+        _, found = searched.search(queries, ANN_K)
+        latency = (time.perf_counter() - start) / STORAGE_QUERIES
+        recall = np.mean([len(np.intersect1d(a, b)) for a, b in zip(found, truth)]) / ANN_K
+        label = storage + (f" + PCA{pca_dim}" if pca_dim else "")
+        rescore = f"re-score x{factor}" if factor else "no re-score"
+        print(f"  {label:<15} {rescore:<13} {resident:7,.0f} B/vector in RAM | "
+              f"{latency * 1000:6.1f} ms/query | recall {recall:5.3f}")
+        del index, searched
+    print(f"  re-scoring reads float32 rows from a memory-mapped file "
+          f"({STORAGE_DIM * 4:,} B/vector on disk, only candidate rows paged in)")
+
+
+def benchmark_batch_queries(size=100_000, query_count=500, k=3, request_latencies=(0.0, 0.05)):
+    """Words/s of search_batch against one similarity_search per word."""
+    work_dir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(work_dir, "words.csv")
+        _write_words(csv_path, 0, size)
+        load_vector_db(csv_path, _FastFakeEmbeddings(), os.path.join(work_dir, "index"))
+        rng = np.random.default_rng(0)
+        queries = [f"Words: word{i}" for i in rng.integers(0, size, query_count)]
+
+        print(f"Batch queries ({query_count} words, k={k}, {size:,}-word flat index):")
+        for latency in request_latencies:
+            embeddings = _RemoteFakeEmbeddings(latency)
+            db = load_vector_db(csv_path, embeddings, os.path.join(work_dir, "index"))
+
+            start = time.perf_counter()
+            looped = [db.similarity_search(query, k=k) for query in queries]
+            loop = time.perf_counter() - start
+            loop_requests, embeddings.requests = embeddings.requests, 0
+
+            start = time.perf_counter()
+            batched = search_batch(db, queries, k)
+            batch = time.perf_counter() - start
+            expected = {(q, d.page_content) for q, docs in zip(queries, looped) for d in docs}
+            assert set(zip(batched["query"], batched["match"])) == expected
+
+            print(f"  {latency * 1000:3.0f} ms/request: per-word loop {query_count / loop:8,.0f} words/s "
+                  f"({loop_requests} requests) | batch {query_count / batch:8,.0f} words/s "
+                  f"({embeddings.requests} requests) | {loop / batch:5.1f}x")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def benchmark_local_embeddings(size=100_000, dims=(256, 1536)):
+    """Throughput of the offline hashing embeddings, and an index built with them."""
+    texts = [f"Words: word{i}" for i in range(size)]
+    print(f"Local hashing embeddings ({size:,} short texts, one process):")
+    for dim in dims:
+        embeddings = HashingEmbeddings(dim)
+        start = time.perf_counter()
+        vectors = embeddings._vectors(texts)
+        array = time.perf_counter() - start
+        start = time.perf_counter()
+        embeddings.embed_documents(texts[:20_000])
+        as_lists = (time.perf_counter() - start) * size / 20_000
+        again = HashingEmbeddings(dim).embed_documents(texts[:100])
+        same = np.array_equal(vectors[:100], np.asarray(again, dtype=np.float32))
+        print(f"  dim {dim:>5}: {size / array:9,.0f} texts/s as an array | "
+              f"{size / as_lists:9,.0f} texts/s as LangChain lists | deterministic {same}")
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(work_dir, "words.csv")
+        _write_words(csv_path, 0, size)
+        start = time.perf_counter()
+        db = load_vector_db(csv_path, HashingEmbeddings(256), os.path.join(work_dir, "index"))
+        build = time.perf_counter() - start
+        matches = [doc.page_content for doc in db.similarity_search("word4242", k=3)]
+        assert "Words: word4242" in matches, matches
+        print(f"  {size:,}-word index built offline in {build:.1f}s; 'word4242' -> {matches}")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    which = sys.argv[1] if len(sys.argv) > 1 else "all"
+    if which in ("all", "cold"):
+        benchmark_cold_start()
+    if which in ("all", "index"):
+        sizes = [int(size) for size in sys.argv[2:]] if which == "index" else []
+        sizes = sizes or (100_000, 1_000_000)
+        benchmark_index_types(sizes)
+    if which in ("all", "storage"):
+        benchmark_storage(*[int(size) for size in sys.argv[2:3] if which == "storage"])
+    if which in ("all", "batch"):
+        benchmark_batch_queries()
+    if which in ("all", "local"):
+        benchmark_local_embeddings()
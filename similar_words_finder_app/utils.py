@@ -0,0 +1,564 @@
+"""
+Persistent FAISS index for the Similar Words Finder.
+
+The index, the row texts and a manifest of row hashes are saved in
+INDEX_DIR. At startup the index is memory-mapped and the CSV is only read
+again if its size or modification time changed; then rows whose hash is new
+are embedded and appended, and rows that disappeared are removed. Nothing is
+re-embedded for rows that were already indexed.
+
+The index type is set by WORD_INDEX_TYPE: "flat" (exact search), or the
+approximate "ivf_flat", "hnsw" and "ivf_pq", whose per-query cost grows much
+more slowly with the vocabulary. Their speed/recall trade-off is tuned with
+WORD_INDEX_NPROBE (IVF) and WORD_INDEX_EF_SEARCH (HNSW) at load time.
+
+WORD_INDEX_STORAGE keeps the searched vectors as float32, float16 or int8
+codes, optionally after a PCA to WORD_INDEX_PCA_DIM dimensions. Lossy
+indexes also save the float32 vectors, memory-mapped at load, and the
+top WORD_INDEX_RESCORE_FACTOR * k candidates of every search are re-scored
+exactly against them; only the few pages holding those rows are read.
+"""
+
+import json
+import os
+import tempfile
+from collections.abc import Mapping
+from typing import Iterator, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+import pandas as pd
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+INDEX_DIR = os.getenv("WORD_INDEX_DIR") or "word_index"
+EMBED_BATCH_SIZE = 2048
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+INDEX_TYPE = os.getenv("WORD_INDEX_TYPE") or "flat"
+# IVF lists; 0 picks about 4 * sqrt(rows)
+INDEX_NLIST = int(os.getenv("WORD_INDEX_NLIST") or 0)
+INDEX_NPROBE = int(os.getenv("WORD_INDEX_NPROBE") or 16)
+INDEX_HNSW_M = int(os.getenv("WORD_INDEX_HNSW_M") or 32)
+INDEX_EF_CONSTRUCTION = int(os.getenv("WORD_INDEX_EF_CONSTRUCTION") or 80)
+INDEX_EF_SEARCH = int(os.getenv("WORD_INDEX_EF_SEARCH") or 64)
+# PQ sub-quantizers; 0 picks about one per 8 dimensions
+INDEX_PQ_M = int(os.getenv("WORD_INDEX_PQ_M") or 0)
+STORAGE_TYPES = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+INDEX_STORAGE = os.getenv("WORD_INDEX_STORAGE") or "float32"
+# 0 keeps the embedding dimension
+INDEX_PCA_DIM = int(os.getenv("WORD_INDEX_PCA_DIM") or 0)
+# Candidates re-scored per result with lossy storage; 0 turns re-scoring off
+INDEX_RESCORE_FACTOR = int(os.getenv("WORD_INDEX_RESCORE_FACTOR") or 4)
+# k-means needs this many training points per IVF list
+IVF_TRAIN_POINTS_PER_LIST = 64
+# PCA and scalar quantizers are fitted on a sample of at least this many rows
+TRAIN_SAMPLE_ROWS = 100_000
+# Below this many rows an exact float32 scan is fast enough, and IVF/PQ can't be trained
+ANN_MIN_ROWS = 10_000
+
+_INDEX_FILE = "index.faiss"
+_TEXTS_FILE = "texts.bin"
+_OFFSETS_FILE = "offsets.npy"
+_HASHES_FILE = "hashes.npy"
+_EXACT_FILE = "vectors.faiss"
+_MANIFEST_FILE = "manifest.json"
+
+
+class RowDocstore(Docstore):
+    """
+    Read-only docstore over the memory-mapped row texts, keyed by position.
+
+    Args:
+        texts: UTF-8 row texts, concatenated.
+        offsets: Start offset of every row, plus the end of the last one.
+        source: Path of the CSV the rows came from.
+    """
+
+    def __init__(self, texts: np.ndarray, offsets: np.ndarray, source: str):
+        self.texts = texts
+        self.offsets = offsets
+        self.source = source
+
+    def search(self, search: str) -> Union[str, Document]:
+        i = int(search)
+        if not 0 <= i < len(self.offsets) - 1:
+            return f"ID {search} not found."
+        text = self.texts[self.offsets[i] : self.offsets[i + 1]].tobytes().decode("utf-8")
+        return Document(page_content=text, metadata={"source": self.source, "row": i})
+
+
+class _RowIds(Mapping):
+    """Maps FAISS positions to docstore ids without building a dict."""
+
+    def __init__(self, count: int):
+        self.count = count
+
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < self.count:
+            raise KeyError(i)
+        return str(i)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.count))
+
+
+def read_rows(csv_path: str) -> Tuple[pd.Series, np.ndarray]:
+    """
+    Reads a CSV into row texts and row hashes
+
+    Args:
+      csv_path: Path of the CSV file
+
+    Returns:
+      Tuple of (row texts formatted like CSVLoader, 64-bit row hashes)
+    """
+    df = pd.read_csv(csv_path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    texts = None
+    for column in df.columns:
+        part = f"{column.strip()}: " + df[column].str.strip()
+        texts = part if texts is None else texts + "\n" + part
+    texts = texts.reset_index(drop=True)
+    hashes = pd.util.hash_pandas_object(texts, index=False).to_numpy()
+    return texts, hashes
+
+
+def _csv_signature(csv_path: str) -> dict:
+    stat = os.stat(csv_path)
+    return {"csv_path": os.path.abspath(csv_path), "csv_size": stat.st_size, "csv_mtime_ns": stat.st_mtime_ns}
+
+
+def _model_name(embeddings: Embeddings) -> str:
+    return getattr(embeddings, "model", type(embeddings).__name__)
+
+
+def _read_manifest(index_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(index_dir, _MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def index_config(
+    index_type: Optional[str] = None,
+    nlist: Optional[int] = None,
+    hnsw_m: Optional[int] = None,
+    pq_m: Optional[int] = None,
+    storage: Optional[str] = None,
+    pca_dim: Optional[int] = None,
+) -> dict:
+    """
+    Returns the build settings of an index, defaulting to the WORD_INDEX_* settings
+
+    Args:
+      index_type: One of INDEX_TYPES
+      nlist: Number of IVF lists, 0 to size it from the row count
+      hnsw_m: Neighbors per HNSW node
+      pq_m: Number of PQ sub-quantizers, 0 to size it from the dimension
+      storage: Vector format searched by non-PQ indexes, one of STORAGE_TYPES
+      pca_dim: Dimensions kept by PCA before indexing, 0 for no PCA
+
+    Returns:
+      Dictionary of settings, stored in the manifest
+    """
+    index_type = index_type or INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    storage = storage or INDEX_STORAGE
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage {storage!r}, expected one of {tuple(STORAGE_TYPES)}")
+    return {
+        "index_type": index_type,
+        "nlist": INDEX_NLIST if nlist is None else nlist,
+        "hnsw_m": hnsw_m or INDEX_HNSW_M,
+        "pq_m": INDEX_PQ_M if pq_m is None else pq_m,
+        "storage": storage,
+        "pca_dim": INDEX_PCA_DIM if pca_dim is None else pca_dim,
+    }
+
+
+def _built_config(config: dict, count: int) -> dict:
+    """
+    Returns the settings build_index really uses for this many rows.
+    """
+    if count < ANN_MIN_ROWS:
+        return {**config, "index_type": "flat", "storage": "float32", "pca_dim": 0}
+    return config
+
+
+def build_index(vectors: np.ndarray, config: dict) -> faiss.Index:
+    """
+    Builds, trains and fills a FAISS index
+
+    Args:
+      vectors: Float32 embeddings, one row per word
+      config: Settings from index_config
+
+    Returns:
+      FAISS index holding the vectors
+    """
+    count, dim = vectors.shape
+    if count < ANN_MIN_ROWS:
+        index = faiss.IndexFlatL2(dim)
+        index.add(vectors)
+        return index
+
+    index_type = config["index_type"]
+    pca_dim = config["pca_dim"] if 0 < config["pca_dim"] < dim else 0
+    coded_dim = pca_dim or dim
+    # k-means needs enough points per list, so small vocabularies get fewer lists
+    nlist = config["nlist"] or int(4 * np.sqrt(count))
+    nlist = max(1, min(nlist, count // IVF_TRAIN_POINTS_PER_LIST))
+    pq_m = config["pq_m"] or max(
+        m for m in range(1, max(1, coded_dim // 8) + 1) if coded_dim % m == 0
+    )
+    codes = STORAGE_TYPES[config["storage"]]
+
+    spec = {
+        "flat": codes,
+        "hnsw": f"HNSW{config['hnsw_m']},{codes}",
+        "ivf_flat": f"IVF{nlist},{codes}",
+        "ivf_pq": f"IVF{nlist},PQ{pq_m}x8",
+    }[index_type]
+    if pca_dim:
+        spec = f"PCA{pca_dim},{spec}"
+    index = faiss.index_factory(dim, spec)
+    if isinstance(_unwrap(index), faiss.IndexHNSW):
+        _unwrap(index).hnsw.efConstruction = INDEX_EF_CONSTRUCTION
+    if not index.is_trained:
+        rng = np.random.default_rng(0)
+        sample_size = min(count, max(TRAIN_SAMPLE_ROWS, nlist * IVF_TRAIN_POINTS_PER_LIST * 4))
+        sample = vectors[np.sort(rng.choice(count, sample_size, replace=False))]
+        index.train(sample)
+    for start in range(0, count, 100_000):
+        index.add(vectors[start : start + 100_000])
+    return index
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    """
+    Returns the index that does the search, inside any PCA or re-scoring wrapper.
+    """
+    while isinstance(index, (faiss.IndexPreTransform, faiss.IndexRefine)):
+        inner = index.index if isinstance(index, faiss.IndexPreTransform) else index.base_index
+        index = faiss.downcast_index(inner)
+    return index
+
+
+def _is_exact(index: faiss.Index) -> bool:
+    """
+    True if the index keeps the float32 vectors it was given.
+    """
+    return isinstance(index, (faiss.IndexFlat, faiss.IndexHNSWFlat, faiss.IndexIVFFlat))
+
+
+def exact_index(vectors: np.ndarray) -> faiss.IndexFlat:
+    """
+    Returns a flat index over the float32 vectors, used to re-score candidates.
+    """
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return index
+
+
+def with_rescoring(
+    index: faiss.Index, exact: faiss.IndexFlat, factor: Optional[int] = None
+) -> faiss.Index:
+    """
+    Wraps a lossy index so its top candidates are re-ranked by exact distance
+
+    Args:
+      index: Index searched for candidates
+      exact: Flat index over the same rows, in the same order
+      factor: Candidates fetched per requested result, defaults to WORD_INDEX_RESCORE_FACTOR
+
+    Returns:
+      Index returning exact distances, or index itself if the factor is 0
+    """
+    factor = INDEX_RESCORE_FACTOR if factor is None else factor
+    if factor <= 0:
+        return index
+    refined = faiss.IndexRefine(index, exact)
+    refined.k_factor = factor
+    return refined
+
+
+def set_search_params(
+    index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None
+) -> None:
+    """
+    Sets the search-time speed/recall trade-off of an index
+
+    Args:
+      index: FAISS index
+      nprobe: IVF lists scanned per query, defaults to WORD_INDEX_NPROBE
+      ef_search: HNSW candidate list size, defaults to WORD_INDEX_EF_SEARCH
+    """
+    index = _unwrap(index)
+    params = faiss.ParameterSpace()
+    if faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe or INDEX_NPROBE)
+    if isinstance(index, faiss.IndexHNSW):
+        params.set_index_parameter(index, "efSearch", ef_search or INDEX_EF_SEARCH)
+
+
+def _stored_vectors(index: faiss.Index, exact: Optional[faiss.IndexFlat]) -> Optional[np.ndarray]:
+    """
+    Returns the float32 vectors behind an index, or None if only lossy codes were kept.
+    """
+    if exact is not None:
+        return exact.reconstruct_n(0, exact.ntotal)
+    if not _is_exact(index):
+        return None
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _load_texts(index_dir: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Memory-maps the concatenated row texts and their offsets.
+    """
+    offsets = np.load(os.path.join(index_dir, _OFFSETS_FILE), mmap_mode="r")
+    if offsets[-1] == 0:
+        return np.zeros(0, dtype=np.uint8), offsets
+    texts = np.memmap(os.path.join(index_dir, _TEXTS_FILE), dtype=np.uint8, mode="r")
+    return texts, offsets
+
+
+def _open_vector_db(index_dir: str, embeddings: Embeddings, source: str) -> FAISS:
+    """
+    Wraps the saved index and row texts as a LangChain FAISS vector store.
+    """
+    index = faiss.read_index(
+        os.path.join(index_dir, _INDEX_FILE), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+    )
+    set_search_params(index)
+    exact_path = os.path.join(index_dir, _EXACT_FILE)
+    if os.path.exists(exact_path):
+        exact = faiss.read_index(exact_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        index = with_rescoring(index, exact)
+    texts, offsets = _load_texts(index_dir)
+    return FAISS(embeddings, index, RowDocstore(texts, offsets, source), _RowIds(index.ntotal))
+
+
+def _encode(texts: pd.Series, start: int = 0) -> Tuple[bytes, np.ndarray]:
+    """
+    Concatenates row texts as UTF-8, with end offsets counted from start.
+    """
+    encoded = [text.encode("utf-8") for text in texts]
+    ends = start + np.cumsum([len(text) for text in encoded], dtype=np.int64)
+    return b"".join(encoded), ends
+
+
+def _embed(texts: pd.Series, embeddings: Embeddings) -> np.ndarray:
+    batches = [
+        embeddings.embed_documents(texts.iloc[start : start + EMBED_BATCH_SIZE].tolist())
+        for start in range(0, len(texts), EMBED_BATCH_SIZE)
+    ]
+    return np.vstack([np.asarray(batch, dtype=np.float32) for batch in batches])
+
+
+def _write_atomic(path: str, write) -> None:
+    """
+    Writes a file under a temporary name, then renames it into place.
+
+    Running apps keep their memory maps of the old file, which stays valid
+    until they reopen it.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _save(
+    index_dir: str, index: faiss.Index, exact: Optional[faiss.IndexFlat],
+    texts: bytes, offsets: np.ndarray, hashes: np.ndarray,
+) -> None:
+    os.makedirs(index_dir, exist_ok=True)
+    _write_atomic(os.path.join(index_dir, _INDEX_FILE), lambda f: f.write(faiss.serialize_index(index).tobytes()))
+    exact_path = os.path.join(index_dir, _EXACT_FILE)
+    if exact is not None:
+        _write_atomic(exact_path, lambda f: f.write(faiss.serialize_index(exact).tobytes()))
+    elif os.path.exists(exact_path):
+        os.remove(exact_path)
+    _write_atomic(os.path.join(index_dir, _TEXTS_FILE), lambda f: f.write(texts))
+    _write_atomic(os.path.join(index_dir, _OFFSETS_FILE), lambda f: np.save(f, offsets))
+    _write_atomic(os.path.join(index_dir, _HASHES_FILE), lambda f: np.save(f, hashes))
+
+
+def _update_index(
+    index_dir: str, texts: pd.Series, hashes: np.ndarray, embeddings: Embeddings,
+    config: dict, reindex: bool,
+) -> None:
+    """
+    Brings the saved index in line with the given rows.
+
+    Rows whose hash is already saved keep their vectors; saved rows that are
+    gone are removed, and only new rows are embedded and appended. Flat
+    indexes remove rows in place. IVF and HNSW indexes are refilled from the
+    kept vectors instead, keeping their trained quantizers, because row ids
+    must stay equal to row positions. With reindex, e.g. after the index type
+    changed, a new index is built from the kept vectors; an old index
+    without float32 vectors is re-embedded instead.
+    """
+    index = faiss.read_index(os.path.join(index_dir, _INDEX_FILE))
+    exact_path = os.path.join(index_dir, _EXACT_FILE)
+    exact = faiss.read_index(exact_path) if os.path.exists(exact_path) else None
+    vectors = None
+    if reindex:
+        vectors = _stored_vectors(index, exact)
+        if vectors is None:
+            _build_index(index_dir, texts, hashes, embeddings, config)
+            return
+    old_offsets = np.load(os.path.join(index_dir, _OFFSETS_FILE))
+    old_hashes = np.load(os.path.join(index_dir, _HASHES_FILE))
+    with open(os.path.join(index_dir, _TEXTS_FILE), "rb") as f:
+        old_texts = f.read()
+
+    removed = np.flatnonzero(~np.isin(old_hashes, hashes))
+    if len(removed):
+        kept = np.setdiff1d(np.arange(len(old_hashes)), removed)
+        if vectors is None and isinstance(_unwrap(index), faiss.IndexFlatCodes):
+            index.remove_ids(removed.astype(np.int64))
+            if exact is not None:
+                exact.remove_ids(removed.astype(np.int64))
+        else:
+            if vectors is None:
+                vectors = _stored_vectors(index, exact)
+            vectors = vectors[kept]
+        old_texts = b"".join(old_texts[old_offsets[i] : old_offsets[i + 1]] for i in kept)
+        old_offsets = np.concatenate([[0], np.cumsum(np.diff(old_offsets)[kept], dtype=np.int64)])
+        old_hashes = old_hashes[kept]
+
+    added = ~np.isin(hashes, old_hashes)
+    new_texts = texts[added]
+    if len(new_texts):
+        new_vectors = _embed(new_texts, embeddings)
+        if vectors is None:
+            index.add(new_vectors)
+            if exact is not None:
+                exact.add(new_vectors)
+        else:
+            vectors = np.concatenate([vectors, new_vectors])
+        new_bytes, new_ends = _encode(new_texts, int(old_offsets[-1]))
+        old_texts += new_bytes
+        old_offsets = np.concatenate([old_offsets, new_ends])
+        old_hashes = np.concatenate([old_hashes, hashes[added]])
+
+    if vectors is not None:
+        if reindex:
+            index = build_index(vectors, config)
+        else:
+            index.reset()
+            for start in range(0, len(vectors), 100_000):
+                index.add(vectors[start : start + 100_000])
+        exact = None if _is_exact(index) else exact_index(vectors)
+    _save(index_dir, index, exact, old_texts, old_offsets, old_hashes)
+    print(f"Word index: {len(removed)} rows removed, {len(new_texts)} rows embedded and added"
+          + (f", rebuilt as {config['index_type']}/{config['storage']}" if reindex else ""))
+
+
+def _build_index(
+    index_dir: str, texts: pd.Series, hashes: np.ndarray, embeddings: Embeddings, config: dict
+) -> None:
+    """
+    Embeds every row and saves a new index.
+    """
+    vectors = _embed(texts, embeddings)
+    index = build_index(vectors, config)
+    exact = None if _is_exact(index) else exact_index(vectors)
+    encoded, ends = _encode(texts)
+    _save(index_dir, index, exact, encoded, np.concatenate([[0], ends]), hashes)
+
+
+def load_vector_db(csv_path: str, embeddings: Embeddings, index_dir: str = INDEX_DIR) -> FAISS:
+    """
+    Loads the saved word index, updating it first if the CSV changed
+
+    Args:
+      csv_path: Path of the CSV file with one word per row
+      embeddings: Embeddings object used for new rows and for queries
+      index_dir: Directory holding the saved index
+
+    Returns:
+      FAISS vector store over every row of the CSV
+    """
+    signature = {
+        **_csv_signature(csv_path),
+        "model": _model_name(embeddings),
+        "index": index_config(),
+    }
+    manifest = _read_manifest(index_dir)
+    if manifest is not None and all(manifest.get(k) == v for k, v in signature.items()):
+        return _open_vector_db(index_dir, embeddings, csv_path)
+
+    texts, hashes = read_rows(csv_path)
+    if texts.empty:
+        raise ValueError(f"{csv_path} has no rows to index")
+    # Duplicate rows are indexed once
+    _, first = np.unique(hashes, return_index=True)
+    keep = np.sort(first)
+    texts, hashes = texts.iloc[keep].reset_index(drop=True), hashes[keep]
+
+    manifest_path = os.path.join(index_dir, _MANIFEST_FILE)
+    if manifest is not None:
+        os.remove(manifest_path)  # an interrupted update must not look complete
+    # Small vocabularies get a flat index whatever the setting, so the
+    # manifest records what was built and it is rebuilt once they grow
+    signature["built"] = _built_config(signature["index"], len(texts))
+    if manifest is not None and manifest.get("model") == signature["model"]:
+        built = manifest.get("built", manifest.get("index", index_config("flat")))
+        reindex = built != signature["built"]
+        _update_index(index_dir, texts, hashes, embeddings, signature["built"], reindex)
+    else:
+        _build_index(index_dir, texts, hashes, embeddings, signature["built"])
+
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(signature, f)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return _open_vector_db(index_dir, embeddings, csv_path)
+
+
+def search_batch(db: FAISS, queries: List[str], k: int) -> pd.DataFrame:
+    """
+    Finds the k nearest rows of many queries at once
+
+    The distinct queries are embedded in batches of EMBED_BATCH_SIZE and
+    searched as one matrix, instead of one embedding request and one search
+    per query.
+
+    Args:
+      db: Vector store from load_vector_db
+      queries: Query texts; repeated queries are answered once
+      k: Neighbors returned per query
+
+    Returns:
+      DataFrame with one row per query and neighbor, in first-seen query
+      order: query, rank, match, distance
+    """
+    unique = pd.Series(pd.unique(pd.Series(queries, dtype=str)))
+    if unique.empty:
+        return pd.DataFrame(columns=["query", "rank", "match", "distance"])
+    distances, ids = db.index.search(_embed(unique, db.embeddings), k)
+    rows = np.repeat(np.arange(len(unique)), k)
+    found = ids.ravel() >= 0  # fewer than k rows in the index
+    return pd.DataFrame({
+        "query": unique.to_numpy()[rows[found]],
+        "rank": np.tile(np.arange(1, k + 1), len(unique))[found],
+        "match": [db.docstore.search(db.index_to_docstore_id[i]).page_content for i in ids.ravel()[found]],
+        "distance": distances.ravel()[found],
+    })
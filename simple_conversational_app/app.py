@@ -8,7 +8,10 @@ from langchain.schema import (
     HumanMessage,
     SystemMessage
 )
-from typing import List, Union, Optional
+from typing import List, Optional
+
+from conversation_store import PAGE_SIZE, ConversationStore, StoredMessage
+from utils import HISTORY_SUMMARY, ChatHistory
 
 # Load environment variables
 load_dotenv()
@@ -28,59 +31,88 @@ def setup_llm():
         st.error(f"Error setting up LLM: {e}")
         return None
 
+# Conversations are saved to SQLite, so they survive a page refresh
+@st.cache_resource
+def setup_store() -> ConversationStore:
+    return ConversationStore()
+
 # Handle user input
 def get_user_input() -> Optional[str]:
     input_text: Optional[str] = st.chat_input("What can I help you with?", key="input")
     return input_text
 
-# Simple Stateful Message Memory
-def setup_session_state() -> None:
-    if "messages" not in st.session_state:
-        st.session_state.messages: List[Union[SystemMessage, HumanMessage, AIMessage]] = [
-            SystemMessage(content="You are a helpful assistant.")
-        ]
+# Stateful message memory; only a token-budgeted window is sent to the LLM
+# The conversation id is kept in the URL, so a refresh reopens the conversation
+def setup_session_state(llm: ChatOpenAI, store: ConversationStore) -> None:
+    if "conversation_id" not in st.session_state:
+        conversation_id = st.query_params.get("c")
+        if not conversation_id or not store.exists(conversation_id):
+            conversation_id = store.create_conversation()
+            st.query_params["c"] = conversation_id
+        st.session_state.conversation_id = conversation_id
+        st.session_state.history_from_id = None
+    if "history" not in st.session_state:
+        history = ChatHistory(
+            SystemMessage(content="You are a helpful assistant."),
+            count_tokens=llm.get_num_tokens,
+            summarizer=llm if HISTORY_SUMMARY else None,
+        )
+        for stored in store.messages(st.session_state.conversation_id):
+            history.append(stored.to_message())
+        st.session_state.history = history
 
-# Get answer from LLM
-def get_ai_response(question: str, llm: ChatOpenAI) -> Optional[str]:
+# Stream the answer from LLM into the assistant message
+def get_ai_response(question: str, llm: ChatOpenAI, store: ConversationStore) -> Optional[str]:
     try:
         # Add the user question to the conversation history
-        st.session_state.messages.append(HumanMessage(content=question))
+        history: ChatHistory = st.session_state.history
+        history.append(HumanMessage(content=question))
+        store.add_message(st.session_state.conversation_id, "user", question)
         
-        with st.spinner("Thinking..."):
-            answer: AIMessage = llm.invoke(st.session_state.messages)
+        with st.chat_message("assistant"):
+            answer: str = st.write_stream(
+                chunk.content for chunk in llm.stream(history.window())
+            )
         
-        # Add the AI response to the conversation history
-        st.session_state.messages.append(AIMessage(content=answer.content))
-        return answer.content
+        # Add the AI response to the conversation history once it is complete
+        history.append(AIMessage(content=answer))
+        store.add_message(st.session_state.conversation_id, "assistant", answer)
+        return answer
     
     except Exception:
         st.error("Sorry, I encountered an error. Please try again.")
         return None
-    
-def display_conversation_history() -> None:
-    # Skip the system message when displaying
-    display_messages = [msg for msg in st.session_state.messages 
-                       if not isinstance(msg, SystemMessage)]
-    
-    # Display the conversation history
-    for message in display_messages:
-        if isinstance(message, HumanMessage):
-            with st.chat_message("user"):
-                st.write(message.content)
-        elif isinstance(message, AIMessage):
-            with st.chat_message("assistant"):
-                st.write(message.content)
 
-# Create the Streamlit app
-def main():
-    llm = setup_llm()
-    setup_session_state()
+# Show one more page of older messages
+def load_earlier_messages(store: ConversationStore, oldest_id: int) -> None:
+    earlier = store.page(st.session_state.conversation_id, PAGE_SIZE, before_id=oldest_id)
+    if earlier:
+        st.session_state.history_from_id = earlier[0].id
 
-    st.set_page_config(page_title="Simple Question Answering App")
-    st.header("Simple Question Answering App")
+def display_conversation_history(store: ConversationStore) -> None:
+    # Only the last page is read and drawn, plus any pages the user loaded
+    conversation_id = st.session_state.conversation_id
+    from_id = st.session_state.history_from_id
+    messages: List[StoredMessage] = (
+        store.messages(conversation_id, from_id) if from_id else store.page(conversation_id)
+    )
+    if messages and store.page(conversation_id, 1, before_id=messages[0].id):
+        st.button(
+            "Load earlier messages",
+            on_click=load_earlier_messages,
+            args=(store, messages[0].id),
+        )
+    
+    # Display the conversation history
+    for message in messages:
+        with st.chat_message(message.role):
+            st.write(message.content)
 
+# The chat reruns on its own when a message is sent, not the whole script
+@st.fragment
+def chat(llm: ChatOpenAI, store: ConversationStore) -> None:
     # Display the conversation history
-    display_conversation_history()
+    display_conversation_history(store)
 
     # Get user input
     user_input: Optional[str] = get_user_input()
@@ -90,14 +122,19 @@ def main():
         with st.chat_message("user"):
             st.write(user_input)
         
-        # Get and display the AI response
-        ai_response: Optional[str] = get_ai_response(user_input, llm)
-        
-        # Add the AI response to the conversation history
-        if ai_response:
-            with st.chat_message("assistant"):
-                st.write(ai_response)
-        
+        # Get the AI response, streamed into the page as it is generated
+        get_ai_response(user_input, llm, store)
+
+# Create the Streamlit app
+def main():
+    llm = setup_llm()
+    store = setup_store()
+    setup_session_state(llm, store)
+
+    st.set_page_config(page_title="Simple Question Answering App")
+    st.header("Simple Question Answering App")
+
+    chat(llm, store)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmarks for the chat history in utils.py and the paged history in app.py.
+
+Run with `python benchmark.py`, or `python benchmark.py tokens|rerun` for
+one of them. The conversation is scripted, tokens are estimated at four
+characters each, and the summarizer is a fake model, so no API key is needed.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from streamlit.testing.v1 import AppTest
+
+from conversation_store import ConversationStore, StoredMessage
+from utils import MESSAGE_OVERHEAD_TOKENS, ChatHistory
+
+SUMMARY = " ".join(["The user asked about several topics and got detailed answers."] * 6)
+
+
+def _count_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class _CallCounter:
+    """Token counter that records how often it is called."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text: str) -> int:
+        self.calls += 1
+        return _count_tokens(text)
+
+
+class _FakeSummarizer(BaseChatModel):
+    calls: int = 0
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-summarizer"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.calls += 1
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=SUMMARY))])
+
+
+def _scripted_turn(turn: int):
+    question = f"Question {turn}: " + "could you explain this topic in a bit more depth? " * (1 + turn % 3)
+    answer = f"Answer {turn}: " + "Here is a detailed explanation with an example. " * (6 + turn % 5)
+    return question, answer
+
+
+def benchmark_prompt_tokens(turns=200, max_tokens=3000, report_every=25, summary_latency=0.2):
+    """Prompt tokens per turn: whole history against the budgeted window."""
+    system = SystemMessage(content="You are a helpful assistant.")
+    summarizer = _FakeSummarizer(latency=summary_latency)
+    counter = _CallCounter()
+    histories = {
+        "window": ChatHistory(system, counter, max_tokens),
+        "window+summary": ChatHistory(system, _count_tokens, max_tokens, summarizer),
+    }
+    full: List[BaseMessage] = [system]
+    rows = []
+    recounts = 0
+    slowest_window = 0.0
+    for turn in range(1, turns + 1):
+        question, answer = _scripted_turn(turn)
+        full.append(HumanMessage(content=question))
+        # What get_ai_response used to do: send, and so count, everything
+        full_tokens = sum(_count_tokens(m.content) + MESSAGE_OVERHEAD_TOKENS for m in full)
+        recounts += len(full)
+
+        row = [turn, full_tokens]
+        for history in histories.values():
+            history.append(HumanMessage(content=question))
+            start = time.perf_counter()
+            window = history.window()
+            slowest_window = max(slowest_window, time.perf_counter() - start)
+            row.append(sum(_count_tokens(m.content) + MESSAGE_OVERHEAD_TOKENS for m in window))
+            history.append(AIMessage(content=answer))
+            # Stands in for the user reading the reply, so the summary is ready by the next turn
+            history.wait()
+        full.append(AIMessage(content=answer))
+        rows.append(row)
+
+    print(f"Prompt tokens per turn over a {turns}-turn scripted conversation (budget {max_tokens}):")
+    print(f"  {'turn':>5} {'full history':>13} {'window':>8} {'window+summary':>15}")
+    for row in rows:
+        if row[0] == 1 or row[0] % report_every == 0:
+            print(f"  {row[0]:>5} {row[1]:>13,} {row[2]:>8,} {row[3]:>15,}")
+    totals = [sum(row[i] for row in rows) for i in (1, 2, 3)]
+    print(f"  {'total':>5} {totals[0]:>13,} {totals[1]:>8,} {totals[2]:>15,}")
+    print(f"  max window prompt {max(row[2] for row in rows):,} tokens; "
+          f"{summarizer.calls} summary calls; tokenizer calls: {recounts:,} if recounted every turn "
+          f"vs {counter.calls:,} counting each message once")
+    print(f"  slowest window() {slowest_window * 1000:.1f} ms with a {summary_latency * 1000:.0f} ms "
+          f"summarizer, which runs in the background after the reply")
+
+
+def _full_history_app():
+    """The script before conversations were stored: every message drawn on every run."""
+    import streamlit as st
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+    st.header("Simple Question Answering App")
+    for message in st.session_state.messages:
+        if isinstance(message, HumanMessage):
+            with st.chat_message("user"):
+                st.write(message.content)
+        elif isinstance(message, AIMessage):
+            with st.chat_message("assistant"):
+                st.write(message.content)
+    st.chat_input("What can I help you with?", key="input")
+
+
+def _seconds_per_run(app: AppTest, runs: int) -> float:
+    app.run()
+    start = time.perf_counter()
+    for _ in range(runs):
+        app.run()
+    return (time.perf_counter() - start) / runs
+
+
+def benchmark_rerun(messages=1000, runs=5):
+    """Script run time with a long conversation: full history against the last page."""
+    system = SystemMessage(content="You are a helpful assistant.")
+    scripted = [
+        message
+        for turn in range(1, messages // 2 + 1)
+        for message in zip(("user", "assistant"), _scripted_turn(turn))
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["CONVERSATION_DB_PATH"] = os.path.join(tmp, "conversations.sqlite")
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        store = ConversationStore()
+        conversation_id = store.create_conversation()
+        history = ChatHistory(system, _count_tokens)
+        for role, content in scripted:
+            store.add_message(conversation_id, role, content)
+            history.append(StoredMessage(0, role, content, 0).to_message())
+
+        full = AppTest.from_function(_full_history_app, default_timeout=60)
+        full.session_state["messages"] = history.messages
+        full_seconds = _seconds_per_run(full, runs)
+        full_drawn = len(full.chat_message)
+
+        paged = AppTest.from_file("app.py", default_timeout=60)
+        paged.query_params["c"] = conversation_id
+        paged.session_state["conversation_id"] = conversation_id
+        paged.session_state["history_from_id"] = None
+        # Restoring the history counts tokens with tiktoken, which needs a download
+        paged.session_state["history"] = history
+        paged_seconds = _seconds_per_run(paged, runs)
+        paged_drawn = len(paged.chat_message)
+        paged.button[0].click().run()
+        loaded_drawn = len(paged.chat_message)
+
+    print(f"Script run with {len(scripted):,} stored messages ({runs} runs each):")
+    print(f"  full history  {full_seconds * 1000:7.0f} ms/run, {full_drawn:,} messages drawn")
+    print(f"  last page     {paged_seconds * 1000:7.0f} ms/run, {paged_drawn:,} messages drawn "
+          f"({loaded_drawn:,} after one 'Load earlier messages')")
+    print("  In a running app, sending a message reruns only the chat fragment; "
+          "AppTest always runs the whole script, so that saving is not shown here.")
+
+
+if __name__ == "__main__":
+    which = sys.argv[1] if len(sys.argv) > 1 else "all"
+    if which in ("all", "tokens"):
+        benchmark_prompt_tokens()
+    if which in ("all", "rerun"):
+        benchmark_rerun()
@@ -0,0 +1,141 @@
+"""
+SQLite store for chat conversations.
+
+Every message gets an autoincrementing id and a timestamp. Pages are read
+newest first by id (keyset pagination), so showing the last page costs the
+same for a 10-message conversation as for a 100,000-message one. The
+database runs in WAL mode so several Streamlit sessions and processes can
+share one file. Conversations are addressed by a random id that the apps
+keep in the page URL, so a refresh reopens the same conversation.
+"""
+
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from typing import List, NamedTuple, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+DEFAULT_DB_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "langchain-masterclass", "conversations.sqlite"
+)
+PAGE_SIZE = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL REFERENCES conversations (id),
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_conversation ON messages (conversation_id, id);
+"""
+
+
+class StoredMessage(NamedTuple):
+    id: int
+    role: str  # "user" or "assistant"
+    content: str
+    created: float
+
+    def to_message(self) -> BaseMessage:
+        """Return the message as a LangChain message."""
+        message_cls = HumanMessage if self.role == "user" else AIMessage
+        return message_cls(content=self.content)
+
+
+class ConversationStore:
+    """
+    Persistent, process-safe store of conversations and their messages.
+
+    Args:
+      path: SQLite file, defaults to CONVERSATION_DB_PATH or DEFAULT_DB_PATH
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("CONVERSATION_DB_PATH") or DEFAULT_DB_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call keeps this safe across
+        # Streamlit's script threads as well as across processes.
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def create_conversation(self) -> str:
+        """Start a conversation and return its id."""
+        conversation_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO conversations (id, created) VALUES (?, ?)",
+                (conversation_id, time.time()),
+            )
+        return conversation_id
+
+    def exists(self, conversation_id: str) -> bool:
+        """Return whether a conversation with this id was created."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+        return row is not None
+
+    def add_message(self, conversation_id: str, role: str, content: str) -> StoredMessage:
+        """Append a message to a conversation and return it with its id."""
+        created = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO messages (conversation_id, role, content, created) VALUES (?, ?, ?, ?)",
+                (conversation_id, role, content, created),
+            )
+        return StoredMessage(cursor.lastrowid, role, content, created)
+
+    def page(
+        self, conversation_id: str, limit: int = PAGE_SIZE, before_id: Optional[int] = None
+    ) -> List[StoredMessage]:
+        """
+        Return up to `limit` messages of a conversation, oldest first
+
+        Args:
+          conversation_id: Conversation to read
+          limit: Number of messages, counted back from the newest
+          before_id: Only return messages older than this message id
+
+        Returns:
+          List of StoredMessage objects
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, role, content, created FROM messages "
+                "WHERE conversation_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (conversation_id, before_id if before_id is not None else 2**63 - 1, limit),
+            ).fetchall()
+        return [StoredMessage(*row) for row in reversed(rows)]
+
+    def messages(self, conversation_id: str, from_id: Optional[int] = None) -> List[StoredMessage]:
+        """
+        Return the messages of a conversation, oldest first
+
+        Args:
+          conversation_id: Conversation to read
+          from_id: Only return this message and newer ones; None returns all
+
+        Returns:
+          List of StoredMessage objects
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, role, content, created FROM messages "
+                "WHERE conversation_id = ? AND id >= ? ORDER BY id",
+                (conversation_id, from_id or 0),
+            ).fetchall()
+        return [StoredMessage(*row) for row in rows]
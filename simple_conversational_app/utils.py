@@ -0,0 +1,149 @@
+"""
+Token-budgeted conversation history for the chat app.
+
+Sending every message to the model makes each turn slower and dearer than
+the last, until the request no longer fits the context window. ChatHistory
+keeps the full conversation for display but sends only the system message
+plus the most recent messages that fit in a token budget. Each message is
+counted once when it is added. When the window overflows, its start jumps
+forward to leave room for several turns, so the prompt prefix stays stable.
+Optionally, messages that leave the window are folded into a rolling
+summary that is sent after the system message. The fold runs on a
+background thread once the reply is added, so window() never waits for the
+summarizer; the previous summary is sent until the new one is ready.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS") or 3000)
+HISTORY_SUMMARY = (os.getenv("HISTORY_SUMMARY") or "false").lower() in ("1", "true", "yes")
+# When the window overflows it is cut down to this share of the budget
+KEEP_RATIO = 0.6
+# Tokens OpenAI adds around every message in a chat request
+MESSAGE_OVERHEAD_TOKENS = 4
+
+logger = logging.getLogger(__name__)
+
+_summary_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_summary_executor() -> ThreadPoolExecutor:
+    """Return the thread pool shared by every conversation's summaries."""
+    global _summary_executor
+    if _summary_executor is None:
+        _summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+    return _summary_executor
+
+
+class ChatHistory:
+    """
+    Full conversation log with a token-budgeted window for the model.
+
+    Args:
+        system_message: Always sent first.
+        count_tokens: Returns the token count of a text, e.g. llm.get_num_tokens.
+        max_tokens: Token budget of the messages sent to the model.
+        summarizer: Model that folds messages leaving the window into a
+            rolling summary; None drops them.
+    """
+
+    def __init__(
+        self,
+        system_message: SystemMessage,
+        count_tokens: Callable[[str], int],
+        max_tokens: int = HISTORY_MAX_TOKENS,
+        summarizer: Optional[BaseChatModel] = None,
+    ):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.messages: List[BaseMessage] = []
+        self.summary = ""
+        self._counts: List[int] = []
+        self._summary_tokens = 0
+        self._start = 1  # first message in the window, after the system message
+        self._window_tokens = 0
+        # Messages that left the window but are not in the summary yet
+        self._dropped: List[BaseMessage] = []
+        self._lock = threading.Lock()
+        self._pending: Optional[Future] = None
+        self.append(system_message)
+
+    def _count(self, message: BaseMessage) -> int:
+        return self.count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+
+    def append(self, message: BaseMessage) -> None:
+        """
+        Add a message, counting its tokens once. Messages that left the
+        window are then folded into the summary in the background.
+        """
+        self.messages.append(message)
+        self._counts.append(self._count(message))
+        if len(self.messages) > 1:
+            self._window_tokens += self._counts[-1]
+        with self._lock:
+            if self._dropped and self._pending is None:
+                self._pending = _get_summary_executor().submit(self._fold_dropped)
+
+    def wait(self) -> None:
+        """Block until a background summary in progress has finished."""
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def prompt_tokens(self) -> int:
+        """Tokens of the messages window() returns."""
+        return self._counts[0] + self._summary_tokens + self._window_tokens
+
+    def window(self) -> List[BaseMessage]:
+        """
+        Returns the messages to send: the system message, the rolling summary
+        if there is one, and the most recent messages within the budget. The
+        latest message is always included.
+        """
+        with self._lock:
+            if self.prompt_tokens() > self.max_tokens:
+                self._slide()
+            summary = [self._summary_message(self.summary)] if self.summary else []
+        return self.messages[:1] + summary + self.messages[self._start :]
+
+    @staticmethod
+    def _summary_message(summary: str) -> SystemMessage:
+        return SystemMessage(content=f"Summary of the earlier conversation: {summary}")
+
+    def _slide(self) -> None:
+        target = int(self.max_tokens * KEEP_RATIO) - self._counts[0] - self._summary_tokens
+        start = self._start
+        while start < len(self.messages) - 1 and self._window_tokens > target:
+            self._window_tokens -= self._counts[start]
+            start += 1
+        if self.summarizer is not None:
+            self._dropped.extend(self.messages[self._start : start])
+        self._start = start
+
+    def _fold_dropped(self) -> None:
+        with self._lock:
+            dropped = list(self._dropped)
+            summary = self.summary
+        try:
+            # The summarizer runs without the lock; window() keeps the old summary meanwhile
+            prompt = SUMMARY_PROMPT.format(summary=summary, new_lines=get_buffer_string(dropped))
+            new_summary = self.summarizer.invoke(prompt).content
+        except Exception:
+            logger.exception("Background summary failed; the dropped messages are retried")
+            with self._lock:
+                self._pending = None
+            return
+        with self._lock:
+            del self._dropped[: len(dropped)]
+            self.summary = new_summary
+            self._summary_tokens = self._count(self._summary_message(new_summary))
+            self._pending = None
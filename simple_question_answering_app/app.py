@@ -5,23 +5,47 @@ import streamlit as st
 
 from langchain_openai import OpenAI 
 
+from response_cache import ResponseCache
+
+MODEL_NAME = "gpt-3.5-turbo-instruct"
+TEMPERATURE = 0
+
+# One client and one cache for every session and rerun
+@st.cache_resource
+def get_llm():
+    return OpenAI(model_name=MODEL_NAME, temperature=TEMPERATURE)
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache()
+
 def load_answer(question):
-    llm = OpenAI(model_name="gpt-3.5-turbo-instruct", temperature=0)
-    answer = llm(question)
+    cache = get_response_cache()
+    answer = cache.get(MODEL_NAME, TEMPERATURE, question)
+    if answer is None:
+        answer = get_llm().invoke(question)
+        st.session_state.llm_calls += 1
+        cache.set(MODEL_NAME, TEMPERATURE, question, answer)
     return answer
   
 st.set_page_config(page_title="Simple Question Answering App")
 st.header("Simple Question Answering App")
 
+if "llm_calls" not in st.session_state:
+    st.session_state.llm_calls = 0
+
 def get_text():
     input_text = st.text_input("You: ", key="input")
     return input_text
 
-user_input = get_text()
-response = load_answer(user_input)
-
-submit = st.button("Generate")
+# The form only reruns the script when "Generate" is pressed
+with st.form("question"):
+    user_input = get_text()
+    submit = st.form_submit_button("Generate")
 
-if submit:
+if submit and user_input.strip():
+    response = load_answer(user_input)
     st.subheader("Answer:")
-    st.write(response)
\ No newline at end of file
+    st.write(response)
+
+st.caption(f"LLM calls this session: {st.session_state.llm_calls}")
@@ -0,0 +1,110 @@
+"""
+LLM calls per user session of app.py, before and after the response cache.
+
+Run with `python benchmark.py`. OpenAI is replaced by a fake model that
+counts its calls, so no API key is needed.
+"""
+
+import os
+import tempfile
+from typing import Any, List, Optional
+
+import langchain_openai
+from langchain_core.language_models.llms import LLM
+from streamlit.testing.v1 import AppTest
+
+# A user loads the page, asks a question, presses Generate twice, asks it
+# again with other spacing and case, then asks something new
+SESSION = [
+    None,
+    "What is LangChain?",
+    "generate",
+    "generate",
+    "  what is   langchain? ",
+    "generate",
+    "How do I install it?",
+    "generate",
+]
+
+
+class _CountingLLM(LLM):
+    model_name: str = ""
+    temperature: float = 0
+    calls: int = 0
+    clients: int = 0
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        _CountingLLM.clients += 1
+
+    @property
+    def _llm_type(self) -> str:
+        return "counting-fake"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> str:
+        _CountingLLM.calls += 1
+        return f"An answer to: {prompt}"
+
+
+def _before_app():
+    """app.py before this change: load_answer ran on every rerun."""
+    import streamlit as st
+    from langchain_openai import OpenAI
+
+    def load_answer(question):
+        llm = OpenAI(model_name="gpt-3.5-turbo-instruct", temperature=0)
+        answer = llm.invoke(question)
+        return answer
+
+    st.header("Simple Question Answering App")
+    user_input = st.text_input("You: ", key="input")
+    response = load_answer(user_input)
+    submit = st.button("Generate")
+    if submit:
+        st.subheader("Answer:")
+        st.write(response)
+
+
+def _run_session(app: AppTest) -> None:
+    for step in SESSION:
+        if step is None:
+            app.run()
+        elif step == "generate":
+            app.button[0].click().run()
+        else:
+            app.text_input[0].input(step)
+            if not app.get("form"):
+                # Outside a form, typing reruns the script
+                app.run()
+
+
+def _count(app_factory) -> List[int]:
+    _CountingLLM.calls = _CountingLLM.clients = 0
+    _run_session(app_factory())
+    return [_CountingLLM.calls, _CountingLLM.clients]
+
+
+def benchmark_llm_calls():
+    """LLM calls and clients for one scripted session, and for a second session."""
+    langchain_openai.OpenAI = _CountingLLM
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["RESPONSE_CACHE_PATH"] = os.path.join(tmp, "responses.sqlite")
+        before = _count(lambda: AppTest.from_function(_before_app, default_timeout=30))
+        after = _count(lambda: AppTest.from_file("app.py", default_timeout=30))
+        second = _count(lambda: AppTest.from_file("app.py", default_timeout=30))
+
+    presses = SESSION.count("generate")
+    print(f"One session: page load, 3 questions typed, Generate pressed {presses} times:")
+    print(f"  before: {before[0]} LLM calls, {before[1]} clients built")
+    print(f"  after:  {after[0]} LLM calls, {after[1]} client(s) built; a second session "
+          f"makes {second[0]} LLM calls, served from the cache")
+
+
+if __name__ == "__main__":
+    benchmark_llm_calls()
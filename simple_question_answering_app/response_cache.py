@@ -0,0 +1,87 @@
+"""
+On-disk cache for LLM responses.
+
+Responses are stored in a SQLite database keyed by a SHA-256 of the model
+name, the temperature and the normalized prompt. Prompts are normalized by
+trimming, collapsing whitespace and ignoring case, so "What is AI?" and
+"what is  AI? " share an entry. Entries expire after `ttl_seconds`. The
+database runs in WAL mode so several Streamlit processes can share one
+cache file.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Optional
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "langchain-masterclass", "responses.sqlite"
+)
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Return the prompt trimmed, with single spaces and in lower case."""
+    return " ".join(prompt.split()).casefold()
+
+
+class ResponseCache:
+    """
+    Persistent, process-safe cache of LLM responses with a time to live.
+
+    Args:
+      path: SQLite file, defaults to RESPONSE_CACHE_PATH or DEFAULT_CACHE_PATH
+      ttl_seconds: Age at which entries expire, defaults to RESPONSE_CACHE_TTL
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[float] = None):
+        self.path = path or os.getenv("RESPONSE_CACHE_PATH") or DEFAULT_CACHE_PATH
+        self.ttl_seconds = ttl_seconds or float(
+            os.getenv("RESPONSE_CACHE_TTL") or DEFAULT_TTL_SECONDS
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call keeps this safe across
+        # Streamlit's script threads as well as across processes.
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _key(self, model: str, temperature: float, prompt: str) -> str:
+        payload = json.dumps([model, float(temperature), normalize_prompt(prompt)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, temperature: float, prompt: str) -> Optional[str]:
+        """Return the cached response, or None if there is none or it expired."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND created > ?",
+                (self._key(model, temperature, prompt), time.time() - self.ttl_seconds),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, model: str, temperature: float, prompt: str, response: str) -> None:
+        """Store a response, and drop the entries that have expired."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                (self._key(model, temperature, prompt), response, now),
+            )
+            conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl_seconds,))
+            conn.execute("COMMIT")
@@ -2,6 +2,7 @@ import streamlit as st
 import os
 from dotenv import load_dotenv
 from utils import create_embeddings, pull_index_data, fetch_relevant_documents, load_data_to_pinecone
+from embedding_cache import CachedEmbeddings
 
 load_dotenv()
 
@@ -79,6 +80,9 @@ def main():
                                   value=3, 
                                   step=1,
                                   help="More documents = more context but slower response")
+        diversify = st.checkbox("Diversify results", 
+                                value=True,
+                                help="Skip near-duplicate chunks and return at most one chunk per post")
         submit_button = st.form_submit_button(label="🔍 Search", type="primary")
         
     if submit_button:
@@ -103,7 +107,13 @@ def main():
                             embeddings
                         )
                         # Fetch relevant documents from index
-                        results = fetch_relevant_documents(vector_store, prompt, document_count)
+                        results = fetch_relevant_documents(vector_store, prompt, document_count, diversify=diversify)
+                    
+                    # The local hashing backend has no cache, so no stats
+                    if isinstance(embeddings, CachedEmbeddings):
+                        cache_stats = embeddings.stats()
+                        st.caption(f"Embedding cache hit rate: {cache_stats['hit_rate']:.0%} "
+                                   f"(~{cache_stats['saved_seconds']:.1f}s of embedding calls saved)")
                     
                     # Display search results
                     if results:
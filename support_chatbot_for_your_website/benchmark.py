@@ -0,0 +1,140 @@
+"""
+Microbenchmarks for the retrieval helpers in utils.py.
+
+Run with `python benchmark.py`. Everything runs on synthetic data, so no
+API keys or network access are needed.
+"""
+
+import os
+import random
+import tempfile
+import time
+import timeit
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CachedEmbeddings
+from utils import mmr_select
+
+EMBEDDING_DIM = 1536  # OpenAI embeddings dimension
+
+
+def _time_per_call(fn, number, rounds=5):
+    """Best-of-`rounds` mean time per call, in the style of `timeit`."""
+    return min(timeit.repeat(fn, number=number, repeat=rounds)) / number
+
+
+def benchmark_mmr(candidate_count=1000, k=10, number=200, budget_ms=1.0):
+    """Time MMR selection over `candidate_count` synthetic chunk vectors."""
+    rng = np.random.default_rng(0)
+    candidates = rng.standard_normal((candidate_count, EMBEDDING_DIM)).astype(np.float32)
+    candidates /= np.linalg.norm(candidates, axis=1, keepdims=True)
+    query = candidates[:10].mean(axis=0)
+    query /= np.linalg.norm(query)
+    # ~5 chunks per post, like a 1000-char splitter over blog posts
+    sources = [f"https://example.com/post-{i // 5}" for i in range(candidate_count)]
+
+    # Pinecone returns these cosine scores with the matches
+    scores = candidates @ query
+    elapsed = _time_per_call(
+        lambda: mmr_select(query, candidates, k, sources=sources, normalized=True, relevance=scores), number
+    )
+    elapsed_ms = elapsed * 1000
+    status = "OK" if elapsed_ms <= budget_ms else "OVER BUDGET"
+    print(f"MMR over {candidate_count} candidates (k={k}, dim={EMBEDDING_DIM}): "
+          f"{elapsed_ms:.3f} ms/query [{status}, budget {budget_ms} ms]")
+    return elapsed_ms
+
+
+def _reference_mmr(query, candidates, k, lambda_mult=0.5, sources=None, max_per_source=1):
+    """Plain MMR, scoring every candidate against every pick."""
+    candidates = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    relevance = candidates @ (query / np.linalg.norm(query))
+    selected, counts, dedup = [], {}, sources is not None
+    while len(selected) < min(k, len(candidates)):
+        allowed = [i for i in range(len(candidates)) if i not in selected
+                   and (not dedup or counts.get(sources[i], 0) < max_per_source)]
+        if not allowed:
+            dedup = False
+            continue
+        def score(i):
+            if not selected:
+                return relevance[i]
+            return lambda_mult * relevance[i] - (1 - lambda_mult) * max(candidates[i] @ candidates[j] for j in selected)
+        best = max(allowed, key=score)
+        selected.append(best)
+        if sources is not None:
+            counts[sources[best]] = counts.get(sources[best], 0) + 1
+    return selected
+
+
+def check_mmr(cases=200):
+    """mmr_select matches plain MMR on random cases, and handles tied scores."""
+    rng = np.random.default_rng(1)
+    mismatches = 0
+    for case in range(cases):
+        n, k = int(rng.integers(1, 120)), int(rng.integers(1, 15))
+        candidates = rng.standard_normal((n, 16))
+        query = rng.standard_normal(16)
+        sources = [f"post-{i}" for i in rng.integers(0, max(1, n // 4), n)] if case % 2 else None
+        max_per_source = int(rng.integers(1, 3))
+        got = mmr_select(query, candidates, k, sources=sources, max_per_source=max_per_source, refresh_block=8)
+        mismatches += got != _reference_mmr(query, candidates, k, sources=sources, max_per_source=max_per_source)
+    # Many equal scores used to leave the refresh block empty and raise
+    tied = np.ones((200, 8), dtype=np.float32)
+    tied[100:, 0] += 1
+    tie_ok = len(mmr_select(np.ones(8), tied, 5, refresh_block=4)) == 5
+    print(f"MMR vs plain MMR on {cases} random cases: {mismatches} mismatches; "
+          f"tied scores {'OK' if tie_ok else 'FAILED'}")
+    return mismatches == 0 and tie_ok
+
+
+class _SlowFakeEmbeddings(Embeddings):
+    """Stand-in for OpenAIEmbeddings that sleeps like a network round-trip."""
+
+    model = "fake-embedding"
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+
+    def _vector(self, text):
+        rng = np.random.default_rng(abs(hash(text)) % (2**32))
+        return rng.standard_normal(EMBEDDING_DIM).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+def benchmark_embedding_cache(query_count=300, distinct_queries=60, latency=0.2):
+    """Replay a skewed query log through the on-disk embedding cache."""
+    rng = random.Random(0)
+    # Popular questions repeat, as they do in a support chatbot
+    queries = [f"question {int(rng.paretovariate(1.2)) % distinct_queries}" for _ in range(query_count)]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        embeddings = CachedEmbeddings(
+            _SlowFakeEmbeddings(latency), path=os.path.join(cache_dir, "embeddings.sqlite")
+        )
+        start = time.perf_counter()
+        for query in queries:
+            embeddings.embed_query(query)
+        elapsed = time.perf_counter() - start
+        stats = embeddings.stats()
+
+    uncached = query_count * latency
+    print(f"Embedding cache over {query_count} queries ({latency * 1000:.0f} ms per model call): "
+          f"hit rate {stats['hit_rate']:.0%}, {elapsed:.1f}s vs {uncached:.1f}s uncached, "
+          f"~{stats['saved_seconds']:.1f}s saved")
+    return stats
+
+
+if __name__ == "__main__":
+    check_mmr()
+    benchmark_mmr()
+    benchmark_embedding_cache()
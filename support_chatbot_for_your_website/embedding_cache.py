@@ -0,0 +1,165 @@
+"""
+On-disk cache for OpenAI embeddings.
+
+Vectors are stored as float32 blobs in a SQLite database keyed by model name
+and a SHA-256 of the text. The database runs in WAL mode so several
+Streamlit processes (and several apps) can share one cache file, and the
+least recently used entries are evicted once `max_entries` is exceeded.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "langchain-masterclass", "embeddings.sqlite"
+)
+DEFAULT_MAX_ENTRIES = 100_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    vector BLOB NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access);
+CREATE TABLE IF NOT EXISTS stats (
+    model TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    miss_seconds REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings object with a persistent, process-safe cache.
+
+    Args:
+      embeddings: Embeddings object to call on cache misses
+      path: SQLite file, defaults to EMBEDDING_CACHE_PATH or DEFAULT_CACHE_PATH
+      max_entries: LRU size limit, defaults to EMBEDDING_CACHE_MAX_ENTRIES
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH") or DEFAULT_CACHE_PATH
+        self.max_entries = max_entries or int(
+            os.getenv("EMBEDDING_CACHE_MAX_ENTRIES") or DEFAULT_MAX_ENTRIES
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call keeps this safe across
+        # Streamlit's script threads as well as across processes.
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model}:{digest}"
+
+    def _embed(self, texts: List[str], embed_missing) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+
+        with closing(self._connect()) as conn:
+            found: Dict[str, List[float]] = {}
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i : i + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            missing = [key for key in unique_keys if key not in found]
+            miss_seconds = 0.0
+            if missing:
+                text_by_key = dict(zip(keys, texts))
+                start = time.perf_counter()
+                vectors = embed_missing([text_by_key[key] for key in missing])
+                miss_seconds = time.perf_counter() - start
+                for key, vector in zip(missing, vectors):
+                    found[key] = vector
+
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(now, key) for key in unique_keys if key not in missing],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [
+                    (key, np.asarray(found[key], dtype=np.float32).tobytes(), now)
+                    for key in missing
+                ],
+            )
+            conn.execute(
+                "INSERT INTO stats (model, hits, misses, miss_seconds) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(model) DO UPDATE SET hits = hits + excluded.hits, "
+                "misses = misses + excluded.misses, "
+                "miss_seconds = miss_seconds + excluded.miss_seconds",
+                (self.model, len(keys) - len(missing), len(missing), miss_seconds),
+            )
+            if missing:
+                self._evict(conn)
+            conn.execute("COMMIT")
+
+        return [found[key] for key in keys]
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, calling the wrapped model only for uncached texts."""
+        return self._embed(texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, calling the wrapped model only if it is uncached."""
+        return self._embed([text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return the cache hit rate and the model latency saved so far
+
+        Saved latency is estimated as the hit count times the average time a
+        miss spent in the wrapped model. Counters are shared by every process
+        using the same cache file.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT hits, misses, miss_seconds FROM stats WHERE model = ?",
+                (self.model,),
+            ).fetchone()
+        hits, misses, miss_seconds = row or (0, 0, 0.0)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "saved_seconds": hits * (miss_seconds / misses) if misses else 0.0,
+        }
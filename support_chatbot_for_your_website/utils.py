@@ -1,10 +1,14 @@
 import time
 import os
+import numpy as np
+from langchain_core.documents import Document
 from langchain_community.document_loaders.sitemap import SitemapLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from pinecone import Pinecone, ServerlessSpec
 from langchain_pinecone import PineconeVectorStore
+from embedding_cache import CachedEmbeddings
+from local_embeddings import local_embeddings_from_env
 
 def _load_sitemap_data(url):
     """Load data from a sitemap URL."""
@@ -57,7 +61,11 @@ def _create_or_get_pinecone_index(pinecone_api_key, index_name):
     return index_name
 
 def create_embeddings():
-    """Create OpenAI embeddings instance."""
+    """Create OpenAI embeddings instance backed by the on-disk embedding cache."""
+    # EMBEDDING_BACKEND=hashing embeds locally, with no API key or cache needed
+    local = local_embeddings_from_env()
+    if local is not None:
+        return local
     # Make sure API key is set
     if not os.environ.get("OPENAI_API_KEY"):
         raise ValueError("OpenAI API key not found in environment variables")
@@ -66,7 +74,7 @@ def create_embeddings():
         model="text-embedding-ada-002",
         openai_api_key=os.environ.get("OPENAI_API_KEY")
     )
-    return embeddings
+    return CachedEmbeddings(embeddings)
 
 def load_data_to_pinecone(pinecone_api_key: str, pinecone_index: str):
     """Load data from sitemap to Pinecone index."""
@@ -154,16 +162,155 @@ def pull_index_data(pinecone_api_key: str, pinecone_index_name: str, embeddings)
         print(f"Error in pull_index_data: {str(e)}")
         raise e
   
-def fetch_relevant_documents(vector_store, prompt, document_count):
-    """Search for relevant documents in the vector store."""
+def _fetch_candidates(vector_store, query_embedding, fetch_k):
+    """Over-fetch candidate chunks from Pinecone together with their vectors and scores."""
+    results = vector_store.index.query(
+        vector=query_embedding,
+        top_k=fetch_k,
+        include_values=True,
+        include_metadata=True,
+        namespace=""  # Should match the namespace used when storing
+    )
+    documents = []
+    vectors = []
+    scores = []
+    for match in results["matches"]:
+        metadata = dict(match["metadata"])
+        text = metadata.pop("text", None)
+        if text is None:
+            continue
+        documents.append(Document(id=match.get("id"), page_content=text, metadata=metadata))
+        vectors.append(match["values"])
+        scores.append(match["score"])
+    return documents, np.asarray(vectors, dtype=np.float32), np.asarray(scores, dtype=np.float32)
+
+def mmr_select(query_embedding, candidate_embeddings, k, lambda_mult=0.5, sources=None, max_per_source=1, refresh_block=32, normalized=False, relevance=None):
+    """Pick k candidate indices by maximal marginal relevance with per-source dedup.
+
+    Relevance and redundancy against the first pick are scored for all
+    candidates with one matrix-vector product each. After that a
+    candidate's MMR score can only drop, so stale scores are upper bounds and
+    only the `refresh_block` best stale candidates are re-scored whenever
+    the top of the queue is out of date. With `sources`, at most
+    `max_per_source` chunks per source are picked until no other source is
+    left. `normalized=True` skips the norm pass for unit-length vectors, and
+    `relevance` takes the query similarities the index already returned,
+    which skips the relevance pass.
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    n = candidates.shape[0]
+    if n == 0 or k <= 0:
+        return []
+    k = min(k, n)
+
+    if normalized:
+        norms = None
+    else:
+        norms = np.sqrt(np.einsum("ij,ij->i", candidates, candidates))
+        norms[norms == 0] = 1.0
+    if relevance is not None:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    else:
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        relevance = candidates @ query
+        if norms is not None:
+            relevance /= norms * (np.linalg.norm(query) or 1.0)
+
+    # Upper bounds of the MMR scores; -inf once picked or set aside
+    scores = relevance.copy()
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    checked = np.zeros(n, dtype=np.int32)  # selected docs already folded into redundancy
+
+    dedup = sources is not None
+    source_counts = {}
+    held, held_scores = [], []  # candidates set aside because their source is capped
+
+    selected = []
+    while len(selected) < k:
+        best = int(np.argmax(scores))
+        if scores[best] == -np.inf:
+            if not held:
+                break
+            # Every remaining source is capped, fall back to plain MMR
+            scores[held] = held_scores
+            held, held_scores = [], []
+            dedup = False
+            continue
+        if dedup and source_counts.get(sources[best], 0) >= max_per_source:
+            # Capped sources are only checked when they reach the top of the queue
+            held.append(best)
+            held_scores.append(scores[best])
+            scores[best] = -np.inf
+            continue
+
+        if checked[best] == len(selected):
+            selected.append(best)
+            scores[best] = -np.inf
+            if len(selected) == 1 and k > 1:
+                # Relevance alone is not a bound once redundancy counts, so
+                # score everything against the first pick in one pass.
+                redundancy = candidates @ candidates[best]
+                if norms is not None:
+                    redundancy /= norms * norms[best]
+                scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+                scores[best] = -np.inf
+                checked[:] = 1
+            if dedup:
+                source_counts[sources[best]] = source_counts.get(sources[best], 0) + 1
+            continue
+
+        # The top of the queue is stale: re-score the best stale bounds
+        # against the documents selected since they were last scored.
+        block = np.argpartition(scores, -refresh_block)[-refresh_block:] if n > refresh_block else np.arange(n)
+        block = block[(checked[block] < len(selected)) & (scores[block] > -np.inf)]
+        if block.size == 0:
+            # Ties with fresh bounds pushed best out of the partition
+            block = np.array([best])
+        newer = selected[int(checked[block].min()):]
+        similarity = candidates[block] @ candidates[newer].T
+        if norms is not None:
+            similarity /= np.outer(norms[block], norms[newer])
+        block_redundancy = np.maximum(redundancy[block], similarity.max(axis=1))
+        redundancy[block] = block_redundancy
+        scores[block] = lambda_mult * relevance[block] - (1 - lambda_mult) * block_redundancy
+        checked[block] = len(selected)
+
+    return selected
+
+def fetch_relevant_documents(vector_store, prompt, document_count, diversify=True, fetch_k=None, lambda_mult=0.5, max_per_source=1):
+    """Search for relevant documents in the vector store.
+
+    With `diversify` enabled, `fetch_k` candidates (default 5x the requested
+    count) are pulled with their vectors and narrowed down with MMR and
+    per-source dedup, so adjacent chunks of one post don't crowd the results.
+    """
     try:
         print(f"Searching for: {prompt}")
-        results = vector_store.similarity_search(
-            query=prompt, 
-            k=document_count
-        )
+        if not diversify:
+            results = vector_store.similarity_search(
+                query=prompt, 
+                k=document_count
+            )
+        else:
+            query_embedding = vector_store.embeddings.embed_query(prompt)
+            documents, vectors, scores = _fetch_candidates(
+                vector_store,
+                query_embedding,
+                fetch_k or document_count * 5
+            )
+            selected = mmr_select(
+                query_embedding,
+                vectors,
+                document_count,
+                lambda_mult=lambda_mult,
+                sources=[doc.metadata.get("source", "") for doc in documents],
+                max_per_source=max_per_source,
+                normalized=True,  # OpenAI embeddings are unit length
+                relevance=scores  # the index's metric is cosine
+            )
+            results = [documents[i] for i in selected]
         print(f"Found {len(results)} relevant documents")
         return results
     except Exception as e:
         print(f"Error in fetch_relevant_documents: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e